@@ -3,48 +3,98 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from bson import json_util
 import time
-from datetime import datetime, time as dtime, timedelta
+from datetime import datetime, date, time as dtime, timedelta
 from zoneinfo import ZoneInfo
-from polygon import RESTClient
+from utils._polygon.polygon_client_registry import get_polygon_client
+from api_polygon.bar_series import BarSeries
+from api_polygon.bar_cache import intraday_bar_cache
+from api_polygon.daily_bar_store import get_daily_bar_store
+from api_polygon.session_levels import SessionLevels, MARKET_OPEN_MINUTE
+from api_polygon.key_level_index import get_key_level_index
+import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
 
 class ChartAnalyzer:
-    def __init__(self, symbol: str, data_delay_minutes: int = 15):
+    # 增量更新時重新請求的最後幾根 1m K線（仍在形成中或延遲數據可能被修正）
+    REFETCH_1M_BARS = max(1, int(os.getenv("POLYGON_1M_REFETCH_BARS", "1")))
+    # 關鍵價位的成交量分層：日K成交量需高於「4AM 起成交量 × 倍數」
+    KEY_LEVEL_VOLUME_TIERS = (1, 2, 5)
+
+    def __init__(self, symbol: str, data_delay_minutes: int = 15, use_bar_cache: bool = True):
         self.symbol = symbol
+        self.use_bar_cache = use_bar_cache
         self.polygon_api_key = os.getenv("POLYGON_KEY")
         if not self.polygon_api_key:
             raise ValueError("Polygon API key not found")
             
-        self.client = RESTClient(self.polygon_api_key)
+        self.client = get_polygon_client(self.polygon_api_key)
         self.market_open_time = dtime(9, 30)
         self.ny_tz = ZoneInfo("America/New_York")
         self.data_delay_minutes = data_delay_minutes  # 數據延遲（分鐘）
+        self._records_1m = self._records_5m = self._records_1d = None
+        self._session_levels = {}
 
         print(f"🔍 正在為 {self.symbol} 獲取圖表數據...")
-        # 初始化時獲取數據
-        self.data_1m = self.get_1m()
+        # 初始化時獲取數據（列式 BarSeries，list-of-dicts 只在訪問 data_* 時才生成）
+        self.bars_1m = self.get_1m()
         self.update_last_day_data()
-        self.data_5m = self.get_5m()
-        self.data_1d = self.get_1d()
+        self.bars_5m = self.get_5m()
+        self.bars_1d = self.get_1d()
         print(f"✅ {self.symbol} 圖表數據準備就緒")
 
     def __repr__(self):
         return f"<ChartAnalyzer(symbol={self.symbol})>"
 
+    @classmethod
+    def from_bars(cls, symbol, bars_1m, bars_5m, bars_1d, data_delay_minutes: int = 15):
+        """以現成的 BarSeries 建立（不發出任何API請求），用於回測與基準測試"""
+        analyzer = cls.__new__(cls)
+        analyzer.symbol = symbol
+        analyzer.use_bar_cache = False
+        analyzer.market_open_time = dtime(9, 30)
+        analyzer.ny_tz = ZoneInfo("America/New_York")
+        analyzer.data_delay_minutes = data_delay_minutes
+        analyzer._records_1m = analyzer._records_5m = analyzer._records_1d = None
+        analyzer._session_levels = {}
+        analyzer.bars_1m = bars_1m
+        analyzer.update_last_day_data()
+        analyzer.bars_5m = bars_5m
+        analyzer.bars_1d = bars_1d.sorted()
+        analyzer.daily_history = analyzer.bars_1d
+        analyzer.daily_session_bar = BarSeries.empty(analyzer.ny_tz)
+        analyzer.daily_revision = None
+        return analyzer
+
+    @property
+    def data_1m(self):
+        if self._records_1m is None:
+            self._records_1m = self.bars_1m.to_records()
+        return self._records_1m
+
+    @property
+    def data_5m(self):
+        if self._records_5m is None:
+            self._records_5m = self.bars_5m.to_records()
+        return self._records_5m
+
+    @property
+    def data_1d(self):
+        if self._records_1d is None:
+            self._records_1d = self.bars_1d.to_records()
+        return self._records_1d
+
+    @property
+    def last_day_data_1m(self):
+        return self.last_day_bars_1m.to_records()
+
     def update_last_day_data(self):
-        """從 self.data_1m 中提取最後一個交易日的資料"""
-        if not self.data_1m:
-            self.last_day_data_1m = []
-            return
-
-        all_dates = sorted(set(x["datetime"].date() for x in self.data_1m))
-        if all_dates:
-            last_date = all_dates[-1]
-            self.last_day_data_1m = [x for x in self.data_1m if x["datetime"].date() == last_date]
-        else:
-            self.last_day_data_1m = []
+        """從 self.bars_1m 中提取最後一個交易日的資料"""
+        self.bars_1m = self.bars_1m.sorted()
+        self._records_1m = None
+        self._session_levels = {}
+        self.last_day_bars_1m = self.bars_1m.select(self.bars_1m.last_day_mask())
 
     def get_adjusted_now(self):
         """獲取考慮數據延遲的調整時間"""
@@ -68,7 +118,7 @@ class ChartAnalyzer:
         # 确保不会请求未来的数据
         if adjusted_now <= ny_today_415am:
             logger.warning(f"調整後時間 {adjusted_now} 早於開始時間 {ny_today_415am}，返回空數據")
-            return []
+            return BarSeries.empty(self.ny_tz)
         
         # 转换为 UTC 时间并获取毫秒时间戳
         today_415am_utc = ny_today_415am.astimezone(self.ny_tz)
@@ -76,6 +126,16 @@ class ChartAnalyzer:
         
         from_timestamp = int(today_415am_utc.timestamp() * 1000)
         to_timestamp = int(adjusted_now_utc.timestamp() * 1000)
+
+        # 增量更新：同一交易時段（及相同延遲設定）已有緩存時，只從最後一根K線開始請求
+        cached = None
+        fetch_from = from_timestamp
+        if self.use_bar_cache:
+            cached = intraday_bar_cache.get(self.symbol, from_timestamp, self.data_delay_minutes)
+            if cached is not None and len(cached):
+                refetch_index = max(0, len(cached) - self.REFETCH_1M_BARS)
+                fetch_from = max(from_timestamp, int(cached.timestamps[refetch_index]))
+                logger.info(f"{self.symbol} 1m 緩存命中 {len(cached)} 根K線，增量請求自 {fetch_from}")
         
         try:
             aggs = []
@@ -83,7 +143,7 @@ class ChartAnalyzer:
                 ticker=self.symbol,
                 multiplier=1,
                 timespan='minute',
-                from_=from_timestamp,  # 使用毫秒时间戳
+                from_=fetch_from,  # 使用毫秒时间戳
                 to=to_timestamp,       # 使用毫秒时间戳
                 adjusted=True,
                 sort="asc",
@@ -91,17 +151,18 @@ class ChartAnalyzer:
             ):
                 aggs.append(a)
             
-            return [
-                {
-                    "datetime": datetime.fromtimestamp(a.timestamp/1000, self.ny_tz),
-                    "open": a.open,
-                    "high": a.high,
-                    "low": a.low,
-                    "close": a.close,
-                    "volume": a.volume
-                }
-                for a in aggs
-            ] if aggs else []
+            new_bars = BarSeries.from_aggs(aggs, self.ny_tz).sorted()
+            if cached is not None and len(cached):
+                if not len(new_bars):
+                    return cached
+                # 保留 fetch_from 之前的舊K線，以新數據取代其後（仍在形成中）的K線
+                bars = BarSeries.concat([cached.select(cached.timestamps < fetch_from), new_bars], self.ny_tz)
+            else:
+                bars = new_bars
+
+            if self.use_bar_cache:
+                intraday_bar_cache.put(self.symbol, from_timestamp, self.data_delay_minutes, bars)
+            return bars
             
         except Exception as e:
             error_msg = str(e)
@@ -109,10 +170,18 @@ class ChartAnalyzer:
                 logger.warning(f"1m數據需要升級Polygon.io計劃: {error_msg}")
             else:
                 logger.error(f"Error fetching 1m data: {e}")
-            return []
+            if cached is not None:
+                logger.warning(f"{self.symbol} 使用緩存的 1m 數據 ({len(cached)} 根K線)")
+                return cached
+            return BarSeries.empty(self.ny_tz)
 
     def get_5m(self):
-        """獲取5分鐘K線數據 - 從前天4:15 AM (ET)開始，考慮數據延遲"""
+        """
+        獲取5分鐘K線數據 - 從前天4:15 AM (ET)開始，考慮數據延遲
+
+        當前交易時段的5m K線由已緩存的1m K線在本地重採樣；之前交易日的5m K線不會再變化，
+        每個交易時段只請求一次並緩存，因此每次運行只需一個日內API請求（1m）。
+        """
         adjusted_now = self.get_adjusted_now()
         ny_two_days_ago = adjusted_now - timedelta(days=2)
         ny_two_days_ago_415am = ny_two_days_ago.replace(hour=4, minute=15, second=0, microsecond=0)
@@ -128,10 +197,28 @@ class ChartAnalyzer:
         from_timestamp = int(two_days_ago_415am_utc.timestamp() * 1000)
         to_timestamp = int(adjusted_now_utc.timestamp() * 1000)
 
-        #print(from_timestamp)
-        #print(to_timestamp)
+        # 沒有1m數據（例如計劃不支持）時退回直接請求5m
+        if not len(self.last_day_bars_1m):
+            return self._fetch_5m(from_timestamp, to_timestamp)
 
-        
+        session_date = date(1970, 1, 1) + timedelta(days=int(self.last_day_bars_1m.local_days[-1]))
+        session_start = datetime.combine(session_date, dtime(4, 15), self.ny_tz)
+        session_start_ms = int(session_start.timestamp() * 1000)
+
+        prior = intraday_bar_cache.get(self.symbol, session_start_ms, self.data_delay_minutes, timeframe="5m_prior")
+        if prior is None:
+            prior = self._fetch_5m(from_timestamp, session_start_ms - 1, none_on_error=True, allow_empty=True)
+            if prior is not None:
+                intraday_bar_cache.put(self.symbol, session_start_ms, self.data_delay_minutes, prior, timeframe="5m_prior")
+            else:
+                prior = BarSeries.empty(self.ny_tz)
+
+        data = BarSeries.concat([prior, self.last_day_bars_1m.resample(5)], self.ny_tz)
+        logger.info(f"Built {len(data)} 5m candles for {self.symbol} ({len(prior)} cached from previous sessions)")
+        return data
+
+    def _fetch_5m(self, from_timestamp, to_timestamp, none_on_error=False, allow_empty=False):
+        """直接從 Polygon 請求5m K線；none_on_error=True 時出錯返回 None（不緩存）"""
         try:
             aggs = []
             for a in self.client.list_aggs(
@@ -147,232 +234,163 @@ class ChartAnalyzer:
                 aggs.append(a)
             
             if not aggs:
-                logger.warning(f"No 5m data returned for {self.symbol}")
-                return []
+                if not allow_empty:
+                    logger.warning(f"No 5m data returned for {self.symbol}")
+                return BarSeries.empty(self.ny_tz)
             
-            data = [
-                {
-                    "datetime": datetime.fromtimestamp(a.timestamp/1000, self.ny_tz),
-                    "open": a.open,
-                    "high": a.high,
-                    "low": a.low,
-                    "close": a.close,
-                    "volume": a.volume
-                }
-                for a in aggs
-            ]
+            data = BarSeries.from_aggs(aggs, self.ny_tz).sorted()
             
             logger.info(f"Retrieved {len(data)} 5m candles for {self.symbol}")
             return data
             
         except Exception as e:
             logger.error(f"Error fetching 5m data for {self.symbol}: {e}")
-            return []
+            return None if none_on_error else BarSeries.empty(self.ny_tz)
 
     def get_1d(self):
-        """獲取日K線數據 - 過去兩年，考慮數據延遲"""
+        """獲取日K線數據 - 過去兩年，考慮數據延遲（歷史日K讀自本地存儲，當天日K由1m數據合成）"""
         # 獲取調整後的紐約時間
         adjusted_now = self.get_adjusted_now()
         
-        # 计算纽约时间两年前的日期
-        ny_two_years_ago = adjusted_now - timedelta(days=730)
-        
         # 如果调整后时间早于4:15 AM，则使用前一天作为结束日期
         if adjusted_now.time() < dtime(4, 15):
             adjusted_now = adjusted_now - timedelta(days=1)
-        
-        # 转换为 UTC 时间
-        two_years_ago_utc = ny_two_years_ago.astimezone(ZoneInfo("UTC"))
-        adjusted_now_utc = adjusted_now.astimezone(ZoneInfo("UTC"))
-        
-        try:
-            aggs = self.client.get_aggs(
-                ticker=self.symbol,
-                multiplier=1,
-                timespan='day',
-                from_=two_years_ago_utc.strftime('%Y-%m-%d'),
-                to=adjusted_now_utc.strftime('%Y-%m-%d'),
-                limit=500
-            )
-            
-            return [
-                {
-                    "datetime": datetime.fromtimestamp(a.timestamp/1000, self.ny_tz),
-                    "open": a.open,
-                    "high": a.high,
-                    "low": a.low,
-                    "close": a.close,
-                    "volume": a.volume
-                }
-                for a in aggs
-            ] if aggs else []
-            
-        except Exception as e:
-            logger.error(f"Error fetching daily data: {e}")
-            return []
-
-    # 保持原有的分析方法不變
+        session_date = adjusted_now.date()
+
+        store = get_daily_bar_store()
+        self.daily_history = store.get_daily_bars(self.symbol, session_date, self._fetch_1d)
+        self.daily_revision = store.get_revision(self.symbol)
+        self.daily_session_bar = self._get_session_daily_bar(session_date)
+        return BarSeries.concat([self.daily_history, self.daily_session_bar], self.ny_tz)
+
+    def _fetch_1d(self, from_date, to_date):
+        """從 Polygon 下載 [from_date, to_date] 的日K（供日K存儲補數據使用，出錯時拋出異常）"""
+        aggs = self.client.get_aggs(
+            ticker=self.symbol,
+            multiplier=1,
+            timespan='day',
+            from_=from_date.strftime('%Y-%m-%d'),
+            to=to_date.strftime('%Y-%m-%d'),
+            limit=500
+        )
+        return BarSeries.from_aggs(aggs, self.ny_tz)
+
+    def _get_session_daily_bar(self, session_date):
+        """以當前交易日的 1m K線合成當天的日K"""
+        bars = self.last_day_bars_1m
+        if not len(bars) or int(bars.local_days[-1]) != (session_date - date(1970, 1, 1)).days:
+            return BarSeries.empty(self.ny_tz)
+        session_midnight = datetime.combine(session_date, dtime(0, 0), self.ny_tz)
+        return BarSeries(
+            timestamps=[int(session_midnight.timestamp() * 1000)],
+            open=[bars.open[0]],
+            high=[bars.high.max()],
+            low=[bars.low.min()],
+            close=[bars.close[-1]],
+            volume=[bars.volume.sum()],
+            tz=self.ny_tz,
+        )
+
+    # 保持原有的分析方法不變：各指標均讀自 get_session_levels() 的緩存結果，只在 SessionLevels.compute 中計算
     def to_two_decimal(self, value):
-        return round(value, 2) if value is not None else None
+        return round(float(value), 2) if value is not None else None
 
     def get_premarket_data(self):
-        return [x for x in self.last_day_data_1m if x["datetime"].time() < self.market_open_time]
+        return self.last_day_bars_1m.select(self.last_day_bars_1m.local_minutes < MARKET_OPEN_MINUTE).to_records()
 
     def get_market_data(self):
-        return [x for x in self.last_day_data_1m if x["datetime"].time() >= self.market_open_time]
+        return self.last_day_bars_1m.select(self.last_day_bars_1m.local_minutes >= MARKET_OPEN_MINUTE).to_records()
 
     def get_premarket_high(self):
-        premarket = self.get_premarket_data()
-        return self.to_two_decimal(max(x["high"] for x in premarket)) if premarket else None
+        return self.get_session_levels().premarket_high
 
     def get_premarket_low(self):
-        premarket = self.get_premarket_data()
-        return self.to_two_decimal(min(x["low"] for x in premarket)) if premarket else None
+        return self.get_session_levels().premarket_low
 
     def get_market_open_high(self, time_range=("09:31", "09:45")):
-        try:
-            start = dtime(*map(int, time_range[0].split(":")))
-            end = dtime(*map(int, time_range[1].split(":")))
-
-            if not self.data_1m:
-                return None
-
-            last_date = self.data_1m[-1]["datetime"].date()
-            opens = [
-                x for x in self.data_1m
-                if x["datetime"].date() == last_date and start <= x["datetime"].time() <= end
-            ]
-
-            highs = [x["high"] for x in opens if "high" in x]
-            return self.to_two_decimal(max(highs)) if highs else None
-
-        except (ValueError, IndexError) as e:
-            logger.error(f"Error parsing time range: {time_range}, error: {e}")
-            return None
+        return self.get_session_levels(time_range).market_open_high
 
     def get_market_open_low(self, time_range=("09:31", "09:45")):
-        try:
-            start = dtime(*map(int, time_range[0].split(":")))
-            end = dtime(*map(int, time_range[1].split(":")))
-
-            if not self.data_1m:
-                return None
-
-            last_date = self.data_1m[-1]["datetime"].date()
-            opens = [
-                x for x in self.data_1m
-                if x["datetime"].date() == last_date and start <= x["datetime"].time() <= end
-            ]
-
-            lows = [x["low"] for x in opens if "low" in x]
-            return self.to_two_decimal(min(lows)) if lows else None
-
-        except (ValueError, IndexError) as e:
-            logger.error(f"Error parsing time range: {time_range}, error: {e}")
-            return None
+        return self.get_session_levels(time_range).market_open_low
 
     def get_day_high(self):
-        if not self.last_day_data_1m:
-            return None
-        return self.to_two_decimal(max(x["high"] for x in self.last_day_data_1m))
+        return self.get_session_levels().day_high
 
     def get_day_low(self):
-        market_data = self.get_market_data()
-        if not market_data:
-            return None
-        return self.to_two_decimal(min(x["low"] for x in market_data))
+        return self.get_session_levels().day_low
 
     def get_day_close(self):
-        if not self.last_day_data_1m:
-            return None
-        sorted_data = sorted(self.last_day_data_1m, key=lambda x: x["datetime"])
-        return self.to_two_decimal(sorted_data[-1]["close"])
+        return self.get_session_levels().day_close
 
     def get_yesterday_close(self):
-        if len(self.data_1d) < 2:
-            return None
-        sorted_data = sorted(self.data_1d, key=lambda x: x["datetime"])
-        return self.to_two_decimal(sorted_data[-2]["close"])
+        return self.get_session_levels().yesterday_close
 
     def get_high_change_percentage(self):
-        y_close = self.get_yesterday_close()
-        d_high = self.get_day_high()
-        if y_close and d_high:
-            return round((d_high - y_close) / y_close * 100, 2)
-        return None
+        return self.get_session_levels().high_change_percentage
 
     def get_close_change_percentage(self):
-        y_close = self.get_yesterday_close()
-        d_close = self.get_day_close()
-        if y_close and d_close:
-            return round((d_close - y_close) / y_close * 100, 2)
-        return None
+        return self.get_session_levels().close_change_percentage
 
     def get_most_volume_high(self):
-        greens = [x for x in self.last_day_data_1m if x["close"] >= x["open"] and x["volume"] > 0]
-        if not greens:
-            return None
-        most = max(greens, key=lambda x: x["volume"])
-        return self.to_two_decimal(most["high"])
+        return self.get_session_levels().most_volume_high
 
     def get_most_volume_low(self):
-        market_data = self.get_market_data()
-        reds = [x for x in market_data if x["close"] < x["open"] and x["volume"] > 0]
-        if not reds:
-            return None
-        most = max(reds, key=lambda x: x["volume"])
-        return self.to_two_decimal(most["low"])
+        return self.get_session_levels().most_volume_low
 
     def _get_volume_since_4am(self):
-        four_am = dtime(4, 0)
-        market_data = [x for x in self.data_5m if x["datetime"].time() >= four_am]
-        return sum(x["volume"] for x in market_data) if market_data else 0
+        return self.get_session_levels().volume_since_4am
 
     def get_key_levels(self, level_number=5):
-        current_volume = self._get_volume_since_4am()
-        day_high = self.get_day_high()
+        return self._compute_key_levels(self.get_day_high(), self._get_volume_since_4am(), level_number)
+
+    def get_key_level_tiers(self, level_number=5):
+        return self._compute_key_level_tiers(self.get_day_high(), self._get_volume_since_4am(), level_number)
+
+    def _compute_key_levels(self, day_high, current_volume, level_number=5):
         if day_high is None:
             return []
 
-        daily_candles = self.data_1d
-        if not daily_candles:
+        if not len(self.daily_history) and not len(self.daily_session_bar):
             return []
 
-        filtered_candles = [
-            candle for candle in daily_candles 
-            if candle["volume"] > current_volume and candle["high"] > day_high
-        ]
-
-        if not filtered_candles:
-            return []
+        # 索引只在日K存儲更新時重建；當天由1m合成的日K單獨比較
+        index = get_key_level_index(self.symbol, self.daily_history, self.daily_revision)
+        return index.query(day_high, current_volume, level_number, extra_bars=self.daily_session_bar)
 
-        key_levels = []
-        for candle in filtered_candles:
-            if candle["low"] > day_high:
-                key_levels.append(self.to_two_decimal(candle["low"]))
-            else:
-                key_levels.append(self.to_two_decimal(candle["high"]))
+    def _compute_key_level_tiers(self, day_high, current_volume, level_number=5):
+        return {
+            f"{tier}x": self._compute_key_levels(day_high, current_volume * tier, level_number)
+            for tier in self.KEY_LEVEL_VOLUME_TIERS
+        }
 
-        key_levels = sorted(list(set(key_levels)))
-        return key_levels[:level_number]
+    def get_session_levels(self, open_range=("09:31", "09:45")):
+        """單次遍歷最後交易時段，返回所有價格水平（SessionLevels）；按 open_range 緩存，K線更新時清空"""
+        key = tuple(open_range)
+        levels = self._session_levels.get(key)
+        if levels is None:
+            levels = SessionLevels.compute(self.last_day_bars_1m, self.bars_5m, self.bars_1d, open_range)
+            self._session_levels[key] = levels
+        return levels
 
     def run(self):
         """執行分析並返回所有數據點"""
+        levels = self.get_session_levels()
         result = {
             "symbol": self.symbol,
-            "premarket_high": self.get_premarket_high(),
-            "premarket_low": self.get_premarket_low(),
-            "market_open_high": self.get_market_open_high(),
-            "market_open_low": self.get_market_open_low(),
-            "day_high": self.get_day_high(),
-            "day_low": self.get_day_low(),
-            "day_close": self.get_day_close(),
-            "yesterday_close": self.get_yesterday_close(),
-            "high_change_percentage": self.get_high_change_percentage(),
-            "close_change_percentage": self.get_close_change_percentage(),
-            "most_volume_high": self.get_most_volume_high(),
-            "most_volume_low": self.get_most_volume_low(),
-            "key_levels": self.get_key_levels(),
+            "premarket_high": levels.premarket_high,
+            "premarket_low": levels.premarket_low,
+            "market_open_high": levels.market_open_high,
+            "market_open_low": levels.market_open_low,
+            "day_high": levels.day_high,
+            "day_low": levels.day_low,
+            "day_close": levels.day_close,
+            "yesterday_close": levels.yesterday_close,
+            "high_change_percentage": levels.high_change_percentage,
+            "close_change_percentage": levels.close_change_percentage,
+            "most_volume_high": levels.most_volume_high,
+            "most_volume_low": levels.most_volume_low,
+            "key_levels": self._compute_key_levels(levels.day_high, levels.volume_since_4am),
+            "key_levels_by_volume_tier": self._compute_key_level_tiers(levels.day_high, levels.volume_since_4am),
             "1m_chart_data": self.data_1m,
             "5m_chart_data": self.data_5m,
             "1d_chart_data": self.data_1d
@@ -0,0 +1,83 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import logging
+import numpy as np
+from api_polygon.bar_series import BarSeries
+
+logger = logging.getLogger(__name__)
+
+
+class IntradayBarCache:
+    """
+    每個 symbol 的日內K線緩存（進程內，可選磁碟）
+
+    以 (symbol, 週期, 交易時段開始時間) 為鍵；交易日切換時 session_start 改變，舊數據自動失效。
+    ChartAnalyzer 只需從最後一根K線的時間戳開始請求新數據，並以新數據取代仍在形成中的最後幾根K線。
+    設置 POLYGON_BAR_CACHE_DIR 後會同時寫入 .npz 文件，重啟進程後仍可增量更新。
+    """
+
+    def __init__(self, cache_dir=None):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.cache_dir = cache_dir if cache_dir is not None else os.getenv("POLYGON_BAR_CACHE_DIR")
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, symbol, session_start_ms, data_delay_minutes, timeframe):
+        return os.path.join(self.cache_dir, f"{symbol}_{timeframe}_{session_start_ms}_d{data_delay_minutes}.npz")
+
+    def get(self, symbol, session_start_ms, data_delay_minutes, timeframe="1m"):
+        """返回該時段已緩存的 BarSeries，沒有則返回 None"""
+        key = (symbol, session_start_ms, data_delay_minutes)
+        with self._lock:
+            entry = self._entries.get((symbol, timeframe))
+            if entry is not None and entry[0] == key:
+                return entry[1]
+
+        if not self.cache_dir:
+            return None
+        path = self._path(symbol, session_start_ms, data_delay_minutes, timeframe)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                bars = BarSeries(**{name: data[name] for name in ("timestamps",) + BarSeries.FIELDS})
+        except Exception as e:
+            logger.warning(f"讀取 {symbol} {timeframe} 緩存文件失敗: {e}")
+            return None
+        with self._lock:
+            self._entries[(symbol, timeframe)] = (key, bars)
+        return bars
+
+    def put(self, symbol, session_start_ms, data_delay_minutes, bars, timeframe="1m"):
+        key = (symbol, session_start_ms, data_delay_minutes)
+        with self._lock:
+            # 每個 symbol/週期只保留當前時段，交易日切換時舊時段被覆蓋
+            self._entries[(symbol, timeframe)] = (key, bars)
+
+        if not self.cache_dir:
+            return
+        current = os.path.basename(self._path(symbol, session_start_ms, data_delay_minutes, timeframe))
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(f"{symbol}_{timeframe}_") and name != current:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+        try:
+            np.savez(
+                self._path(symbol, session_start_ms, data_delay_minutes, timeframe),
+                timestamps=bars.timestamps, open=bars.open, high=bars.high,
+                low=bars.low, close=bars.close, volume=bars.volume,
+            )
+        except Exception as e:
+            logger.warning(f"寫入 {symbol} {timeframe} 緩存文件失敗: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+intraday_bar_cache = IntradayBarCache()
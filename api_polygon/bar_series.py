@@ -0,0 +1,179 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import numpy as np
+
+NY_TZ = ZoneInfo("America/New_York")
+MS_PER_HOUR = 3_600_000
+MS_PER_MINUTE = 60_000
+
+
+class BarSeries:
+    """
+    列式 OHLCV K線容器
+
+    timestamps 為 int64 毫秒時間戳（UTC epoch），其餘欄位為 float64 陣列。
+    ChartAnalyzer 的指標都以向量化遮罩計算；list-of-dicts 格式只在
+    to_records() 被調用（例如序列化 1m_chart_data）時才生成。
+    """
+    FIELDS = ("open", "high", "low", "close", "volume")
+
+    def __init__(self, timestamps=None, open=None, high=None, low=None, close=None, volume=None, tz=NY_TZ):
+        self.timestamps = np.asarray(timestamps if timestamps is not None else [], dtype=np.int64)
+        n = len(self.timestamps)
+        self.open = np.asarray(open if open is not None else np.empty(n), dtype=np.float64)
+        self.high = np.asarray(high if high is not None else np.empty(n), dtype=np.float64)
+        self.low = np.asarray(low if low is not None else np.empty(n), dtype=np.float64)
+        self.close = np.asarray(close if close is not None else np.empty(n), dtype=np.float64)
+        self.volume = np.asarray(volume if volume is not None else np.empty(n), dtype=np.float64)
+        self.tz = tz
+        self._local_minutes = None
+        self._local_days = None
+
+    @classmethod
+    def empty(cls, tz=NY_TZ):
+        return cls(tz=tz)
+
+    @classmethod
+    def from_aggs(cls, aggs, tz=NY_TZ):
+        """從 Polygon Agg 物件列表建立"""
+        if not aggs:
+            return cls.empty(tz)
+        return cls(
+            timestamps=[a.timestamp for a in aggs],
+            open=[a.open for a in aggs],
+            high=[a.high for a in aggs],
+            low=[a.low for a in aggs],
+            close=[a.close for a in aggs],
+            volume=[a.volume if a.volume is not None else 0 for a in aggs],
+            tz=tz,
+        )
+
+    @classmethod
+    def concat(cls, series_list, tz=NY_TZ):
+        series_list = [s for s in series_list if s is not None and len(s)]
+        if not series_list:
+            return cls.empty(tz)
+        return cls(
+            timestamps=np.concatenate([s.timestamps for s in series_list]),
+            open=np.concatenate([s.open for s in series_list]),
+            high=np.concatenate([s.high for s in series_list]),
+            low=np.concatenate([s.low for s in series_list]),
+            close=np.concatenate([s.close for s in series_list]),
+            volume=np.concatenate([s.volume for s in series_list]),
+            tz=series_list[0].tz,
+        )
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __repr__(self):
+        return f"<BarSeries(len={len(self)})>"
+
+    def select(self, mask_or_index):
+        """以布林遮罩、索引陣列或切片取子集"""
+        return BarSeries(
+            timestamps=self.timestamps[mask_or_index],
+            open=self.open[mask_or_index],
+            high=self.high[mask_or_index],
+            low=self.low[mask_or_index],
+            close=self.close[mask_or_index],
+            volume=self.volume[mask_or_index],
+            tz=self.tz,
+        )
+
+    def sorted(self):
+        if len(self) < 2 or np.all(self.timestamps[1:] >= self.timestamps[:-1]):
+            return self
+        return self.select(np.argsort(self.timestamps, kind="stable"))
+
+    def _utc_offsets_ms(self):
+        # 時區偏移只會在整點變化（夏令時切換），按小時去重後查表即可向量化
+        hours = self.timestamps // MS_PER_HOUR
+        unique_hours, inverse = np.unique(hours, return_inverse=True)
+        offsets = np.array([
+            int(datetime.fromtimestamp(int(h) * 3600, self.tz).utcoffset() / timedelta(milliseconds=1))
+            for h in unique_hours
+        ], dtype=np.int64)
+        return offsets[inverse]
+
+    def _compute_local(self):
+        if len(self) == 0:
+            self._local_minutes = np.empty(0, dtype=np.int64)
+            self._local_days = np.empty(0, dtype=np.int64)
+            return
+        local_ms = self.timestamps + self._utc_offsets_ms()
+        local_minutes_total = local_ms // MS_PER_MINUTE
+        self._local_days = local_minutes_total // 1440
+        self._local_minutes = local_minutes_total % 1440
+
+    @property
+    def local_minutes(self):
+        """每根K線在當地時區的「當日第幾分鐘」(0-1439)"""
+        if self._local_minutes is None:
+            self._compute_local()
+        return self._local_minutes
+
+    @property
+    def local_days(self):
+        """每根K線在當地時區的日序號（自 epoch 起的天數），用於按交易日分組"""
+        if self._local_days is None:
+            self._compute_local()
+        return self._local_days
+
+    def last_day_mask(self):
+        if len(self) == 0:
+            return np.zeros(0, dtype=bool)
+        return self.local_days == self.local_days.max()
+
+    def resample(self, minutes, anchor_minute=4 * 60):
+        """
+        將K線重採樣為 N 分鐘K線（按交易時段對齊）
+
+        每個當地交易日的分桶從 anchor_minute（默認 4:00 AM 盤前開始）起算，
+        K線時間戳為分桶的開始時間，與 Polygon 的 N 分鐘聚合一致。
+        """
+        if len(self) == 0:
+            return BarSeries.empty(self.tz)
+        bars = self.sorted()
+        bucket_index = (bars.local_minutes - anchor_minute) // minutes
+        bucket_key = bars.local_days * 1440 + bucket_index
+        starts = np.flatnonzero(np.r_[True, bucket_key[1:] != bucket_key[:-1]])
+        ends = np.r_[starts[1:], len(bars)]
+
+        first_ts = bars.timestamps[starts]
+        offset_minutes = (bars.local_minutes[starts] - anchor_minute) - bucket_index[starts] * minutes
+        bucket_ts = first_ts - first_ts % MS_PER_MINUTE - offset_minutes * MS_PER_MINUTE
+
+        return BarSeries(
+            timestamps=bucket_ts,
+            open=bars.open[starts],
+            high=np.maximum.reduceat(bars.high, starts),
+            low=np.minimum.reduceat(bars.low, starts),
+            close=bars.close[ends - 1],
+            volume=np.add.reduceat(bars.volume, starts),
+            tz=self.tz,
+        )
+
+    def to_records(self):
+        """轉換為原有的 list-of-dicts 格式（datetime 為帶時區的 datetime）"""
+        return [
+            {
+                "datetime": datetime.fromtimestamp(ts / 1000, self.tz),
+                "open": o,
+                "high": h,
+                "low": l,
+                "close": c,
+                "volume": v,
+            }
+            for ts, o, h, l, c, v in zip(
+                self.timestamps.tolist(),
+                self.open.tolist(),
+                self.high.tolist(),
+                self.low.tolist(),
+                self.close.tolist(),
+                self.volume.tolist(),
+            )
+        ]
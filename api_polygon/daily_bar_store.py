@@ -0,0 +1,167 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import sqlite3
+import threading
+import logging
+from datetime import date, timedelta
+import numpy as np
+from api_polygon.bar_series import BarSeries, NY_TZ
+
+logger = logging.getLogger(__name__)
+
+EPOCH_DATE = date(1970, 1, 1)
+
+
+class DailyBarStore:
+    """
+    本地日K線存儲（SQLite）
+
+    日K歷史在盤中不會改變，因此每個 ticker 只在首次使用時下載兩年數據，之後每個交易時段
+    只補充一次新完成的交易日；get_1d / get_yesterday_close / get_key_levels 都從這裡讀取。
+    只保存已完成的交易日（日期早於 session_date），當天的日K由 1m K線即時合成。
+    """
+    HISTORY_DAYS = 730
+    # 補數據時比對最後一根已存K線的收盤價，差異超過此比例視為拆股/復權調整，重新下載全部歷史
+    ADJUSTMENT_TOLERANCE = 0.001
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.getenv("POLYGON_DAILY_STORE_PATH", os.path.join("cache", "daily_bars.sqlite"))
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS daily_bars (
+                ticker TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                open REAL, high REAL, low REAL, close REAL, volume REAL,
+                PRIMARY KEY (ticker, ts)
+            );
+            CREATE TABLE IF NOT EXISTS daily_meta (
+                ticker TEXT PRIMARY KEY,
+                session_date TEXT NOT NULL,
+                revision INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self, ticker):
+        rows = self._conn.execute(
+            "SELECT ts, open, high, low, close, volume FROM daily_bars WHERE ticker = ? ORDER BY ts",
+            (ticker,),
+        ).fetchall()
+        if not rows:
+            return BarSeries.empty(NY_TZ)
+        columns = np.array(rows, dtype=np.float64).T
+        return BarSeries(
+            timestamps=np.array([row[0] for row in rows], dtype=np.int64),
+            open=columns[1], high=columns[2], low=columns[3], close=columns[4], volume=columns[5],
+        )
+
+    def _write(self, ticker, bars, session_date, replace=False):
+        with self._conn:
+            if replace:
+                self._conn.execute("DELETE FROM daily_bars WHERE ticker = ?", (ticker,))
+            if len(bars):
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO daily_bars (ticker, ts, open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (ticker, ts, o, h, l, c, v)
+                        for ts, o, h, l, c, v in zip(
+                            bars.timestamps.tolist(), bars.open.tolist(), bars.high.tolist(),
+                            bars.low.tolist(), bars.close.tolist(), bars.volume.tolist(),
+                        )
+                    ],
+                )
+            # revision 在數據有變化時遞增，供依賴日K的索引判斷是否需要重建
+            self._conn.execute(
+                """
+                INSERT INTO daily_meta (ticker, session_date, revision) VALUES (?, ?, ?)
+                ON CONFLICT(ticker) DO UPDATE SET
+                    session_date = excluded.session_date,
+                    revision = daily_meta.revision + excluded.revision
+                """,
+                (ticker, session_date.isoformat(), 1 if (replace or len(bars)) else 0),
+            )
+
+    def get_revision(self, ticker):
+        with self._lock:
+            row = self._conn.execute("SELECT revision FROM daily_meta WHERE ticker = ?", (ticker,)).fetchone()
+        return row[0] if row else 0
+
+    def get_daily_bars(self, ticker, session_date, fetch):
+        """
+        返回 ticker 在 session_date 之前已完成交易日的日K（BarSeries，按時間排序）
+
+        fetch(from_date, to_date) 用於下載缺失的數據，兩個參數均為 datetime.date（含首尾）。
+        """
+        with self._lock:
+            meta = self._conn.execute("SELECT session_date FROM daily_meta WHERE ticker = ?", (ticker,)).fetchone()
+            stored = self._load(ticker)
+            if meta and meta[0] == session_date.isoformat():
+                self.hits += 1
+                return self._completed(stored, session_date)
+            self.misses += 1
+
+        last_completed = session_date - timedelta(days=1)
+        replace = not len(stored)
+        if replace:
+            from_date = session_date - timedelta(days=self.HISTORY_DAYS)
+        else:
+            # 從最後一根已存K線開始，用於檢查拆股等歷史調整
+            from_date = EPOCH_DATE + timedelta(days=int(stored.local_days[-1]))
+
+        try:
+            fetched = self._completed(fetch(from_date, last_completed), session_date)
+            if not replace and len(fetched):
+                overlap = fetched.select(fetched.timestamps == stored.timestamps[-1])
+                if len(overlap) and abs(overlap.close[0] - stored.close[-1]) > self.ADJUSTMENT_TOLERANCE * max(abs(stored.close[-1]), 1e-9):
+                    logger.info(f"{ticker} 日K歷史已調整（拆股/復權），重新下載")
+                    fetched = self._completed(fetch(session_date - timedelta(days=self.HISTORY_DAYS), last_completed), session_date)
+                    replace = True
+                else:
+                    fetched = fetched.select(fetched.timestamps > stored.timestamps[-1])
+        except Exception as e:
+            # 下載失敗時不更新 session_date，下次調用會重試
+            logger.error(f"Error fetching daily data for {ticker}: {e}")
+            return self._completed(stored, session_date)
+
+        with self._lock:
+            self._write(ticker, fetched, session_date, replace=replace)
+            return self._completed(self._load(ticker), session_date)
+
+    def _completed(self, bars, session_date):
+        if not len(bars):
+            return bars
+        bars = bars.sorted()
+        return bars.select(bars.local_days < (session_date - EPOCH_DATE).days)
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total * 100, 1) if total else 0.0,
+        }
+
+    def log_stats(self):
+        stats = self.get_stats()
+        logger.info(f"日K存儲統計: 命中 {stats['hits']}, 未命中 {stats['misses']} (命中率 {stats['hit_rate']}%)")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_daily_bar_store():
+    """返回進程內共用的 DailyBarStore（首次調用時建立）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DailyBarStore()
+        return _store
@@ -0,0 +1,73 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import numpy as np
+
+
+class KeyLevelIndex:
+    """
+    日K歷史的關鍵價位索引
+
+    K線按最高價升序排列，並預先計算「後綴最大成交量」。查詢「最高價高於 X 且成交量高於 V」
+    時，先以二分查找定位最高價 > X 的後綴，再用後綴最大成交量判斷是否可能有結果，
+    只有在需要時才對後綴做向量化過濾，不必每分鐘掃描全部兩年日K。
+    """
+
+    def __init__(self, bars):
+        order = np.argsort(bars.high, kind="stable")
+        self.highs = bars.high[order]
+        self.lows = bars.low[order]
+        self.volumes = bars.volume[order]
+        # suffix_max_volume[i] = max(volumes[i:])
+        self.suffix_max_volume = np.maximum.accumulate(self.volumes[::-1])[::-1] if len(order) else self.volumes
+
+    def __len__(self):
+        return len(self.highs)
+
+    def candidates(self, price, min_volume):
+        """返回所有符合條件的價位（未去重、未四捨五入）"""
+        start = int(np.searchsorted(self.highs, price, side="right"))
+        if start >= len(self.highs) or self.suffix_max_volume[start] <= min_volume:
+            return []
+        mask = self.volumes[start:] > min_volume
+        lows = self.lows[start:][mask]
+        highs = self.highs[start:][mask]
+        # K線整根在價格之上時取最低價，否則取最高價
+        return np.where(lows > price, lows, highs).tolist()
+
+    def query(self, price, min_volume, level_number=5, extra_bars=None):
+        """
+        返回高於 price、成交量大於 min_volume 的前 level_number 個關鍵價位（兩位小數、升序、去重）
+
+        extra_bars 為不在索引中的K線（例如由1m合成的當天日K），會一併納入比較。
+        """
+        levels = self.candidates(price, min_volume)
+        if extra_bars is not None and len(extra_bars):
+            mask = (extra_bars.volume > min_volume) & (extra_bars.high > price)
+            lows = extra_bars.low[mask]
+            levels += np.where(lows > price, lows, extra_bars.high[mask]).tolist()
+        return sorted({round(level, 2) for level in levels})[:level_number]
+
+
+_index_cache = {}
+_index_lock = threading.Lock()
+
+
+def get_key_level_index(symbol, bars, revision=None):
+    """
+    返回 symbol 的 KeyLevelIndex；只有日K存儲的 revision 或歷史範圍變化時才重建
+
+    revision 為 None（例如回測時沒有存儲）時不做緩存。
+    """
+    if revision is None:
+        return KeyLevelIndex(bars)
+    key = (revision, len(bars), int(bars.timestamps[-1]) if len(bars) else None)
+    with _index_lock:
+        cached = _index_cache.get(symbol)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+    index = KeyLevelIndex(bars)
+    with _index_lock:
+        _index_cache[symbol] = (key, index)
+    return index
@@ -14,6 +14,7 @@ import requests
 from polygon import RESTClient
 from polygon.rest.models import TickerSnapshot # For type hinting
 from polygon.exceptions import BadResponse, AuthError
+from utils._polygon.polygon_client_registry import get_polygon_client
 
 # For .env file
 from dotenv import load_dotenv
@@ -51,8 +52,8 @@ class PolygonAPI:
             raise ValueError("Polygon API key not found.")
         
         # region Initialize the RESTClient
-        # You can pass `timeout=...` or other configurations here if needed.
-        self.client = RESTClient(self.api_key)
+        # Shared process-wide client so connection pools stay warm across instances.
+        self.client = get_polygon_client(self.api_key)
         self.verbose_errors = verbose_errors
         logger.info(f"PolygonAPI initialized with key ending '...{self.api_key[-4:] if len(self.api_key) > 4 else self.api_key}'")
 
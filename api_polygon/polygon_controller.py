@@ -9,7 +9,7 @@ import re
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
-from polygon import RESTClient
+from utils._polygon.polygon_client_registry import get_polygon_client
 from polygon.rest.models import (
     TickerSnapshot,
 )
@@ -52,7 +52,7 @@ class PolygonController:
         self.ny_time = datetime.now(ZoneInfo("America/New_York"))
         self.today_str = self.ny_time.strftime('%Y-%m-%d')
         self.polygon_api_key = os.getenv("POLYGON_KEY")
-        self.polygon_client = RESTClient(self.polygon_api_key)
+        self.polygon_client = get_polygon_client(self.polygon_api_key)
         self.top_gainers = []
     
 
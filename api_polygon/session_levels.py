@@ -0,0 +1,105 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from datetime import time as dtime
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+MARKET_OPEN_MINUTE = 9 * 60 + 30
+PREMARKET_START_MINUTE = 4 * 60
+
+
+def _round2(value):
+    return round(float(value), 2) if value is not None else None
+
+
+def _parse_minute(value):
+    parsed = dtime(*map(int, value.split(":")))
+    return parsed.hour * 60 + parsed.minute
+
+
+class SessionLevels:
+    """
+    單次遍歷計算最後一個交易時段的所有價格水平
+
+    分鐘陣列與各遮罩只計算一次，所有指標（盤前高低、開盤區間高低、日內高低收、
+    最大成交量陽線/陰線、4AM 起成交量、昨收及漲幅）一起產出，
+    取代 ChartAnalyzer.run 中十多個 getter 重複重建盤前/盤中數據並多次排序日K的做法。
+    """
+    FIELDS = (
+        "premarket_high", "premarket_low", "market_open_high", "market_open_low",
+        "day_high", "day_low", "day_close", "yesterday_close",
+        "high_change_percentage", "close_change_percentage",
+        "most_volume_high", "most_volume_low", "volume_since_4am",
+    )
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            setattr(self, field, values.get(field))
+
+    def __repr__(self):
+        return f"<SessionLevels(day_high={self.day_high}, day_close={self.day_close})>"
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def compute(cls, last_day_bars, bars_5m, bars_1d, open_range=("09:31", "09:45")):
+        """
+        last_day_bars: 最後一個交易日的 1m BarSeries（已排序）
+        bars_5m: 5m BarSeries，用於 4AM 起成交量（與 ChartAnalyzer._get_volume_since_4am 相同口徑）
+        bars_1d: 已排序的日K BarSeries
+        """
+        levels = {}
+        n = len(last_day_bars)
+
+        if n:
+            minutes = last_day_bars.local_minutes
+            high = last_day_bars.high
+            low = last_day_bars.low
+            open_ = last_day_bars.open
+            close = last_day_bars.close
+            volume = last_day_bars.volume
+
+            premarket = minutes < MARKET_OPEN_MINUTE
+            market = ~premarket
+            has_premarket = premarket.any()
+            has_market = market.any()
+
+            levels["premarket_high"] = _round2(high[premarket].max()) if has_premarket else None
+            levels["premarket_low"] = _round2(low[premarket].min()) if has_premarket else None
+
+            try:
+                open_mask = (minutes >= _parse_minute(open_range[0])) & (minutes <= _parse_minute(open_range[1]))
+            except (ValueError, IndexError) as e:
+                logger.error(f"Error parsing time range: {open_range}, error: {e}")
+                open_mask = np.zeros(n, dtype=bool)
+            has_open = open_mask.any()
+            levels["market_open_high"] = _round2(high[open_mask].max()) if has_open else None
+            levels["market_open_low"] = _round2(low[open_mask].min()) if has_open else None
+
+            levels["day_high"] = _round2(high.max())
+            levels["day_low"] = _round2(low[market].min()) if has_market else None
+            levels["day_close"] = _round2(close[-1])
+
+            traded = volume > 0
+            greens = (close >= open_) & traded
+            reds = market & (close < open_) & traded
+            if greens.any():
+                levels["most_volume_high"] = _round2(high[np.flatnonzero(greens)[np.argmax(volume[greens])]])
+            if reds.any():
+                levels["most_volume_low"] = _round2(low[np.flatnonzero(reds)[np.argmax(volume[reds])]])
+
+        since_4am = bars_5m.local_minutes >= PREMARKET_START_MINUTE if len(bars_5m) else None
+        levels["volume_since_4am"] = float(bars_5m.volume[since_4am].sum()) if since_4am is not None and since_4am.any() else 0
+
+        y_close = _round2(bars_1d.close[-2]) if len(bars_1d) >= 2 else None
+        levels["yesterday_close"] = y_close
+        d_high = levels.get("day_high")
+        d_close = levels.get("day_close")
+        levels["high_change_percentage"] = round((d_high - y_close) / y_close * 100, 2) if y_close and d_high else None
+        levels["close_change_percentage"] = round((d_close - y_close) / y_close * 100, 2) if y_close and d_close else None
+
+        return cls(**levels)
@@ -8,21 +8,21 @@ from polygon import RESTClient
 from polygon.rest.models import TickerSnapshot
 
 from get_sec_filings.get_sec_filings_6_demo_cache import SECFinancialAnalyzer
-from utils._database._mongodb.mongo_handler import MongoHandler
+from utils._database.storage import get_storage_handler
+from utils._database.chart_bar_store import ChartBarStore, get_chart_bar_store
+from utils._database._mongodb.doc_diff_tracker import get_doc_diff_tracker
 
 from zoneinfo import ZoneInfo
 from utils.logger.shared_logger import logger
 from datetime import datetime, timedelta
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 from openai import OpenAI
 from api_polygon.api_chart import ChartAnalyzer
-from utils._news.api_news_fetcher import RVLNewsAnalyzer
-
-
-
-from utils.newsfilter_api import NewsfilterAPI
+from utils._news.suggestion_pipeline import SuggestionPipeline
+from utils._news.upstream_limits import log_upstream_stats
 
 
 class SymbolMerger:
@@ -55,71 +55,199 @@ class DataHandler:
     """
     調試版本的 DataHandler - 添加詳細日誌以找出保存問題
     """
+    # 讀取配置：每個步驟只取回所需字段，避免每次查詢都拉取 1m/5m/1d 圖表數組
+    READ_PROFILES = {
+        "existence": {"_id": 0, "symbol": 1},
+        "summary": {"1m_chart_data": 0, "5m_chart_data": 0, "1d_chart_data": 0},
+        "full": None,
+    }
+    # 寫入前校驗的必填價格字段及允許的類型；缺少字段或類型不符的記錄寫入隔離集合，不進入主集合
+    REQUIRED_PRICE_FIELDS = {
+        "symbol": str,
+        "day_close": (int, float),
+        "close_change_percentage": (int, float),
+    }
+    # 允許為 None 的字段：新上市不足 2 根日K時沒有前收盤，1m 抓取失敗時 day_close 為 None
+    NULLABLE_PRICE_FIELDS = {"day_close", "close_change_percentage"}
+    QUARANTINE_COLLECTION = "fundamentals_quarantine"
     
-    def __init__(self):
+    def __init__(self, storage=None):
         self.polygon_controller = PolygonController()
-        self.mongo_handler = MongoHandler()
-        self.mongo_handler.create_collection('fundamentals_of_top_list_symbols')
+        # 存儲後端由 STORAGE_BACKEND 選擇（mongodb / sqlite）
+        self.storage = storage or get_storage_handler()
+        self.storage.create_collection('fundamentals_of_top_list_symbols')
+        self.storage.create_collection(self.QUARANTINE_COLLECTION)
         self.squeeze_scanner = ShortSqueezeScanner()
+        # 未指定存儲時使用進程內共用的 ChartBarStore，已存K線位置的緩存在每次運行間保留
+        self.chart_bar_store = ChartBarStore(storage) if storage is not None else get_chart_bar_store()
         
         # 數據存儲屬性
         self.fundamentals = []
         self.list_of_symbols = []
-        self._db_cache = {}
+        # 寫穿緩存：(symbol, 日期) -> 本進程寫入/讀取過的完整文檔（不含圖表數組）
+        self._doc_cache = {}
+        # 本輪校驗失敗的 symbol：主集合沒有其文檔，建議/SEC 步驟跳過
+        self._quarantined_symbols = set()
         self.ny_today = datetime.now(ZoneInfo("America/New_York")).strftime('%Y-%m-%d')
         self.ny_tz = ZoneInfo("America/New_York")
 
-    def _get_db_documents(self, symbols=None, force_refresh=False):
-        """統一的數據庫文檔獲取方法，帶緩存機制"""
+        # 每個 symbol 的價格/基本面抓取並發數，設為 1 即恢復逐個處理
+        self.max_workers = max(1, int(os.getenv('DATA_HANDLER_MAX_WORKERS', '8')))
+
+    def _map_symbols(self, func, list_of_symbols):
+        """以有限並發對每個 symbol 執行 func，結果順序與輸入一致"""
+        if self.max_workers == 1 or len(list_of_symbols) <= 1:
+            return [func(symbol) for symbol in list_of_symbols]
+
+        workers = min(self.max_workers, len(list_of_symbols))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="symbol-fetch") as executor:
+            # executor.map 按輸入順序返回；func 自行捕捉每個 symbol 的錯誤
+            return list(executor.map(func, list_of_symbols))
+
+    def _cache_put(self, symbol, date, doc):
+        """寫穿緩存：記錄本進程剛寫入（或完整讀取）的文檔"""
+        self._doc_cache[(symbol, date)] = {k: v for k, v in doc.items() if k not in ChartBarStore.CHART_FIELDS}
+
+    def _cache_update(self, symbol, date, fields):
+        """寫穿緩存：對已緩存的文檔合併剛更新的字段（未緩存的文檔下次從數據庫讀取）"""
+        doc = self._doc_cache.get((symbol, date))
+        if doc is not None:
+            doc.update(fields)
+
+    def _project_cached(self, doc, profile):
+        projection = self.READ_PROFILES[profile]
+        if projection is None:
+            return dict(doc)
+        included = [k for k, v in projection.items() if v and k != "_id"]
+        if included:
+            return {k: doc[k] for k in included if k in doc}
+        return {k: v for k, v in doc.items() if projection.get(k, 1)}
+
+    def _get_db_documents(self, symbols=None, force_refresh=False, profile="full"):
+        """
+        統一的數據庫文檔獲取方法；profile 為 READ_PROFILES 中的讀取配置
+
+        本進程寫入過的 symbol 直接由寫穿緩存返回，只有未緩存的（例如其他進程寫入的）symbol 才查詢數據庫。
+        """
         if symbols is None:
             symbols = self.list_of_symbols
-            
-        cache_key = f"{'-'.join(sorted(symbols))}_{self.ny_today}"
-        
-        if not force_refresh and cache_key in self._db_cache:
+
+        documents = []
+        missing = []
+        for symbol in symbols:
+            doc = None if force_refresh else self._doc_cache.get((symbol, self.ny_today))
+            if doc is None:
+                missing.append(symbol)
+            else:
+                documents.append(self._project_cached(doc, profile))
+
+        if missing:
+            logger.info(f"Querying database for {len(missing)} symbols on {self.ny_today} ({len(documents)} cached)")
+            fetched = self.storage.find_doc(
+                "fundamentals_of_top_list_symbols",
+                {
+                    "symbol": {"$in": missing},
+                    "today_date": self.ny_today
+                },
+                self.READ_PROFILES[profile]
+            )
+            if self.READ_PROFILES[profile] is None:
+                for doc in fetched:
+                    self._cache_put(doc["symbol"], self.ny_today, doc)
+            documents.extend(fetched)
+        else:
             logger.info(f"Using cached data for {len(symbols)} symbols")
-            return self._db_cache[cache_key]
-        
-        logger.info(f"Querying database for {len(symbols)} symbols on {self.ny_today}")
-        documents = self.mongo_handler.find_doc(
-            "fundamentals_of_top_list_symbols",
-            {
-                "symbol": {"$in": symbols},
-                "today_date": self.ny_today
-            }
-        )
-        
-        logger.info(f"Found {len(documents)} documents in database")
-        self._db_cache[cache_key] = documents
+
+        logger.info(f"Found {len(documents)} documents ({profile})")
         return documents
 
+    def _get_symbols_with_field(self, field):
+        """返回今天已有非空 field 的 symbol 集合；未緩存的 symbol 只從數據庫取回 symbol 字段"""
+        found = set()
+        missing = []
+        for symbol in self.list_of_symbols:
+            doc = self._doc_cache.get((symbol, self.ny_today))
+            if doc is None:
+                missing.append(symbol)
+            elif doc.get(field) not in (None, ""):
+                found.add(symbol)
+
+        if missing:
+            documents = self.storage.find_doc(
+                "fundamentals_of_top_list_symbols",
+                {
+                    "symbol": {"$in": missing},
+                    "today_date": self.ny_today,
+                    field: {"$nin": [None, ""]}
+                },
+                self.READ_PROFILES["existence"]
+            )
+            found.update(doc["symbol"] for doc in documents)
+        return found
+
     def check_merge_errors(self):
-        """檢查合併錯誤"""
-        error_data = self.mongo_handler.find_doc(
+        """
+        檢查合併錯誤（維護用途，不在每次運行中執行）
+
+        寫入時已由 validate_fundamental 校驗，這裡只清理舊版本遺留的、缺少 close_change_percentage 的文檔。
+        """
+        error_data = self.storage.find_doc(
+            "fundamentals_of_top_list_symbols",
+            {"close_change_percentage": {"$exists": False}},
+            self.READ_PROFILES["existence"]
+        )
+        if not error_data:
+            logger.info(f"No errors in fundamental data")
+            return False
+
+        logger.warning(f"Error: 已找到 {len(error_data)} 個錯誤: Symbols: {[doc.get('symbol') for doc in error_data]}")
+        deleted = self.storage.delete_doc(
             "fundamentals_of_top_list_symbols",
             {"close_change_percentage": {"$exists": False}}
         )
-        print(f"Length of error data: {len(error_data)}")
-        if len(error_data) > 0:
-            logger.warning(f"Error: 已找到 {len(error_data)} 個錯誤: Symbols: {error_data[0]['symbol']}")
-            logger.warning(f"Error in fundamental data for symbol: {error_data[0]['symbol']}")
-            
-            # 刪除錯誤數據
-            for error_doc in error_data:
-                try:
-                    self.mongo_handler.delete_doc(
-                        "fundamentals_of_top_list_symbols",
-                        {"close_change_percentage": {"$exists": False}}
-                    )
-                    logger.info(f"已刪除錯誤數據: {error_doc['symbol']}")
-                except Exception as e:
-                    logger.error(f"刪除錯誤數據時出錯 {error_doc['symbol']}: {e}")
-                    exit()
-            
-            logger.info(f"已刪除所有錯誤數據")
+        if deleted is None:
+            logger.error("刪除錯誤數據時出錯")
         else:
-            logger.info(f"No errors in fundamental data")
-        return False
+            logger.info(f"已刪除 {deleted} 個錯誤數據")
+        return True
+
+    def validate_fundamental(self, record):
+        """按 REQUIRED_PRICE_FIELDS 校驗記錄，返回錯誤列表（空列表表示有效）"""
+        errors = []
+        for field, expected_type in self.REQUIRED_PRICE_FIELDS.items():
+            if field not in record:
+                errors.append(f"{field}: missing")
+                continue
+            value = record[field]
+            if value is None:
+                if field not in self.NULLABLE_PRICE_FIELDS:
+                    errors.append(f"{field}: missing")
+            elif isinstance(value, bool) or not isinstance(value, expected_type):
+                expected = "/".join(t.__name__ for t in (expected_type if isinstance(expected_type, tuple) else (expected_type,)))
+                errors.append(f"{field}: expected {expected}, got {type(value).__name__}")
+            elif isinstance(value, float) and value != value:
+                errors.append(f"{field}: NaN")
+        return errors
+
+    def quarantine_invalid_fundamentals(self, ny_today):
+        """校驗 self.fundamentals，無效記錄寫入隔離集合，返回有效記錄"""
+        valid = []
+        quarantined = []
+        self._quarantined_symbols = set()
+        for i, fundamental in enumerate(self.fundamentals):
+            errors = self.validate_fundamental(fundamental)
+            if not errors:
+                valid.append(fundamental)
+                continue
+            symbol = fundamental.get("symbol") or f"__index_{i}"
+            logger.warning(f"Symbol {symbol} 校驗失敗，寫入隔離集合: {errors}")
+            self._quarantined_symbols.add(symbol)
+            record = {k: v for k, v in fundamental.items() if k not in ChartBarStore.CHART_FIELDS and k != '_id'}
+            quarantined.append(({"symbol": symbol, "today_date": ny_today}, {"errors": errors, "record": record}))
+
+        if quarantined:
+            self.storage.bulk_upsert_docs(self.QUARANTINE_COLLECTION, quarantined)
+        return valid
 
     def get_fundamentals(self, symbol):
         """Get fundamental data for a single symbol using Polygon API."""
@@ -188,11 +316,7 @@ class DataHandler:
 
     def get_list_of_fundamentals(self, list_of_symbols):
         """Get fundamental data for multiple symbols using Polygon API."""
-        fundamentals = []
-        for symbol in list_of_symbols:
-            fundamental = self.get_fundamentals(symbol)
-            fundamentals.append(fundamental)
-        return fundamentals
+        return self._map_symbols(self.get_fundamentals, list_of_symbols)
 
     def get_analyzer_data(self, symbol):
         """Get market data for a single symbol using ChartAnalyzer."""
@@ -220,6 +344,7 @@ class DataHandler:
                 'most_volume_high': result['most_volume_high'],
                 'most_volume_low': result['most_volume_low'],
                 'key_levels': result.get('key_levels', []),
+                'key_levels_by_volume_tier': result.get('key_levels_by_volume_tier', {}),
                 '1m_chart_data': result['1m_chart_data'],
                 '5m_chart_data': result['5m_chart_data'],
                 '1d_chart_data': result['1d_chart_data']
@@ -242,6 +367,7 @@ class DataHandler:
                 'most_volume_high': None,
                 'most_volume_low': None,
                 'key_levels': [],
+                'key_levels_by_volume_tier': {},
                 '1m_chart_data': [],
                 '5m_chart_data': [],
                 '1d_chart_data': []
@@ -253,14 +379,7 @@ class DataHandler:
 
     def get_price_analyzer_results(self, list_of_symbols):
         """Get price analysis results for multiple symbols."""
-        price_analyzer_results = []
-        for symbol in list_of_symbols:
-            result = self.get_analyzer_data(symbol)
-            price_analyzer_results.append(result)
-            #print(result['1m_chart_data'][-1]['datetime'])
-            #   print(result['5m_chart_data'][-1]['datetime'])
-            #print(result['1d_chart_data'][-1]['datetime'])
-        return price_analyzer_results
+        return self._map_symbols(self.get_analyzer_data, list_of_symbols)
 
     def merge_fundamentals_and_price_data(self, list_of_symbols, fundamentals, price_analyzer_results):
         """Merge fundamental data with price analysis data."""
@@ -283,19 +402,14 @@ class DataHandler:
     def perform_short_squeeze_analysis(self):
         """Perform short squeeze analysis on fundamental data."""
         logger.info("Starting Short Squeeze Analysis")
-        list_of_short_squeeze_results = []
-        
-        for fundamental in self.fundamentals:
-            short_squeeze_results = self.squeeze_scanner.run(
-                new_stock_data=fundamental,
-                current_price=fundamental['day_close'],
-                intraday_high=fundamental['day_high'],
-                short_interest=None,
-                as_json=True
-            )
-            list_of_short_squeeze_results.append(short_squeeze_results)
-            logger.info(f"Short Squeeze Analysis for {fundamental['symbol']} Ready!")
-            #self.squeeze_scanner.print_readable_analysis()
+        
+        # 一次性對所有符號做向量化分析，結果與逐個 run(as_json=True) 相同
+        list_of_short_squeeze_results = self.squeeze_scanner.run_batch(
+            self.fundamentals,
+            current_prices=[fundamental['day_close'] for fundamental in self.fundamentals],
+            intraday_highs=[fundamental['day_high'] for fundamental in self.fundamentals],
+            short_interests=None
+        )
 
         logger.info(f"Short Squeeze Analysis Lengths: {len(list_of_short_squeeze_results)}")
         
@@ -316,7 +430,7 @@ class DataHandler:
 
     def handle_symbols(self, list_of_symbols):
         """Process symbols to get fundamentals, price data, and short squeeze analysis."""
-        logger.info(f"處理 {len(list_of_symbols)} 個符號的數據")
+        logger.info(f"處理 {len(list_of_symbols)} 個符號的數據 (並發數: {self.max_workers})")
         
         # Get price analysis results
         price_analyzer_results = self.get_price_analyzer_results(list_of_symbols)
@@ -338,236 +452,202 @@ class DataHandler:
         # Perform short squeeze analysis
         return self.perform_short_squeeze_analysis() #return fundamentals with short squeeze analysis
 
+    def _get_latest_docs(self, symbols, date_list):
+        """
+        返回 {symbol: 最近 date_list 內最新的文檔}
+
+        在服務端以聚合管道每個 symbol 只返回一份文檔：先 $project 去掉圖表數組，再按 (symbol, today_date)
+        同為降序排序（與唯一索引 (symbol:1, today_date:1) 完全反向，可走索引，無需內存排序）後取 $first；
+        聚合失敗時回退為取回全部文檔並在 Python 中按 symbol 建立字典索引。
+        """
+        query = {"symbol": {"$in": symbols}, "today_date": {"$in": date_list}}
+        # 新數據總是包含圖表字段，合併時舊圖表會被覆蓋，無需取回
+        projection = self.READ_PROFILES["summary"]
+
+        latest = self.storage.aggregate_docs(
+            "fundamentals_of_top_list_symbols",
+            [
+                {"$match": query},
+                {"$project": projection},
+                {"$sort": {"symbol": -1, "today_date": -1}},
+                {"$group": {"_id": "$symbol", "doc": {"$first": "$$ROOT"}}},
+                {"$replaceRoot": {"newRoot": "$doc"}},
+            ]
+        )
+        if latest is not None:
+            return {doc["symbol"]: doc for doc in latest}
+
+        logger.warning("聚合查詢失敗，回退為逐文檔比較")
+        latest_docs = {}
+        for doc in self.storage.find_doc("fundamentals_of_top_list_symbols", query, projection):
+            current = latest_docs.get(doc["symbol"])
+            if current is None or doc["today_date"] > current["today_date"]:
+                latest_docs[doc["symbol"]] = doc
+        return latest_docs
+
     def store_fundamentals_in_db(self):
         """Store or update fundamental data in MongoDB - 添加詳細調試信息"""
         logger.info(f"開始保存 {len(self.fundamentals)} 個基本面數據到數據庫")
         
-        # 檢查數據完整性
-        for i, fundamental in enumerate(self.fundamentals):
-            if not fundamental.get('symbol'):
-                logger.error(f"第 {i} 個基本面數據缺少 symbol 字段: {fundamental}")
-                continue
-            
-            # 檢查是否有必要的價格數據
-            required_fields = ['day_close', 'close_change_percentage']
-            missing_fields = [field for field in required_fields if field not in fundamental or fundamental[field] is None]
-            if missing_fields:
-                logger.warning(f"Symbol {fundamental['symbol']} 缺少字段: {missing_fields}")
-        
         ny_time = datetime.now(ZoneInfo("America/New_York"))
         ny_today = ny_time.strftime('%Y-%m-%d')
+
+        # 寫入前校驗，無效記錄隔離，不進入主集合
+        fundamentals = self.quarantine_invalid_fundamentals(ny_today)
+        if not fundamentals:
+            logger.error("沒有通過校驗的基本面數據可保存")
+            return
         date_list = [(ny_time - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(7)]
         
         logger.info(f"查詢最近 7 天的數據: {date_list}")
 
-        # Query recent fundamental documents
-        recent_fundamental_docs = self.mongo_handler.find_doc(
-            "fundamentals_of_top_list_symbols",
-            {
-                "symbol": {"$in": [f["symbol"] for f in self.fundamentals]},
-                "today_date": {"$in": date_list}
-            }
-        )
-        
-        logger.info(f"找到 {len(recent_fundamental_docs)} 個最近的基本面文檔")
-        recent_symbols = set(doc["symbol"] for doc in recent_fundamental_docs)
-        
-        # 保存計數器
-        saved_count = 0
-        updated_count = 0
-
-        for fundamental in self.fundamentals:
+        # 每個 symbol 最近 7 天中最新的一筆舊資料
+        latest_docs = self._get_latest_docs([f["symbol"] for f in fundamentals], date_list)
+        logger.info(f"找到 {len(latest_docs)} 個符號的最近基本面文檔")
+
+        # 圖表K線追加到 chart_bars 集合，基本面文檔只保留摘要
+        self.store_chart_bars(fundamentals)
+
+        # 只 $set 相對上一次寫入有變化的字段；K線已由 ChartBarStore 以 $push 追加
+        tracker = get_doc_diff_tracker()
+        operations = []
+        symbols = []
+        skipped_symbols = []
+        written_docs = {}
+        bytes_written = 0
+        full_bytes = 0
+        for fundamental in fundamentals:
             symbol = fundamental["symbol"]
             fundamental["today_date"] = ny_today
-
-            # 取出這個 symbol 最近 7 天的舊資料
-            recent_docs = [doc for doc in recent_fundamental_docs if doc["symbol"] == symbol]
-            
-            if recent_docs:
-                # 找到最新的那筆（若有多筆）
-                latest_doc = max(recent_docs, key=lambda d: d["today_date"])
-
+            query_keys = {"symbol": symbol, "today_date": ny_today}
+            latest_doc = latest_docs.get(symbol)
+            if latest_doc:
                 # 保留舊資料中其他字段，更新為新資料（新資料優先）
-                merged_data = {**latest_doc, **fundamental}
-                merged_data["today_date"] = ny_today  # 一定是今天
+                data = {**latest_doc, **fundamental}
+                data["today_date"] = ny_today  # 一定是今天
+            else:
+                data = fundamental
 
-                try:
-                    result = self.mongo_handler.upsert_doc(
-                        "fundamentals_of_top_list_symbols",
-                        {"symbol": symbol, "today_date": ny_today},
-                        merged_data
-                    )
-                    logger.info(f"更新 {symbol}：合併舊資料後保存為今天的資料")
-                    updated_count += 1
-                except Exception as e:
-                    logger.error(f"更新 {symbol} 時出錯: {e}")
+            if latest_doc and latest_doc["today_date"] == ny_today:
+                # 今天的文檔已存在，以數據庫中的版本作為比較基準
+                tracker.seed("fundamentals_of_top_list_symbols", query_keys, latest_doc)
+                changes = tracker.diff("fundamentals_of_top_list_symbols", query_keys, data)
             else:
-                # 沒有舊資料，直接插入今天的資料
-                try:
-                    result = self.mongo_handler.upsert_doc(
-                        "fundamentals_of_top_list_symbols",
-                        {"symbol": symbol, "today_date": ny_today},
-                        fundamental
-                    )
-                    logger.info(f"新增 {symbol} 為今天的新資料")
-                    saved_count += 1
-                except Exception as e:
-                    logger.error(f"儲存 {symbol} 時出錯: {e}")
+                # 今天的文檔不存在（或已被刪除），寫入完整數據
+                tracker.forget("fundamentals_of_top_list_symbols", query_keys)
+                changes = {k: v for k, v in data.items() if k != '_id'}
+
+            written_docs[symbol] = {k: v for k, v in data.items() if k != '_id'}
+            full_bytes += tracker.encoded_size(written_docs[symbol])
+            if not changes:
+                skipped_symbols.append(symbol)
+                continue
+            bytes_written += tracker.encoded_size(changes)
+            operations.append((query_keys, changes))
+            symbols.append(symbol)
+
+        symbol_count = len(symbols) + len(skipped_symbols)
+        if symbol_count:
+            logger.info(
+                f"差異寫入: {len(symbols)} 個有變化, {len(skipped_symbols)} 個無變化跳過; "
+                f"平均每個符號寫入 {bytes_written / symbol_count:.0f} bytes (完整寫入 {full_bytes / symbol_count:.0f} bytes)"
+            )
 
-        
-        # 驗證保存結果
-        time.sleep(1)
-        verification_docs = self.mongo_handler.find_doc(
+        # 所有 upsert 以一次無序 bulk_write 發送，直接以返回的計數驗證，不再 sleep 後重新查詢
+        result = self.storage.bulk_upsert_docs(
             "fundamentals_of_top_list_symbols",
-            {
-                "symbol": {"$in": [f["symbol"] for f in self.fundamentals]},
-                "today_date": ny_today
-            }
+            operations,
+            unset_fields=ChartBarStore.CHART_FIELDS.keys()  # 移除舊版內嵌的圖表數組
         )
-        logger.info(f"驗證: 數據庫中找到 {len(verification_docs)} 個今日文檔")
-        
-        # 檢查是否所有數據都已保存
-        saved_symbols = set(doc["symbol"] for doc in verification_docs)
-        missing_symbols = set(f["symbol"] for f in self.fundamentals) - saved_symbols
-        if missing_symbols:
-            logger.error(f"以下符號的數據未能保存到數據庫: {missing_symbols}")
+        if result is None:
+            for query_keys, _ in operations:
+                tracker.forget("fundamentals_of_top_list_symbols", query_keys)
+            logger.error(f"以下符號的數據未能保存到數據庫: {set(symbols)}")
+            return
+
+        failed_symbols = {symbols[err["index"]] for err in result["write_errors"]}
+        for err in result["write_errors"]:
+            logger.error(f"儲存 {symbols[err['index']]} 時出錯: {err['errmsg']}")
+
+        for query_keys, changes in operations:
+            if query_keys["symbol"] in failed_symbols:
+                tracker.forget("fundamentals_of_top_list_symbols", query_keys)
+            else:
+                tracker.commit("fundamentals_of_top_list_symbols", query_keys, changes)
+
+        # 寫穿緩存：成功寫入和無變化的文檔，後續步驟不必再從數據庫讀取
+        for symbol, doc in written_docs.items():
+            if symbol not in failed_symbols:
+                self._cache_put(symbol, ny_today, doc)
+
+        upserted = set(result["upserted_indexes"])
+        updated_count = sum(1 for i, symbol in enumerate(symbols) if i not in upserted and symbol not in failed_symbols)
+        logger.info(f"驗證: 更新 {updated_count} 個, 新增 {result['upserted_count']} 個今日文檔")
+
+        if result["matched_count"] + result["upserted_count"] < len(operations) - len(failed_symbols):
+            logger.error(
+                f"bulk upsert 計數不符: 匹配 {result['matched_count']} + 新增 {result['upserted_count']}"
+                f" < {len(operations) - len(failed_symbols)}"
+            )
+        if failed_symbols:
+            logger.error(f"以下符號的數據未能保存到數據庫: {failed_symbols}")
         else:
             logger.info("所有基本面數據已成功保存到數據庫")
 
+    def store_chart_bars(self, fundamentals=None):
+        """將 fundamentals 中的 1m/5m/1d 圖表數組追加到 ChartBarStore，並以 chart_bars 摘要取代"""
+        items = []
+        for fundamental in (self.fundamentals if fundamentals is None else fundamentals):
+            symbol = fundamental.get("symbol")
+            if not symbol:
+                continue
+            summary = {}
+            for field, timeframe in ChartBarStore.CHART_FIELDS.items():
+                records = fundamental.pop(field, None) or []
+                summary[timeframe] = ChartBarStore.summarize(records)
+                if records:
+                    items.append((symbol, timeframe, records))
+            fundamental["chart_bars"] = summary
+
+        appended = self.chart_bar_store.append_many(items)
+        logger.info(f"圖表K線: 追加 {sum(appended.values())} 根 ({len(appended)}/{len(items)} 個序列)")
+        return appended
+
     def process_suggestions(self):
         """統一處理建議的方法 - 使用 Polygon API 的新聞數據和 OpenAI 分析"""
         logger.info("Processing suggestions...")
         
-        # 獲取數據庫中已有建議的文檔
-        documents = self._get_db_documents()
-        existing_suggestions_symbols = {
-            doc["symbol"] for doc in documents 
-            if doc.get("suggestion")
-        }
+        # 獲取數據庫中已有建議的符號
+        existing_suggestions_symbols = self._get_symbols_with_field("suggestion")
         
         logger.info(f"找到 {len(existing_suggestions_symbols)} 個已有建議的符號")
         
         # 找出需要分析的新符號
+        # 本輪被隔離的符號沒有主文檔（update_doc 不會創建），跳過以免每輪重複調用 OpenAI
         symbols_to_analyze = [
             symbol for symbol in self.list_of_symbols 
-            if symbol not in existing_suggestions_symbols
+            if symbol not in existing_suggestions_symbols and symbol not in self._quarantined_symbols
         ]
         
         # 為新符號獲取新聞和分析
         if symbols_to_analyze:
             logger.info(f"正在為 {len(symbols_to_analyze)} 個新符號分析建議")
-            new_suggestions = []
-            
+
             # 初始化 Summarizer (包含 OpenAI 客戶端)
             summarizer = Summarizer()
-            
-            for symbol in symbols_to_analyze:
-                print("================================================")
-                print(f"\n\n\n📰 Fetching news...:{symbol}")
-                
-                news_data = []  # Initialize news_data list here
-                
-                try:
-                    # 使用 Polygon API 獲取新聞
-                    news_generator = self.polygon_controller.polygon_client.list_ticker_news(
-                        ticker=symbol,
-                        limit=5,
-                        order='desc',
-                        sort='published_utc'
-                    )
-                    
-                    # 將生成器轉換為列表
-                    news_list = list(news_generator) if news_generator else []
-                    
-                    if news_list:
-                        # 處理新聞數據
-                        for item in news_list:
-                            try:
-                                # 轉換時間戳為UTC時間
-                                published_time = datetime.fromisoformat(item.published_utc.replace('Z', '+00:00'))
-                                # 確保時間是UTC時區
-                                if published_time.tzinfo is None:
-                                    published_time = published_time.replace(tzinfo=ZoneInfo("UTC"))
-                                utc_timestamp = int(published_time.timestamp())
-                                
-                                news_item = {
-                                    "title": item.title,
-                                    "link": item.article_url,
-                                    "publisher": item.publisher.name if hasattr(item.publisher, 'name') else item.publisher,
-                                    "symbols": [symbol.upper()],  # 保持與原格式一致
-                                    "utcTime": utc_timestamp,
-                                    "keywords": item.tickers if hasattr(item, 'tickers') else []
-                                }
-                                news_data.append(news_item)
-                            except Exception as e:
-                                logger.error(f"處理新聞項目時出錯: {e}")
-                                continue
-
-                        
-                    # region Newsfilter API
-                    news_filter_api = NewsfilterAPI()
-                    news_filter_api_result = news_filter_api.get_news_from_newsfilter(symbol)
-                    # API returns a list directly, not {"articles": [...]}
-                    if isinstance(news_filter_api_result, list) and len(news_filter_api_result) > 0:
-                        for article in news_filter_api_result:
-                            try:
-                                # API returns 'timestamp' (unix epoch) directly
-                                utc_timestamp = article.get('timestamp', 0)
-                                
-                                news_item = {
-                                    "title": article.get('title', ''),
-                                    "link": article.get('link', ''),
-                                    "publisher": article.get('source', 'Unknown'),  # source is a string
-                                    "symbols": article.get('tickers', [symbol.upper()]),
-                                    "utcTime": utc_timestamp,
-                                    "keywords": article.get('keywords', []),
-                                    "html_content": article.get('summary', '')  # use summary as content
-                                }
-                                print(f"🔍 ===========News Item: {news_item}")
-                                news_data.append(news_item)
-                            except Exception as e:
-                                logger.error(f"處理 Newsfilter 新聞項目時出錯: {e}")
-                                continue
-
-                    if news_data:
-                        # 使用原有的 RVLNewsAnalyzer 來處理新聞
-                        news_analyzer = RVLNewsAnalyzer()
-                        summaries = news_analyzer.analyze(news_data)
-                        print(f"\n\n 📰 Summaries for {symbol.upper()}: {json.dumps(summaries, indent=2, ensure_ascii=False)}")
-                        
-                        if summaries != []:
-                            suggestion = summarizer.suggestion(summaries)
-                            print(f"\n\n 📰 Suggestion for {symbol.upper()}: {suggestion}")
-                        else:
-                            suggestion = "No recent news available"
-                        
-                        new_suggestions.append({"symbol": symbol, "suggestion": suggestion})
-                        
-                        # 保存到數據庫
-                        try:
-                            result = self.mongo_handler.upsert_doc(
-                                "fundamentals_of_top_list_symbols",
-                                {"symbol": symbol, "today_date": datetime.now(ZoneInfo("America/New_York")).strftime('%Y-%m-%d')},
-                                {"suggestion": suggestion}
-                            )
-                            logger.info(f"保存建議 {symbol}: {result}")
-                        except Exception as e:
-                            logger.error(f"保存建議 {symbol} 時出錯: {e}")
-                    
-                    else:
-                        logger.warning(f"沒有找到 {symbol} 的新聞")
-                        new_suggestions.append({"symbol": symbol, "suggestion": "No recent news available"})
-                        
-                except Exception as e:
-                    logger.error(f"❌ Failed to fetch news for {symbol.upper()}: {e}")
-                    if hasattr(e, "response") and e.response:
-                        logger.error(f"Status Code: {e.response.status_code}")
-                        logger.error(f"Response: {e.response.text}")
-                    new_suggestions.append({"symbol": symbol, "suggestion": f"Error fetching news: {str(e)}"})
-
-            # 刷新緩存
-            self._get_db_documents(force_refresh=True)
-            
+
+            # 新聞抓取、頁面抓取和 OpenAI 調用跨 symbol 並發，每個 symbol 完成後立即保存
+            pipeline = SuggestionPipeline(
+                self.polygon_controller.polygon_client,
+                summarizer,
+                on_ready=self._save_suggestion
+            )
+            new_suggestions = [
+                {"symbol": result["symbol"], "suggestion": result["suggestion"]}
+                for result in pipeline.run(symbols_to_analyze)
+            ]
+            log_upstream_stats()
+
             # 打印新建議
             self.print_readable_suggestions(new_suggestions)
             
@@ -576,23 +656,36 @@ class DataHandler:
         logger.info("No new symbols need suggestion analysis")
         return 0
 
+    def _save_suggestion(self, result):
+        """SuggestionPipeline 的回調：保存成功生成的建議"""
+        if result["status"] != "ok":
+            return
+        symbol = result["symbol"]
+        # 只更新已通過校驗寫入的文檔，不 upsert 出缺少價格字段的文檔
+        today_date = datetime.now(ZoneInfo("America/New_York")).strftime('%Y-%m-%d')
+        update_result = self.storage.update_doc(
+            "fundamentals_of_top_list_symbols",
+            {"symbol": symbol, "today_date": today_date},
+            {"suggestion": result["suggestion"]}
+        )
+        if update_result is not None:
+            self._cache_update(symbol, today_date, {"suggestion": result["suggestion"]})
+        logger.info(f"保存建議 {symbol}: {update_result}")
+
     def process_sec_analysis(self):
         """統一處理SEC分析的方法"""
         logger.info("Processing SEC filing analysis...")
         
         # 獲取已有SEC分析的符號
-        documents = self._get_db_documents()
-        analyzed_symbols = {
-            doc["symbol"] for doc in documents 
-            if doc.get("sec_filing_analysis")
-        }
+        analyzed_symbols = self._get_symbols_with_field("sec_filing_analysis")
         
         logger.info(f"找到 {len(analyzed_symbols)} 個已有SEC分析的符號")
         
         # 找出需要分析的符號
+        # 本輪被隔離的符號沒有主文檔，跳過
         symbols_to_analyze = [
             symbol for symbol in self.list_of_symbols 
-            if symbol not in analyzed_symbols
+            if symbol not in analyzed_symbols and symbol not in self._quarantined_symbols
         ]
         
         if symbols_to_analyze:
@@ -614,29 +707,33 @@ class DataHandler:
             for analysis_result in analysis_results:
                 symbol = analysis_result["Symbol"]
                 try:
-                    result = self.mongo_handler.upsert_doc(
+                    result = self.storage.update_doc(
                         "fundamentals_of_top_list_symbols",
                         {"symbol": symbol, "today_date": self.ny_today},
                         {"sec_filing_analysis": analysis_result}
                     )
+                    if result is not None:
+                        self._cache_update(symbol, self.ny_today, {"sec_filing_analysis": analysis_result})
                     logger.info(f"保存SEC分析 {symbol}: {result}")
                 except Exception as e:
                     logger.error(f"保存SEC分析 {symbol} 時出錯: {e}")
             
-            # 刷新緩存
-            self._get_db_documents(force_refresh=True)
-            
             return len(analysis_results)
         
         logger.info("No new symbols need SEC analysis")
         return 0
 
     def build_final_results(self):
-        """構建最終結果"""
+        """
+        構建最終結果
+
+        返回的基本面文檔不含 1m/5m/1d 圖表數組，只有 chart_bars 摘要；
+        K線需要時以 self.chart_bar_store.get_bars(symbol, 週期) 讀取。
+        """
         logger.info("Building final results...")
         
-        # 獲取所有今日的基本面文檔
-        documents = self._get_db_documents()
+        # 獲取所有今日的基本面文檔（完整字段；圖表K線存於 chart_bars 集合，不在文檔中）
+        documents = self._get_db_documents(profile="full")
         
         # 構建最終結果
         final_fundamentals = []
@@ -681,7 +778,7 @@ class DataHandler:
         logger.info(f"符號列表: {list_of_symbols}")
         
         self.list_of_symbols = list_of_symbols
-        self._db_cache.clear()  # 清空緩存
+        self._doc_cache.clear()  # 清空緩存
         
         # Step 1: 處理符號並獲取基本面數據和分析
         logger.info("=== Step 1: 處理符號和基本面數據 ===")
@@ -709,10 +806,6 @@ class DataHandler:
         logger.info("=== Step 5: 構建最終結果 ===")
         final_fundamentals, final_sec_analyses = self.build_final_results()
         
-        # Step 6: 檢查合併錯誤
-        logger.info("=== Step 6: 檢查合併錯誤 ===")
-        self.check_merge_errors()
-        
         logger.info(f"""
         === 處理完成！ ===
         - 處理符號數量: {len(self.list_of_symbols)}
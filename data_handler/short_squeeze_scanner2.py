@@ -242,6 +242,141 @@ class ShortSqueezeScanner:
         else:
             return results
     
+    def run_batch(self, stock_data_list, current_prices=None, intraday_highs=None, short_interests=None):
+        """
+        Execute the analysis for many stocks at once using column-wise NumPy arrays
+        
+        Produces the same per-symbol dictionaries as calling run(..., as_json=True)
+        once per stock, but converts and scores every symbol in a single pass
+        instead of building and tearing down a one-row DataFrame per symbol.
+        Fields are only emitted for a symbol when its own record carries the
+        inputs they depend on, exactly as in the single-record path.
+        
+        Args:
+            stock_data_list: List of stock data dictionaries
+            current_prices: List of current prices (None entries allowed)
+            intraday_highs: List of day highs (None entries allowed)
+            short_interests: List of short interest values (None entries allowed)
+            
+        Returns:
+            List of result dictionaries in the same order as stock_data_list
+        """
+        records = list(stock_data_list)
+        n = len(records)
+        if n == 0:
+            return []
+        if not all(isinstance(record, dict) for record in records):
+            raise TypeError("Input must be a list of dicts")
+
+        current_prices = list(current_prices) if current_prices is not None else [None] * n
+        intraday_highs = list(intraday_highs) if intraday_highs is not None else [None] * n
+        short_interests = list(short_interests) if short_interests is not None else [None] * n
+
+        def present(key):
+            return np.array([key in record for record in records], dtype=bool)
+
+        def values(key):
+            return pd.Series([record.get(key) for record in records], dtype=object)
+
+        def numeric(key):
+            return pd.to_numeric(values(key), errors='coerce').to_numpy(dtype=float)
+
+        def optional_floats(items):
+            return np.array([np.nan if item is None else item for item in items], dtype=float), \
+                np.array([item is not None for item in items], dtype=bool)
+
+        has_float = present('float')
+        has_outstanding = present('outstandingshares')
+        has_cash = present('cash (usd)')
+        float_shares = numeric('float')
+        outstanding = numeric('outstandingshares')
+        cash = numeric('cash (usd)')
+        price, has_price = optional_floats(current_prices)
+        day_high, has_day_high = optional_floats(intraday_highs)
+        short_interest, has_short_interest = optional_floats(short_interests)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 1. Float liquidity risk
+            float_risk = np.select(
+                [float_shares < 1e6, (float_shares >= 1e6) & (float_shares < 5e6)],
+                ['Extreme Risk (Float <1M)', 'High Risk (1M≤Float<5M)'],
+                default='Acceptable'
+            )
+
+            # 2. Float/OutstandingShares ratio risk
+            has_ratio = has_float & has_outstanding
+            float_ratio = float_shares / outstanding
+            float_ratio_warning = float_ratio < 0.4
+            float_ratio_risk = np.where(float_ratio_warning, 'Warning (Float/Outstanding <40%)', 'Normal')
+
+            # 3. Cash crisis indicator
+            has_cash_ratio = has_price & has_outstanding & has_cash
+            cash_mcap = cash / (outstanding * price)
+            cash_crisis = (cash_mcap < 0.1).astype(int)
+
+            # 4. Short interest crowding
+            short_risk = np.where(
+                has_short_interest & has_float,
+                (short_interest / float_shares > 0.3).astype(float),
+                0.0
+            )
+
+            # Composite squeeze score: same weights and summation order as calculate_squeeze_risk
+            float_term_weight = np.where(has_float, 0.5, 0.0)
+            ratio_term_weight = np.where(has_ratio, 0.2, 0.0)
+            cash_term_weight = np.where(has_cash_ratio, 0.1, 0.0)
+            total_weight = float_term_weight + ratio_term_weight + 0.2 + cash_term_weight
+            squeeze_score = 0.0
+            squeeze_score = squeeze_score + np.where(
+                has_float, (0.5 * (float_risk == 'Extreme Risk (Float <1M)').astype(float)) * (0.5 / total_weight), 0.0)
+            squeeze_score = squeeze_score + np.where(
+                has_ratio, (0.2 * float_ratio_warning.astype(float)) * (0.2 / total_weight), 0.0)
+            squeeze_score = squeeze_score + (0.2 * short_risk) * (0.2 / total_weight)
+            squeeze_score = squeeze_score + np.where(
+                has_cash_ratio, (0.1 * cash_crisis) * (0.1 / total_weight), 0.0)
+
+            # ATM offering urgency
+            shelf_dates = values('last shelf date').replace('None', pd.NaT)
+            shelf_days_left = (pd.to_datetime(shelf_dates, errors='coerce', format='mixed') - datetime.now()).dt.days.to_numpy(dtype=float)
+            burn_rate = numeric('burn rate (months)')
+            atm_urgency = (present('last shelf date') & present('burn rate (months)')
+                           & (burn_rate < shelf_days_left / 30)).astype(int)
+
+            # Technical resistance strength
+            resistance_ok = has_price & has_day_high & ((day_high - price) / day_high < 0.03)
+
+        # Market sentiment overheating (simple keyword matching)
+        keywords = ['breakthrough', 'surge', 'milestone', 'bullish', 'buy rating']
+        has_suggestion = present('suggestion')
+        hype_counts = values('suggestion').str.count('|'.join(keywords))
+        hype_score = [
+            (int(count) if not pd.isna(count) else None) if has_suggestion[i] else 0
+            for i, count in enumerate(hype_counts.tolist())
+        ]
+        hype_ok = np.array([score is not None and score >= 3 for score in hype_score], dtype=bool)
+
+        short_signal = (squeeze_score < 0.4) & (atm_urgency == 1) & resistance_ok & hype_ok
+
+        results = []
+        for i, record in enumerate(records):
+            result = {}
+            if 'symbol' in record:
+                result['symbol'] = record['symbol']
+            if has_float[i]:
+                result['float_risk'] = str(float_risk[i])
+            if has_ratio[i]:
+                result['float_ratio'] = float(float_ratio[i])
+                result['float_ratio_risk'] = str(float_ratio_risk[i])
+            result['squeeze_score'] = float(squeeze_score[i])
+            result['short_signal'] = bool(short_signal[i])
+            if has_cash_ratio[i]:
+                result['cash/mcap'] = float(cash_mcap[i])
+            result['atm_urgency'] = int(atm_urgency[i])
+            result['hype_score'] = hype_score[i]
+            results.append(result)
+
+        return results
+    
     def print_readable_analysis(self):
         """Generate human-readable analysis report"""
         if self.data is None or len(self.data) == 0:
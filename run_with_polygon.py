@@ -5,6 +5,9 @@ from data_handler._data_handler import DataHandler
 from utils._telegram.telegram_notifier import TelegramNotifier
 from utils._polygon.polygon_premarket_fetcher import PolygonController
 from utils._database.database_controller import DatabaseController
+from utils._polygon.polygon_client_registry import log_polygon_client_stats
+from api_polygon.daily_bar_store import get_daily_bar_store
+from utils._database._mongodb.mongo_session import log_mongo_session_stats
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
@@ -17,10 +20,10 @@ def main(debug = False):
 
         #region Get Top Gainers
         pc = PolygonController()
-        top_gainers_price_data = pc.get_top_gainers_data(debug=debug)
-        top_gainers_symbols = pc.get_top_gainers_list()
-        filtered_top_gainers_symbols = pc.get_filtered_top_gainers_list()
-        clean_filtered_top_gainers_symbols = pc.clean_symbols(filtered_top_gainers_symbols)
+        top_gainers_snapshot = pc.get_top_gainers_snapshot(debug=debug)
+        top_gainers_price_data = top_gainers_snapshot["data"]
+        top_gainers_symbols = top_gainers_snapshot["tickers"]
+        clean_filtered_top_gainers_symbols = top_gainers_snapshot["clean_filtered"]
 
         # Check if we have any symbols to process
         if not clean_filtered_top_gainers_symbols:
@@ -36,10 +39,12 @@ def main(debug = False):
 
         # Only try to print data if we have results
         if top_gainners_fundamentals and len(top_gainners_fundamentals) > 0:
-            # 檢查是否有圖表數據
-            if '1m_chart_data' in top_gainners_fundamentals[0] and len(top_gainners_fundamentals[0]['1m_chart_data']) > 0:
+            # 檢查是否有圖表數據（K線保存在 chart_bars 集合，文檔中只有摘要）
+            first = top_gainners_fundamentals[0]
+            chart_summary = first.get('chart_bars', {}).get('1m', {})
+            if chart_summary.get('count'):
                 print("=== 第一個股票的第一筆 1 分鐘圖表數據 ===")
-                print(top_gainners_fundamentals[0]['1m_chart_data'][0])
+                print(data_handler.chart_bar_store.get_bars(first['symbol'], '1m', start=chart_summary['first_ts'], end=chart_summary['first_ts'])[:1])
                 print("\n\n")
             else:
                 logger.warning("圖表數據為空或不存在")
@@ -47,6 +52,10 @@ def main(debug = False):
         else:
             logger.info("No fundamental data returned from data handler")
 
+        log_polygon_client_stats()
+        get_daily_bar_store().log_stats()
+        log_mongo_session_stats()
+
     except Exception as e:
         error_msg = f"程序執行出錯：{str(e)}\n請檢查日誌獲取詳細信息。"
         send_msg_to_telegram(error_msg)
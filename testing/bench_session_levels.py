@@ -0,0 +1,224 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import timeit
+from datetime import datetime, time as dtime, timedelta
+from zoneinfo import ZoneInfo
+import numpy as np
+
+from api_polygon.api_chart import ChartAnalyzer
+from api_polygon.bar_series import BarSeries
+from api_polygon.session_levels import SessionLevels
+
+""" Benchmark: SessionLevels single-pass kernel vs. the original (baseline) list-of-dicts getters """
+
+NY_TZ = ZoneInfo("America/New_York")
+
+
+def make_bars(start, count, step_minutes, rng, volume_scale=1.0):
+    timestamps = [int((start + timedelta(minutes=step_minutes * i)).timestamp() * 1000) for i in range(count)]
+    close = 5 * np.cumprod(1 + rng.normal(0, 0.01, count))
+    open_ = np.r_[5.0, close[:-1]]
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, count))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, count))
+    volume = rng.integers(0, 50_000, count) * volume_scale
+    return BarSeries(timestamps, open_, high, low, close, volume, tz=NY_TZ)
+
+
+class BaselineGetters:
+    """基準版本（優化前）ChartAnalyzer 的各個 getter，原樣作用於 list-of-dicts K線"""
+
+    def __init__(self, data_1m, data_5m, data_1d):
+        self.market_open_time = dtime(9, 30)
+        self.data_1m = data_1m
+        self.data_5m = data_5m
+        self.data_1d = data_1d
+        self.update_last_day_data()
+
+    def update_last_day_data(self):
+        if not self.data_1m:
+            self.last_day_data_1m = []
+            return
+
+        all_dates = sorted(set(x["datetime"].date() for x in self.data_1m))
+        if all_dates:
+            last_date = all_dates[-1]
+            self.last_day_data_1m = [x for x in self.data_1m if x["datetime"].date() == last_date]
+        else:
+            self.last_day_data_1m = []
+
+    def to_two_decimal(self, value):
+        return round(value, 2) if value is not None else None
+
+    def get_premarket_data(self):
+        return [x for x in self.last_day_data_1m if x["datetime"].time() < self.market_open_time]
+
+    def get_market_data(self):
+        return [x for x in self.last_day_data_1m if x["datetime"].time() >= self.market_open_time]
+
+    def get_premarket_high(self):
+        premarket = self.get_premarket_data()
+        return self.to_two_decimal(max(x["high"] for x in premarket)) if premarket else None
+
+    def get_premarket_low(self):
+        premarket = self.get_premarket_data()
+        return self.to_two_decimal(min(x["low"] for x in premarket)) if premarket else None
+
+    def _market_open(self, time_range, field, reduce):
+        start = dtime(*map(int, time_range[0].split(":")))
+        end = dtime(*map(int, time_range[1].split(":")))
+        if not self.data_1m:
+            return None
+        last_date = self.data_1m[-1]["datetime"].date()
+        opens = [
+            x for x in self.data_1m
+            if x["datetime"].date() == last_date and start <= x["datetime"].time() <= end
+        ]
+        values = [x[field] for x in opens if field in x]
+        return self.to_two_decimal(reduce(values)) if values else None
+
+    def get_market_open_high(self, time_range=("09:31", "09:45")):
+        return self._market_open(time_range, "high", max)
+
+    def get_market_open_low(self, time_range=("09:31", "09:45")):
+        return self._market_open(time_range, "low", min)
+
+    def get_day_high(self):
+        if not self.last_day_data_1m:
+            return None
+        return self.to_two_decimal(max(x["high"] for x in self.last_day_data_1m))
+
+    def get_day_low(self):
+        market_data = self.get_market_data()
+        if not market_data:
+            return None
+        return self.to_two_decimal(min(x["low"] for x in market_data))
+
+    def get_day_close(self):
+        if not self.last_day_data_1m:
+            return None
+        sorted_data = sorted(self.last_day_data_1m, key=lambda x: x["datetime"])
+        return self.to_two_decimal(sorted_data[-1]["close"])
+
+    def get_yesterday_close(self):
+        if len(self.data_1d) < 2:
+            return None
+        sorted_data = sorted(self.data_1d, key=lambda x: x["datetime"])
+        return self.to_two_decimal(sorted_data[-2]["close"])
+
+    def get_high_change_percentage(self):
+        y_close = self.get_yesterday_close()
+        d_high = self.get_day_high()
+        if y_close and d_high:
+            return round((d_high - y_close) / y_close * 100, 2)
+        return None
+
+    def get_close_change_percentage(self):
+        y_close = self.get_yesterday_close()
+        d_close = self.get_day_close()
+        if y_close and d_close:
+            return round((d_close - y_close) / y_close * 100, 2)
+        return None
+
+    def get_most_volume_high(self):
+        greens = [x for x in self.last_day_data_1m if x["close"] >= x["open"] and x["volume"] > 0]
+        if not greens:
+            return None
+        most = max(greens, key=lambda x: x["volume"])
+        return self.to_two_decimal(most["high"])
+
+    def get_most_volume_low(self):
+        market_data = self.get_market_data()
+        reds = [x for x in market_data if x["close"] < x["open"] and x["volume"] > 0]
+        if not reds:
+            return None
+        most = max(reds, key=lambda x: x["volume"])
+        return self.to_two_decimal(most["low"])
+
+    def _get_volume_since_4am(self):
+        four_am = dtime(4, 0)
+        market_data = [x for x in self.data_5m if x["datetime"].time() >= four_am]
+        return sum(x["volume"] for x in market_data) if market_data else 0
+
+    def get_key_levels(self, level_number=5):
+        current_volume = self._get_volume_since_4am()
+        day_high = self.get_day_high()
+        if day_high is None:
+            return []
+
+        daily_candles = self.data_1d
+        if not daily_candles:
+            return []
+
+        filtered_candles = [
+            candle for candle in daily_candles
+            if candle["volume"] > current_volume and candle["high"] > day_high
+        ]
+
+        if not filtered_candles:
+            return []
+
+        key_levels = []
+        for candle in filtered_candles:
+            if candle["low"] > day_high:
+                key_levels.append(self.to_two_decimal(candle["low"]))
+            else:
+                key_levels.append(self.to_two_decimal(candle["high"]))
+
+        key_levels = sorted(list(set(key_levels)))
+        return key_levels[:level_number]
+
+
+def baseline_levels(baseline):
+    return {
+        "premarket_high": baseline.get_premarket_high(),
+        "premarket_low": baseline.get_premarket_low(),
+        "market_open_high": baseline.get_market_open_high(),
+        "market_open_low": baseline.get_market_open_low(),
+        "day_high": baseline.get_day_high(),
+        "day_low": baseline.get_day_low(),
+        "day_close": baseline.get_day_close(),
+        "yesterday_close": baseline.get_yesterday_close(),
+        "high_change_percentage": baseline.get_high_change_percentage(),
+        "close_change_percentage": baseline.get_close_change_percentage(),
+        "most_volume_high": baseline.get_most_volume_high(),
+        "most_volume_low": baseline.get_most_volume_low(),
+        "key_levels": baseline.get_key_levels(),
+    }
+
+
+def kernel_levels(analyzer):
+    # 直接調用 SessionLevels.compute，繞過 get_session_levels 的緩存，測量每次運行的實際計算
+    levels = SessionLevels.compute(analyzer.last_day_bars_1m, analyzer.bars_5m, analyzer.bars_1d)
+    result = levels.to_dict()
+    result.pop("volume_since_4am")
+    result["key_levels"] = analyzer._compute_key_levels(levels.day_high, levels.volume_since_4am)
+    return result
+
+
+def build_analyzer(session_minutes=700, seed=7):
+    rng = np.random.default_rng(seed)
+    session_start = datetime(2025, 6, 10, 4, 15, tzinfo=NY_TZ)
+    bars_1m = make_bars(session_start, session_minutes, 1, rng)
+    bars_5m = BarSeries.concat([make_bars(session_start - timedelta(days=2), 400, 5, rng), bars_1m.resample(5)])
+    bars_1d = make_bars(datetime(2023, 6, 10, tzinfo=NY_TZ), 500, 1440, rng, volume_scale=2_000)
+    return ChartAnalyzer.from_bars("BENCH", bars_1m, bars_5m, bars_1d)
+
+
+if __name__ == "__main__":
+    number = 200
+    for session_minutes in (60, 330, 700):
+        analyzer = build_analyzer(session_minutes)
+        # 基準版本的輸入是 list-of-dicts，轉換不計入計時
+        baseline = BaselineGetters(analyzer.bars_1m.to_records(), analyzer.bars_5m.to_records(), analyzer.bars_1d.to_records())
+        legacy = baseline_levels(baseline)
+        kernel = kernel_levels(analyzer)
+        assert legacy == kernel, f"Mismatch:\n{legacy}\n{kernel}"
+
+        legacy_time = timeit.timeit(lambda: baseline_levels(baseline), number=number) / number
+        kernel_time = timeit.timeit(lambda: kernel_levels(analyzer), number=number) / number
+        print(
+            f"{session_minutes:>4} 1m bars | baseline getters: {legacy_time * 1e6:8.1f} µs | "
+            f"single-pass: {kernel_time * 1e6:8.1f} µs | speedup: {legacy_time / kernel_time:4.1f}x"
+        )
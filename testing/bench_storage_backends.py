@@ -0,0 +1,140 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import tempfile
+import argparse
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import numpy as np
+
+# DataHandler 初始化時會創建 Polygon 客戶端（不發出請求），基準測試不需要真實密鑰
+os.environ.setdefault("POLYGON_KEY", "bench")
+
+from data_handler._data_handler import DataHandler
+from utils._database.chart_bar_store import ChartBarStore
+from utils._database._mongodb.doc_diff_tracker import get_doc_diff_tracker
+from utils._database._sqlite.sqlite_handler import SqliteHandler
+
+""" Benchmark: the DataHandler storage workload on the SQLite backend vs. MongoDB (when reachable) """
+
+NY_TZ = ZoneInfo("America/New_York")
+COLLECTIONS = ("fundamentals_of_top_list_symbols", DataHandler.QUARANTINE_COLLECTION, ChartBarStore.COLLECTION)
+
+
+def make_records(start, count, step_minutes, rng):
+    close = 5 * np.cumprod(1 + rng.normal(0, 0.01, count))
+    return [
+        {
+            "datetime": start + timedelta(minutes=step_minutes * i),
+            "open": float(close[i - 1] if i else close[0]),
+            "high": float(close[i] * 1.01),
+            "low": float(close[i] * 0.99),
+            "close": float(close[i]),
+            "volume": int(rng.integers(0, 50_000)),
+        }
+        for i in range(count)
+    ]
+
+
+def make_fundamentals(symbol_count, session_start, minutes, rng):
+    fundamentals = []
+    for i in range(symbol_count):
+        bars_1m = make_records(session_start, minutes, 1, rng)
+        fundamentals.append({
+            "symbol": f"BN{i:03d}",
+            "day_close": bars_1m[-1]["close"],
+            "close_change_percentage": float(rng.uniform(-20, 80)),
+            "float": int(rng.integers(1_000_000, 50_000_000)),
+            "market_cap": float(rng.uniform(1e6, 1e9)),
+            "1m_chart_data": bars_1m,
+            "5m_chart_data": make_records(session_start, minutes // 5, 5, rng),
+            "1d_chart_data": make_records(session_start - timedelta(days=250), 250, 1440, rng),
+        })
+    return fundamentals
+
+
+def run_workload(handler, symbol_count, minutes, seed=7):
+    """與 DataHandler.run 相同的存儲步驟：兩次保存（第二次為增量）、查詢待處理 symbol、寫入建議、讀取最終結果"""
+    for name in COLLECTIONS:
+        handler.drop_collection(name)
+    get_doc_diff_tracker().clear()
+    data_handler = DataHandler(storage=handler)
+    rng = np.random.default_rng(seed)
+    timings = {}
+    session_start = datetime.now(NY_TZ).replace(second=0, microsecond=0) - timedelta(minutes=minutes + 1)
+
+    data_handler.fundamentals = make_fundamentals(symbol_count, session_start, minutes, rng)
+    data_handler.list_of_symbols = [f["symbol"] for f in data_handler.fundamentals]
+    start = time.perf_counter()
+    data_handler.store_fundamentals_in_db()
+    timings["store (initial)"] = time.perf_counter() - start
+
+    # 下一分鐘：價格變化 + 每個序列多一根K線
+    data_handler.fundamentals = make_fundamentals(symbol_count, session_start, minutes + 1, rng)
+    start = time.perf_counter()
+    data_handler.store_fundamentals_in_db()
+    timings["store (incremental)"] = time.perf_counter() - start
+
+    data_handler._doc_cache.clear()
+    start = time.perf_counter()
+    with_suggestion = data_handler._get_symbols_with_field("suggestion")
+    for symbol in data_handler.list_of_symbols:
+        if symbol not in with_suggestion:
+            handler.update_doc(
+                "fundamentals_of_top_list_symbols",
+                {"symbol": symbol, "today_date": data_handler.ny_today},
+                {"suggestion": f"bench suggestion for {symbol}"}
+            )
+    timings["suggestions"] = time.perf_counter() - start
+
+    data_handler._doc_cache.clear()
+    start = time.perf_counter()
+    documents, _ = data_handler.build_final_results()
+    timings["final results"] = time.perf_counter() - start
+    assert len(documents) == symbol_count, f"expected {symbol_count} documents, got {len(documents)}"
+
+    start = time.perf_counter()
+    bars = sum(len(data_handler.chart_bar_store.get_bars(symbol, "1m")) for symbol in data_handler.list_of_symbols)
+    timings["chart reads"] = time.perf_counter() - start
+    assert bars == symbol_count * (minutes + 1), f"expected {symbol_count * (minutes + 1)} 1m bars, got {bars}"
+
+    for name in COLLECTIONS:
+        handler.drop_collection(name)
+    return timings
+
+
+def mongo_handler_or_none():
+    if not os.getenv("MONGODB_CONNECTION_STRING"):
+        return None
+    from utils._database._mongodb.mongo_handler import MongoHandler
+    handler = MongoHandler()
+    return handler if handler.is_connected(force=True) else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=30)
+    parser.add_argument("--minutes", type=int, default=390)
+    args = parser.parse_args()
+    # MongoDB 只寫入獨立的基準測試數據庫
+    os.environ["MONGO_DBNAME"] = os.getenv("BENCH_MONGO_DBNAME", "bench_storage_backends")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sqlite_handler = SqliteHandler(os.path.join(tmp_dir, "bench.sqlite"))
+        results["sqlite"] = run_workload(sqlite_handler, args.symbols, args.minutes)
+        sqlite_handler.conn.close()
+
+    mongo_handler = mongo_handler_or_none()
+    if mongo_handler is not None:
+        results["mongodb"] = run_workload(mongo_handler, args.symbols, args.minutes)
+    else:
+        print("MongoDB not reachable (MONGODB_CONNECTION_STRING) - running the SQLite backend only")
+
+    backends = list(results)
+    print(f"\n{args.symbols} symbols, {args.minutes} 1m bars each")
+    print(f"{'step':<22}" + "".join(f"{backend:>12}" for backend in backends))
+    for step in results["sqlite"]:
+        print(f"{step:<22}" + "".join(f"{results[backend][step] * 1000:>10.1f}ms" for backend in backends))
@@ -0,0 +1,86 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils._news.article_fetcher import ArticleFetcher
+
+
+class StallingHandler(BaseHTTPRequestHandler):
+    """
+    /stall-mid-body：先送出部分正文，然後停頓到客戶端讀取超時
+    /stall-before-body：只送出響應頭就停頓
+    /drop-mid-body：送出部分正文後關閉連線（Content-Length 不足）
+    """
+    HEAD = b"<html><body><p>partial article text</p>"
+    release = threading.Event()
+    hits = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        StallingHandler.hits[self.path] = StallingHandler.hits.get(self.path, 0) + 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", "100000")
+        self.end_headers()
+        if self.path == "/stall-before-body":
+            self.wfile.flush()
+            self.release.wait(5)
+            return
+        self.wfile.write(self.HEAD)
+        self.wfile.flush()
+        if self.path == "/stall-mid-body":
+            self.release.wait(5)
+        self.close_connection = True
+
+
+@pytest.fixture
+def server():
+    StallingHandler.release.clear()
+    StallingHandler.hits = {}
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StallingHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    StallingHandler.release.set()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    fetcher = ArticleFetcher(db_path=str(tmp_path / "articles.sqlite"))
+    fetcher.timeout = 1.0
+    fetcher.connect_timeout = 1.0
+    return fetcher
+
+
+def test_stall_mid_body_returns_partial_text(server, fetcher):
+    start = time.monotonic()
+    text = fetcher.fetch(f"{server}/stall-mid-body")
+    assert time.monotonic() - start < 4
+    assert "partial article text" in text
+    assert fetcher.get_stats()["truncated"] == 1
+    # 部分正文已緩存，再次抓取不再請求
+    assert fetcher.fetch(f"{server}/stall-mid-body") == text
+    assert StallingHandler.hits["/stall-mid-body"] == 1
+
+
+def test_dropped_connection_returns_partial_text(server, fetcher):
+    text = fetcher.fetch(f"{server}/drop-mid-body")
+    assert "partial article text" in text
+    assert fetcher.get_stats()["truncated"] == 1
+
+
+def test_stall_before_body_is_cached_as_error(server, fetcher):
+    assert fetcher.fetch(f"{server}/stall-before-body") == ""
+    assert fetcher.get_stats()["errors"] == 1
+    # 失敗結果在 error_ttl 內直接返回，不再請求
+    assert fetcher.fetch(f"{server}/stall-before-body") == ""
+    assert StallingHandler.hits["/stall-before-body"] == 1
@@ -0,0 +1,56 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("POLYGON_KEY", "test")
+from data_handler._data_handler import DataHandler
+
+
+class RecordingStorage:
+    def __init__(self):
+        self.upserts = []
+
+    def bulk_upsert_docs(self, collection_name, operations, ordered=False, unset_fields=None):
+        self.upserts.append((collection_name, list(operations)))
+
+
+def make_handler(fundamentals):
+    # 不經 __init__，避免建立 Polygon 客戶端和數據庫連線
+    handler = DataHandler.__new__(DataHandler)
+    handler.storage = RecordingStorage()
+    handler.fundamentals = fundamentals
+    handler._quarantined_symbols = set()
+    return handler
+
+
+def test_no_prior_close_is_valid():
+    # 新上市不足 2 根日K：沒有前收盤，close_change_percentage 為 None
+    handler = make_handler([{"symbol": "IPO", "day_close": 12.5, "close_change_percentage": None}])
+    assert handler.validate_fundamental(handler.fundamentals[0]) == []
+    assert handler.quarantine_invalid_fundamentals("2026-10-18") == handler.fundamentals
+    assert handler.storage.upserts == []
+    assert handler._quarantined_symbols == set()
+
+
+def test_failed_intraday_fetch_is_valid():
+    handler = make_handler([])
+    assert handler.validate_fundamental({"symbol": "AAA", "day_close": None, "close_change_percentage": None}) == []
+
+
+def test_absent_field_and_wrong_type_are_quarantined():
+    fundamentals = [
+        {"symbol": "MISS", "day_close": 1.0},
+        {"symbol": "TYPE", "day_close": "1.0", "close_change_percentage": 2.0},
+        {"symbol": None, "day_close": 1.0, "close_change_percentage": 2.0},
+        {"symbol": "OK", "day_close": 1, "close_change_percentage": -3.5},
+    ]
+    handler = make_handler(fundamentals)
+    valid = handler.quarantine_invalid_fundamentals("2026-10-18")
+
+    assert [f["symbol"] for f in valid] == ["OK"]
+    assert handler._quarantined_symbols == {"MISS", "TYPE", "__index_2"}
+    collection_name, operations = handler.storage.upserts[0]
+    assert collection_name == DataHandler.QUARANTINE_COLLECTION
+    errors = {query["symbol"]: update["errors"] for query, update in operations}
+    assert errors["MISS"] == ["close_change_percentage: missing"]
+    assert errors["TYPE"] == ["day_close: expected int/float, got str"]
+    assert errors["__index_2"] == ["symbol: missing"]
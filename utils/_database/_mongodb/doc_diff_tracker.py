@@ -0,0 +1,83 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+import hashlib
+import threading
+from bson import BSON
+
+
+#region Doc Diff Tracker
+class DocDiffTracker:
+    """
+    記錄每個文檔上一次寫入的字段哈希，只輸出有變化的字段
+
+    鍵為 (集合, 查詢條件)；進程內首次見到某文檔時可用數據庫中讀到的版本作為基準（seed），
+    之後每次成功寫入後以 commit 更新。_id 和時間戳等元數據字段不參與比較。
+    """
+    IGNORED_FIELDS = {"_id", "today_date", "updated_at", "created_at"}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hashes = {}
+
+    @staticmethod
+    def _key(collection_name, query_keys):
+        return (collection_name, tuple(sorted(query_keys.items())))
+
+    @staticmethod
+    def _hash(value):
+        return hashlib.blake2b(BSON.encode({"v": value}), digest_size=16).digest()
+
+    def _field_hashes(self, data):
+        return {field: self._hash(value) for field, value in data.items() if field not in self.IGNORED_FIELDS}
+
+    def seed(self, collection_name, query_keys, stored_doc):
+        """以數據庫中的現有文檔作為比較基準（已有記錄時不覆蓋）"""
+        key = self._key(collection_name, query_keys)
+        with self._lock:
+            if key in self._hashes:
+                return
+        hashes = self._field_hashes(stored_doc)
+        with self._lock:
+            self._hashes.setdefault(key, hashes)
+
+    def diff(self, collection_name, query_keys, data):
+        """返回 data 中相對上一次寫入有變化的字段；沒有基準時返回全部字段"""
+        key = self._key(collection_name, query_keys)
+        with self._lock:
+            previous = self._hashes.get(key)
+        if previous is None:
+            return {field: value for field, value in data.items() if field not in self.IGNORED_FIELDS}
+        return {
+            field: value
+            for field, value in data.items()
+            if field not in self.IGNORED_FIELDS and previous.get(field) != self._hash(value)
+        }
+
+    def commit(self, collection_name, query_keys, written):
+        """寫入成功後更新已寫字段的哈希"""
+        key = self._key(collection_name, query_keys)
+        hashes = self._field_hashes(written)
+        with self._lock:
+            self._hashes.setdefault(key, {}).update(hashes)
+
+    def forget(self, collection_name, query_keys):
+        """寫入失敗時移除基準，下次寫入全部字段"""
+        with self._lock:
+            self._hashes.pop(self._key(collection_name, query_keys), None)
+
+    def clear(self):
+        with self._lock:
+            self._hashes.clear()
+
+    @staticmethod
+    def encoded_size(data):
+        return len(BSON.encode(data)) if data else 0
+
+
+_tracker = DocDiffTracker()
+
+
+def get_doc_diff_tracker():
+    return _tracker
+#endregion
@@ -5,8 +5,8 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 
 import os
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from pymongo import UpdateOne
+from pymongo.errors import ConnectionFailure, BulkWriteError
 from dotenv import load_dotenv
 from bson import json_util
 
@@ -17,63 +17,58 @@ from datetime import datetime
 from zoneinfo import ZoneInfo
 
 from utils.logger.shared_logger import logger
+from utils._database._mongodb.mongo_session import get_mongo_session
+from utils._database.storage import StorageHandler
 
 
-class MongoHandler:
-    NY_TZ = ZoneInfo("America/New_York")
+class MongoHandler(StorageHandler):
+    backend = "mongodb"
 
     def __init__(self, mongodb_connection_string = None):
-        try:
-            mongo_uri = os.getenv("MONGODB_CONNECTION_STRING")
-            if mongodb_connection_string:
-                mongo_uri = mongodb_connection_string
-            self.client = MongoClient(mongo_uri, serverSelectionTimeoutMS=3000)
-            self.db = self.client[os.getenv("MONGO_DBNAME", "TradeZero_Bot")]
-        except Exception as e:
-            print("Connection error:", e)
-            self.client = None
-            self.db = None
-
-    @property
-    def ny_time(self):
-        """Always return current NY time (not stale init-time value)"""
-        return datetime.now(self.NY_TZ)
-
-    @property
-    def today_str(self):
-        """Always return current NY date string"""
-        return self.ny_time.strftime('%Y-%m-%d')
-
-    def is_connected(self):
-        if not self.client:
-            return False
-        try:
-            self.client.admin.command('ping')
-            return True
-        except ConnectionFailure:
-            return False
+        # 同一連線字串共用一個 MongoClient、健康狀態和集合註冊表
+        self.session = get_mongo_session(mongodb_connection_string)
+        self.client = self.session.client
+        self.db = self.session.db
 
-    def find_collection(self, name):
-        if not self.is_connected():
-            return False
-        collections = self.db.list_collection_names()
-        return True if name in collections else []
+    def is_connected(self, force=False):
+        return self.session.is_healthy(force=force)
+
+    def has_collection(self, name):
+        return self.session.has_collection(name)
+
+    def _on_error(self, e):
+        if isinstance(e, ConnectionFailure):
+            self.session.mark_unhealthy()
 
     def create_collection(self, name):
         if not self.is_connected():
             logger.warning("Not connected to MongoDB")
             return False
-        if name not in self.db.list_collection_names():
+        if not self.has_collection(name):
             logger.info(f"Collection not found. Creating collection: {name}")
             self.db.create_collection(name)
+            self.session.register_collection(name)
             return True
         logger.warning(f"Collection already exists: {name}")
         return False
 
+    def drop_collection(self, name):
+        if not self.is_connected():
+            logger.warning("Not connected to MongoDB")
+            return False
+        try:
+            self.db.drop_collection(name)
+            self.session.unregister_collection(name)
+            return True
+        except Exception as e:
+            self._on_error(e)
+            logger.error(f"Drop collection error ({name}): {e}")
+            return False
+
     def create_doc(self, collection_name, doc):
         if not self.is_connected():
             return None
-        if collection_name not in self.db.list_collection_names():
+        if not self.has_collection(collection_name):
             return None
         try:
             # 使用帶時區的日期時間 (每次呼叫時取得最新 NY 時間)
@@ -82,36 +77,66 @@ class MongoHandler:
             result = self.db[collection_name].insert_one(doc)
             return result.inserted_id
         except Exception as e:
+            self._on_error(e)
             print("Insert error:", e)
             return None
 
-    def find_doc(self, collection_name, query):
+    def find_doc(self, collection_name, query, projection=None):
+        """projection 為 None 時返回完整文檔，否則按 pymongo projection 只返回所需字段"""
         if not self.is_connected():
             return []
-        if collection_name not in self.db.list_collection_names():
+        if not self.has_collection(collection_name):
             return []
         try:
-            return list(self.db[collection_name].find(query))
+            return list(self.db[collection_name].find(query, projection))
         except Exception as e:
+            self._on_error(e)
             print("Find error:", e)
             return []
 
+    def aggregate_docs(self, collection_name, pipeline):
+        """執行聚合管道；出錯時返回 None（與查詢結果為空的 [] 區分，方便調用方回退）"""
+        if not self.is_connected():
+            return None
+        if not self.has_collection(collection_name):
+            return None
+        try:
+            return list(self.db[collection_name].aggregate(pipeline))
+        except Exception as e:
+            self._on_error(e)
+            logger.error(f"Aggregate 錯誤 (集合: {collection_name}): {str(e)}")
+            return None
+
+    def find_one_doc(self, collection_name, query, projection=None, sort=None):
+        """返回第一個符合條件的文檔（可指定排序），沒有時返回 None"""
+        if not self.is_connected():
+            return None
+        if not self.has_collection(collection_name):
+            return None
+        try:
+            return self.db[collection_name].find_one(query, projection, sort=sort)
+        except Exception as e:
+            self._on_error(e)
+            print("Find error:", e)
+            return None
+
     def update_doc(self, collection_name, query, update):
         if not self.is_connected():
             return None
-        if collection_name not in self.db.list_collection_names():
+        if not self.has_collection(collection_name):
             return None
         try:
             result = self.db[collection_name].update_many(query, {'$set': update})
             return result.modified_count  # 回傳更新的筆數
         except Exception as e:
+            self._on_error(e)
             print("Update error:", e)
             return None
 
     def upsert_doc(self, collection_name, query_keys: dict, new_data: dict):
         if not self.is_connected():
             return None
-        if collection_name not in self.db.list_collection_names():
+        if not self.has_collection(collection_name):
             return None
 
         try:
@@ -146,16 +171,127 @@ class MongoHandler:
             return operation_result
 
         except Exception as e:
+            self._on_error(e)
             logger.error(f"Upsert 錯誤 (集合: {collection_name}): {str(e)}")
             logger.error(f"查詢條件: {query_keys}")
             logger.error(f"更新數據: {new_data}")
             return None
         
     
+    def bulk_update_docs(self, collection_name: str, operations: list, ordered: bool = False):
+        """
+        以單次 bulk_write 執行 [(filter, update, upsert), ...]
+
+        返回 bulk_api_result（部分失敗時為 BulkWriteError.details，含 writeErrors），連線或其他錯誤時返回 None。
+        """
+        if not operations:
+            return {"writeErrors": [], "nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0}
+        if not self.is_connected():
+            return None
+        if not self.has_collection(collection_name):
+            return None
+        requests = [UpdateOne(query, update, upsert=upsert) for query, update, upsert in operations]
+        try:
+            return self.db[collection_name].bulk_write(requests, ordered=ordered).bulk_api_result
+        except BulkWriteError as e:
+            return e.details
+        except Exception as e:
+            self._on_error(e)
+            logger.error(f"Bulk write 錯誤 (集合: {collection_name}): {str(e)}")
+            return None
+
+    def bulk_upsert_docs(self, collection_name: str, operations: list, ordered: bool = False, unset_fields=None):
+        """
+        以單次 bulk_write 執行多個 upsert
+
+        operations: [(query_keys, new_data), ...]
+        unset_fields: 需要從文檔中移除的字段（例如已遷移到其他集合的舊字段）
+        返回 {matched_count, modified_count, upserted_count, upserted_indexes, write_errors}；
+        write_errors 為 [{"index": i, "query": query_keys, "errmsg": ...}]，i 對應 operations 中的位置。
+        """
+        if not operations:
+            return {"matched_count": 0, "modified_count": 0, "upserted_count": 0, "upserted_indexes": [], "write_errors": []}
+        if not self.is_connected():
+            return None
+        if not self.has_collection(collection_name):
+            return None
+
+        requests = [
+            UpdateOne(query, update, upsert=upsert)
+            for query, update, upsert in self._bulk_upsert_requests(operations, unset_fields)
+        ]
+
+        try:
+            result = self.db[collection_name].bulk_write(requests, ordered=ordered)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+        except Exception as e:
+            self._on_error(e)
+            logger.error(f"Bulk upsert 錯誤 (集合: {collection_name}): {str(e)}")
+            return None
+
+        return self._bulk_upsert_result(collection_name, operations, details, logger)
+
+    def ensure_indexes(self, collection_name: str, indexes: list):
+        """
+        確保集合上存在聲明的索引（已存在的相同索引不會重建）
+
+        indexes: [{"keys": [(field, direction), ...], "name": ..., 其他 create_index 參數}, ...]
+        返回成功確保的索引名稱列表；失敗的索引（例如已有重複數據無法建立唯一索引）只記錄錯誤。
+        """
+        if not self.is_connected():
+            return []
+        if not self.has_collection(collection_name):
+            return []
+        ensured = []
+        for spec in indexes:
+            options = {k: v for k, v in spec.items() if k != "keys"}
+            try:
+                ensured.append(self.db[collection_name].create_index(spec["keys"], **options))
+            except Exception as e:
+                self._on_error(e)
+                logger.error(f"建立索引錯誤 (集合: {collection_name}, 索引: {spec.get('name')}): {str(e)}")
+        return ensured
+
+    def explain_find(self, collection_name: str, query: dict):
+        """返回 find(query) 的執行計劃摘要：計劃階段、使用的索引、返回/掃描的鍵和文檔數"""
+        if not self.is_connected():
+            return None
+        if not self.has_collection(collection_name):
+            return None
+        try:
+            explain = self.db[collection_name].find(query).explain()
+        except Exception as e:
+            self._on_error(e)
+            logger.error(f"Explain 錯誤 (集合: {collection_name}): {str(e)}")
+            return None
+
+        stages = []
+        indexes = []
+        plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        # 新版本的查詢引擎把計劃包在 queryPlan 中
+        plan = plan.get("queryPlan", plan)
+        while plan:
+            stages.append(plan.get("stage"))
+            if plan.get("indexName"):
+                indexes.append(plan["indexName"])
+            plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+
+        stats = explain.get("executionStats", {})
+        return {
+            "plan": " <- ".join(stage for stage in stages if stage),
+            "indexes": indexes,
+            "n_returned": stats.get("nReturned"),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "docs_examined": stats.get("totalDocsExamined"),
+            "execution_ms": stats.get("executionTimeMillis"),
+        }
+
     def upsert_top_list(self, collection_name: str, new_symbols: list):
         if not self.is_connected():
             return None
-        if collection_name not in self.db.list_collection_names():
+        if not self.has_collection(collection_name):
             return None
 
         try:
@@ -187,18 +323,20 @@ class MongoHandler:
             }
 
         except Exception as e:
+            self._on_error(e)
             print("Upsert error:", e)
             return None
     
     def delete_doc(self, collection_name, query):
         if not self.is_connected():
             return None
-        if collection_name not in self.db.list_collection_names():
+        if not self.has_collection(collection_name):
             return None
         try:
             result = self.db[collection_name].delete_many(query)
             return result.deleted_count
         except Exception as e:
+            self._on_error(e)
             print("Delete error:", e)
             return None
         
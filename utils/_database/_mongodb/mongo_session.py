@@ -0,0 +1,134 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+import time
+import threading
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from utils.logger.shared_logger import logger
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+
+#region Mongo Session
+class MongoSession:
+    """
+    進程內共用的 MongoDB 會話。
+
+    每個連線字串只建立一個 MongoClient；連線健康狀態在 TTL 內緩存，
+    集合名稱由註冊表記錄（create/drop 時更新），MongoHandler 的每個操作
+    不再各自發送 ping 和 list_collection_names。
+    """
+
+    def __init__(self, uri, db_name):
+        self.uri = uri
+        self.db_name = db_name
+        self.health_ttl = float(os.getenv("MONGO_HEALTH_TTL_SECONDS", "30"))
+        self._lock = threading.Lock()
+        self._healthy = False
+        self._checked_at = 0.0
+        self._collections = None
+        self.stats = {"pings": 0, "pings_saved": 0, "collection_lists": 0, "collection_lists_saved": 0}
+        try:
+            self.client = MongoClient(uri, serverSelectionTimeoutMS=3000)
+            self.db = self.client[db_name]
+        except Exception as e:
+            print("Connection error:", e)
+            self.client = None
+            self.db = None
+
+    def is_healthy(self, force=False):
+        """返回緩存的連線狀態；超過 TTL 或 force=True 時重新 ping"""
+        if not self.client:
+            return False
+        with self._lock:
+            if not force and time.monotonic() - self._checked_at < self.health_ttl:
+                self.stats["pings_saved"] += 1
+                return self._healthy
+        try:
+            self.client.admin.command('ping')
+            healthy = True
+        except PyMongoError:
+            healthy = False
+        with self._lock:
+            self.stats["pings"] += 1
+            self._healthy = healthy
+            self._checked_at = time.monotonic()
+        return healthy
+
+    def mark_unhealthy(self):
+        """操作出現連線錯誤時調用，下次檢查會重新 ping"""
+        with self._lock:
+            self._healthy = False
+            self._checked_at = 0.0
+
+    def refresh_collections(self):
+        names = set(self.db.list_collection_names())
+        with self._lock:
+            self.stats["collection_lists"] += 1
+            self._collections = names
+        return names
+
+    def has_collection(self, name):
+        with self._lock:
+            collections = self._collections
+            if collections is not None and name in collections:
+                self.stats["collection_lists_saved"] += 1
+                return True
+        # 註冊表未命中時刷新一次，以發現其他進程建立的集合
+        return name in self.refresh_collections()
+
+    def collection_names(self):
+        with self._lock:
+            if self._collections is not None:
+                self.stats["collection_lists_saved"] += 1
+                return set(self._collections)
+        return self.refresh_collections()
+
+    def register_collection(self, name):
+        with self._lock:
+            if self._collections is not None:
+                self._collections.add(name)
+
+    def unregister_collection(self, name):
+        with self._lock:
+            if self._collections is not None:
+                self._collections.discard(name)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["round_trips_saved"] = stats["pings_saved"] + stats["collection_lists_saved"]
+        return stats
+
+    def log_stats(self):
+        stats = self.get_stats()
+        logger.info(
+            f"MongoDB 會話統計 ({self.db_name}): ping {stats['pings']} (省略 {stats['pings_saved']}), "
+            f"list_collection_names {stats['collection_lists']} (省略 {stats['collection_lists_saved']}), "
+            f"共節省 {stats['round_trips_saved']} 次往返"
+        )
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_mongo_session(uri=None, db_name=None):
+    """返回 (uri, db_name) 對應的共用 MongoSession（不存在時建立）"""
+    uri = uri or os.getenv("MONGODB_CONNECTION_STRING")
+    db_name = db_name or os.getenv("MONGO_DBNAME", "TradeZero_Bot")
+    with _sessions_lock:
+        session = _sessions.get((uri, db_name))
+        if session is None:
+            session = MongoSession(uri, db_name)
+            _sessions[(uri, db_name)] = session
+        return session
+
+
+def log_mongo_session_stats():
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+    for session in sessions:
+        session.log_stats()
+#endregion
@@ -0,0 +1,233 @@
+"""
+MongoDB 查詢/投影/更新語法的最小實現，供 SqliteHandler 在解碼後的文檔上執行
+
+支持本項目使用到的子集：等值、$in/$nin/$exists/$eq/$ne/$gt/$gte/$lt/$lte/$not、$or/$and/$nor、
+點路徑（遇到數組時展開）；更新支持 $set（含位置操作符 $）/$unset/$inc/$max/$min/$push/$setOnInsert。
+"""
+import operator
+from datetime import datetime
+
+_COMPARATORS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+
+def resolve(doc, path):
+    """返回點路徑上的所有值（遇到數組時展開，與 MongoDB 語義一致）；路徑不存在時返回 []"""
+    values = [doc]
+    for part in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    next_values.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit():
+                    if int(part) < len(value):
+                        next_values.append(value[int(part)])
+                else:
+                    next_values.extend(item[part] for item in value if isinstance(item, dict) and part in item)
+        values = next_values
+    return values
+
+
+def _candidates(values):
+    # 數組字段既以整體比較，也以每個元素比較
+    candidates = []
+    for value in values:
+        candidates.append(value)
+        if isinstance(value, list):
+            candidates.extend(value)
+    return candidates
+
+
+def _equals(values, target):
+    if not values:
+        return target is None
+    return any(candidate == target for candidate in _candidates(values))
+
+
+def _is_operator_doc(condition):
+    return isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition)
+
+
+def _match_operator(values, op, arg):
+    if op == "$exists":
+        return bool(values) == bool(arg)
+    if op == "$eq":
+        return _equals(values, arg)
+    if op == "$ne":
+        return not _equals(values, arg)
+    if op == "$in":
+        return any(_equals(values, item) for item in arg)
+    if op == "$nin":
+        return not any(_equals(values, item) for item in arg)
+    if op == "$not":
+        return not _match_condition(values, arg)
+    if op in _COMPARATORS:
+        compare = _COMPARATORS[op]
+        for candidate in _candidates(values):
+            if candidate is None or isinstance(candidate, (list, dict)):
+                continue
+            try:
+                if compare(candidate, arg):
+                    return True
+            except TypeError:
+                continue
+        return False
+    raise ValueError(f"Unsupported query operator: {op}")
+
+
+def _match_condition(values, condition):
+    if _is_operator_doc(condition):
+        return all(_match_operator(values, op, arg) for op, arg in condition.items())
+    return _equals(values, condition)
+
+
+def matches(doc, query):
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(doc, sub_query) for sub_query in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, sub_query) for sub_query in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, sub_query) for sub_query in condition):
+                return False
+        elif not _match_condition(resolve(doc, key), condition):
+            return False
+    return True
+
+
+def project(doc, projection):
+    """按 MongoDB 投影返回文檔（只支持頂層字段的包含/排除）"""
+    if projection is None:
+        return doc
+    include_id = projection.get("_id", 1)
+    fields = {key: value for key, value in projection.items() if key != "_id"}
+    if any(fields.values()):
+        result = {"_id": doc["_id"]} if include_id and "_id" in doc else {}
+        result.update({key: doc[key] for key, value in fields.items() if value and key in doc})
+        return result
+    result = {key: value for key, value in doc.items() if key not in fields}
+    if not include_id:
+        result.pop("_id", None)
+    return result
+
+
+def _sort_key(value):
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (3, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (4, value.timestamp())
+    return (5, str(value))
+
+
+def sort_docs(docs, sort):
+    """sort: [(字段, 1/-1), ...]"""
+    docs = list(docs)
+    for field, direction in reversed(list(sort.items()) if isinstance(sort, dict) else sort):
+        def key(doc, field=field):
+            values = resolve(doc, field)
+            return _sort_key(values[0] if values else None)
+        docs.sort(key=key, reverse=direction < 0)
+    return docs
+
+
+def equality_fields(query):
+    """upsert 插入新文檔時，從查詢條件中取出的等值字段"""
+    return {
+        key: value for key, value in (query or {}).items()
+        if not key.startswith("$") and "." not in key and not _is_operator_doc(value)
+    }
+
+
+def _positional_path(doc, path, query):
+    """把 "array.$.x" 中的 $ 替換為查詢條件匹配到的第一個數組元素下標"""
+    if ".$" not in path:
+        return path
+    prefix, _, rest = path.partition(".$")
+    array = resolve(doc, prefix)
+    array = array[0] if array and isinstance(array[0], list) else []
+    element_conditions = {
+        key[len(prefix) + 1:]: value for key, value in (query or {}).items() if key.startswith(prefix + ".")
+    }
+    whole_condition = (query or {}).get(prefix)
+    for index, item in enumerate(array):
+        if element_conditions and not (isinstance(item, dict) and matches(item, element_conditions)):
+            continue
+        if whole_condition is not None and not _match_condition([item], whole_condition):
+            continue
+        if element_conditions or whole_condition is not None:
+            return f"{prefix}.{index}{rest}"
+    raise ValueError(f"The positional operator did not find the match needed from the query: {path}")
+
+
+def _parent(doc, path, create=True):
+    parts = path.split(".")
+    target = doc
+    for part in parts[:-1]:
+        if isinstance(target, list):
+            target = target[int(part)]
+            continue
+        if part not in target:
+            if not create:
+                return None, parts[-1]
+            target[part] = {}
+        target = target[part]
+    return target, parts[-1]
+
+
+def _get_path(doc, path):
+    values = resolve(doc, path) if "." in path else ([doc[path]] if path in doc else [])
+    return values[0] if values else None
+
+
+def _set_path(doc, path, value):
+    parent, last = _parent(doc, path)
+    if isinstance(parent, list):
+        parent[int(last)] = value
+    else:
+        parent[last] = value
+
+
+def _unset_path(doc, path):
+    parent, last = _parent(doc, path, create=False)
+    if isinstance(parent, dict):
+        parent.pop(last, None)
+
+
+def apply_update(doc, update, query=None, is_insert=False):
+    """在 doc 上原地執行 MongoDB 更新操作符"""
+    for op, fields in update.items():
+        if op == "$setOnInsert":
+            if is_insert:
+                for path, value in fields.items():
+                    _set_path(doc, path, value)
+            continue
+        for path, value in fields.items():
+            path = _positional_path(doc, path, query)
+            current = _get_path(doc, path)
+            if op == "$set":
+                _set_path(doc, path, value)
+            elif op == "$unset":
+                _unset_path(doc, path)
+            elif op == "$inc":
+                _set_path(doc, path, (current or 0) + value)
+            elif op == "$max":
+                if current is None or value > current:
+                    _set_path(doc, path, value)
+            elif op == "$min":
+                if current is None or value < current:
+                    _set_path(doc, path, value)
+            elif op == "$push":
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                _set_path(doc, path, list(current or []) + list(items))
+            else:
+                raise ValueError(f"Unsupported update operator: {op}")
+    return doc
@@ -0,0 +1,435 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+import re
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from bson import json_util, ObjectId
+
+from utils.logger.shared_logger import logger
+from utils._database.storage import StorageHandler
+from utils._database._sqlite import query_engine
+
+
+class SqliteHandler(StorageHandler):
+    """
+    嵌入式 SQLite 存儲後端（單機部署、離線測試用，無需 MongoDB 服務）
+
+    每個集合一張表 c_<集合名>(id TEXT PRIMARY KEY, doc TEXT)，doc 以 bson.json_util 編碼為 JSON
+    （保留 datetime / ObjectId）。symbol / today_date 等值和 $in 條件下推為 SQL，
+    以 json_extract 表達式索引查找，其餘條件在 Python 中按 MongoDB 語義過濾。
+    """
+    backend = "sqlite"
+    NAME_PATTERN = re.compile(r"^[A-Za-z0-9_]+$")
+    FIELD_PATTERN = re.compile(r"^[A-Za-z0-9_.]+$")
+    # 下推為 SQL 條件的頂層字段
+    INDEXED_FIELDS = ("symbol", "today_date")
+    # datetime 統一編碼為毫秒時間戳，帶時區和 UTC 的同一時刻編碼相同（重新編碼結果穩定）
+    JSON_OPTIONS = json_util.JSONOptions(
+        json_mode=json_util.JSONMode.LEGACY, datetime_representation=json_util.DatetimeRepresentation.NUMBERLONG
+    )
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.getenv("STORAGE_SQLITE_PATH", os.path.join("cache", "storage.sqlite"))
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._collections = None
+        try:
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        except sqlite3.Error as e:
+            print("Connection error:", e)
+            self.conn = None
+
+    #region helpers
+    def _table(self, name):
+        if not self.NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid collection name: {name}")
+        return f'"c_{name}"'
+
+    def _field_expr(self, field):
+        if field == "_id":
+            return "id"
+        if not self.FIELD_PATTERN.match(field):
+            raise ValueError(f"Invalid field name: {field}")
+        return f"json_extract(doc, '$.{field}')"
+
+    @classmethod
+    def _encode(cls, doc):
+        return json_util.dumps(doc, json_options=cls.JSON_OPTIONS)
+
+    @classmethod
+    def _decode(cls, text):
+        return json_util.loads(text, json_options=cls.JSON_OPTIONS)
+
+    @staticmethod
+    def _is_scalar(value):
+        return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+    def _where(self, query):
+        """把可索引的等值/$in 條件轉換為 SQL；其餘條件留給 query_engine.matches"""
+        clauses = []
+        params = []
+        for field in ("_id",) + self.INDEXED_FIELDS:
+            condition = (query or {}).get(field)
+            if condition is None:
+                continue
+            expr = self._field_expr(field)
+            if isinstance(condition, ObjectId) or self._is_scalar(condition):
+                clauses.append(f"{expr} = ?")
+                params.append(str(condition) if field == "_id" else condition)
+            elif isinstance(condition, dict) and set(condition) == {"$in"} and all(
+                isinstance(item, ObjectId) or self._is_scalar(item) for item in condition["$in"]
+            ):
+                if not condition["$in"]:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"{expr} IN ({', '.join('?' * len(condition['$in']))})")
+                params.extend(str(item) if field == "_id" else item for item in condition["$in"])
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _select(self, collection_name, query):
+        """返回 [(id, 原始 JSON, doc)]；只解碼 SQL 預篩選後的行"""
+        where, params = self._where(query)
+        rows = self.conn.execute(f"SELECT id, doc FROM {self._table(collection_name)}{where}", params).fetchall()
+        result = []
+        for row_id, text in rows:
+            doc = self._decode(text)
+            if query_engine.matches(doc, query):
+                result.append((row_id, text, doc))
+        return result
+
+    def _insert(self, collection_name, doc):
+        if "_id" not in doc:
+            doc["_id"] = ObjectId()
+        self.conn.execute(
+            f"INSERT INTO {self._table(collection_name)} (id, doc) VALUES (?, ?)",
+            (str(doc["_id"]), self._encode(doc)),
+        )
+        return doc["_id"]
+
+    def _update_one(self, collection_name, query, update, upsert=False):
+        """返回 (matched, modified, upserted_id)；違反唯一約束時拋出 sqlite3.IntegrityError"""
+        found = self._select(collection_name, query)
+        if found:
+            row_id, before, doc = found[0]
+            query_engine.apply_update(doc, update, query)
+            after = self._encode(doc)
+            if after == before:
+                return 1, 0, None
+            self.conn.execute(f"UPDATE {self._table(collection_name)} SET doc = ? WHERE id = ?", (after, row_id))
+            return 1, 1, None
+        if not upsert:
+            return 0, 0, None
+        doc = query_engine.equality_fields(query)
+        query_engine.apply_update(doc, update, query, is_insert=True)
+        return 0, 0, self._insert(collection_name, doc)
+
+    def _ready(self, collection_name):
+        return self.is_connected() and self.has_collection(collection_name)
+    #endregion
+
+    def is_connected(self, force=False):
+        return self.conn is not None
+
+    def has_collection(self, name):
+        with self._lock:
+            if self._collections is None:
+                rows = self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'c\\_%' ESCAPE '\\'").fetchall()
+                self._collections = {row[0][2:] for row in rows}
+            return name in self._collections
+
+    def create_collection(self, name):
+        if not self.is_connected():
+            logger.warning("Not connected to SQLite")
+            return False
+        if self.has_collection(name):
+            logger.warning(f"Collection already exists: {name}")
+            return False
+        logger.info(f"Collection not found. Creating collection: {name}")
+        with self._lock, self.conn:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self._table(name)} (id TEXT PRIMARY KEY, doc TEXT NOT NULL)")
+            self.conn.execute(
+                f'CREATE INDEX IF NOT EXISTS "ix_{name}_symbol_today_date" ON {self._table(name)} '
+                f"({self._field_expr('symbol')}, {self._field_expr('today_date')})"
+            )
+            self._collections.add(name)
+        return True
+
+    def drop_collection(self, name):
+        if not self.is_connected():
+            logger.warning("Not connected to SQLite")
+            return False
+        with self._lock, self.conn:
+            self.conn.execute(f"DROP TABLE IF EXISTS {self._table(name)}")
+            if self._collections is not None:
+                self._collections.discard(name)
+        return True
+
+    def create_doc(self, collection_name, doc):
+        if not self._ready(collection_name):
+            return None
+        try:
+            doc["today_date"] = self.today_str
+            doc["created_at"] = datetime.now(self.NY_TZ)
+            with self._lock, self.conn:
+                return self._insert(collection_name, doc)
+        except Exception as e:
+            print("Insert error:", e)
+            return None
+
+    def find_doc(self, collection_name, query, projection=None):
+        """projection 為 None 時返回完整文檔，否則按 MongoDB projection 只返回所需字段"""
+        if not self._ready(collection_name):
+            return []
+        try:
+            with self._lock:
+                return [query_engine.project(doc, projection) for _, _, doc in self._select(collection_name, query)]
+        except Exception as e:
+            print("Find error:", e)
+            return []
+
+    def find_one_doc(self, collection_name, query, projection=None, sort=None):
+        if not self._ready(collection_name):
+            return None
+        try:
+            with self._lock:
+                docs = [doc for _, _, doc in self._select(collection_name, query)]
+            if sort:
+                docs = query_engine.sort_docs(docs, sort)
+            return query_engine.project(docs[0], projection) if docs else None
+        except Exception as e:
+            print("Find error:", e)
+            return None
+
+    def aggregate_docs(self, collection_name, pipeline):
+        """
+        執行聚合管道（支持 $match/$sort/$project/$limit/$replaceRoot 和只含 $first 的 $group）
+
+        遇到不支持的階段時返回 None，調用方回退為普通查詢。
+        """
+        if not self._ready(collection_name):
+            return None
+        try:
+            docs = None
+            for stage in pipeline:
+                (name, spec), = stage.items()
+                if name == "$match":
+                    if docs is None:
+                        with self._lock:
+                            docs = [doc for _, _, doc in self._select(collection_name, spec)]
+                    else:
+                        docs = [doc for doc in docs if query_engine.matches(doc, spec)]
+                    continue
+                if docs is None:
+                    with self._lock:
+                        docs = [doc for _, _, doc in self._select(collection_name, {})]
+                if name == "$sort":
+                    docs = query_engine.sort_docs(docs, spec)
+                elif name == "$project":
+                    docs = [query_engine.project(doc, spec) for doc in docs]
+                elif name == "$limit":
+                    docs = docs[:spec]
+                elif name == "$replaceRoot":
+                    docs = [self._aggregate_value(doc, spec["newRoot"]) for doc in docs]
+                elif name == "$group":
+                    groups = {}
+                    for doc in docs:
+                        key = self._aggregate_value(doc, spec["_id"])
+                        group_key = self._encode(key)
+                        if group_key in groups:
+                            continue
+                        group = {"_id": key}
+                        for field, accumulator in spec.items():
+                            if field == "_id":
+                                continue
+                            (op, expr), = accumulator.items()
+                            if op != "$first":
+                                raise ValueError(f"Unsupported accumulator: {op}")
+                            group[field] = self._aggregate_value(doc, expr)
+                        groups[group_key] = group
+                    docs = list(groups.values())
+                else:
+                    raise ValueError(f"Unsupported pipeline stage: {name}")
+            return docs or []
+        except Exception as e:
+            logger.error(f"Aggregate 錯誤 (集合: {collection_name}): {str(e)}")
+            return None
+
+    @staticmethod
+    def _aggregate_value(doc, expr):
+        if expr == "$$ROOT":
+            return doc
+        if isinstance(expr, str) and expr.startswith("$"):
+            values = query_engine.resolve(doc, expr[1:])
+            return values[0] if values else None
+        return expr
+
+    def update_doc(self, collection_name, query, update):
+        if not self._ready(collection_name):
+            return None
+        try:
+            modified = 0
+            with self._lock, self.conn:
+                for row_id, before, doc in self._select(collection_name, query):
+                    query_engine.apply_update(doc, {"$set": update}, query)
+                    after = self._encode(doc)
+                    if after != before:
+                        self.conn.execute(f"UPDATE {self._table(collection_name)} SET doc = ? WHERE id = ?", (after, row_id))
+                        modified += 1
+            return modified  # 回傳更新的筆數
+        except Exception as e:
+            print("Update error:", e)
+            return None
+
+    def upsert_doc(self, collection_name, query_keys: dict, new_data: dict):
+        if not self._ready(collection_name):
+            return None
+        try:
+            new_data = {k: v for k, v in new_data.items() if k != '_id'}
+            new_data["today_date"] = self.today_str
+            new_data["updated_at"] = datetime.now(self.NY_TZ)
+            with self._lock, self.conn:
+                matched, modified, upserted_id = self._update_one(collection_name, query_keys, {"$set": new_data}, upsert=True)
+
+            if upserted_id:
+                logger.info(f"在集合 '{collection_name}' 中插入了新文檔")
+            elif modified > 0:
+                logger.info(f"在集合 '{collection_name}' 中更新了現有文檔")
+            else:
+                logger.info(f"集合 '{collection_name}' 中的文檔未發生變化（數據可能相同）")
+            return {
+                "matched_count": matched,
+                "modified_count": modified,
+                "upserted_id": str(upserted_id) if upserted_id else None
+            }
+        except Exception as e:
+            logger.error(f"Upsert 錯誤 (集合: {collection_name}): {str(e)}")
+            logger.error(f"查詢條件: {query_keys}")
+            return None
+
+    def bulk_update_docs(self, collection_name: str, operations: list, ordered: bool = False):
+        """在一個事務中執行 [(filter, update, upsert), ...]；返回格式與 pymongo bulk_api_result 相同"""
+        result = {"writeErrors": [], "nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "upserted": []}
+        if not operations:
+            return result
+        if not self._ready(collection_name):
+            return None
+        try:
+            with self._lock, self.conn:
+                for index, (query, update, upsert) in enumerate(operations):
+                    try:
+                        matched, modified, upserted_id = self._update_one(collection_name, query, update, upsert)
+                    except (sqlite3.IntegrityError, ValueError) as e:
+                        result["writeErrors"].append({"index": index, "errmsg": str(e)})
+                        if ordered:
+                            break
+                        continue
+                    result["nMatched"] += matched
+                    result["nModified"] += modified
+                    if upserted_id is not None:
+                        result["nUpserted"] += 1
+                        result["upserted"].append({"index": index, "_id": upserted_id})
+            return result
+        except Exception as e:
+            logger.error(f"Bulk write 錯誤 (集合: {collection_name}): {str(e)}")
+            return None
+
+    def bulk_upsert_docs(self, collection_name: str, operations: list, ordered: bool = False, unset_fields=None):
+        """與 MongoHandler.bulk_upsert_docs 相同，在一個事務中執行"""
+        if not operations:
+            return {"matched_count": 0, "modified_count": 0, "upserted_count": 0, "upserted_indexes": [], "write_errors": []}
+        details = self.bulk_update_docs(collection_name, self._bulk_upsert_requests(operations, unset_fields), ordered)
+        if details is None:
+            return None
+        return self._bulk_upsert_result(collection_name, operations, details, logger)
+
+    def ensure_indexes(self, collection_name: str, indexes: list):
+        """以 json_extract 表達式索引實現；partialFilterExpression 等 MongoDB 專有選項會被忽略"""
+        if not self._ready(collection_name):
+            return []
+        ensured = []
+        for spec in indexes:
+            name = spec.get("name") or "_".join(field for field, _ in spec["keys"])
+            try:
+                columns = ", ".join(
+                    self._field_expr(field) + (" DESC" if direction == -1 else "") for field, direction in spec["keys"]
+                )
+                unique = "UNIQUE " if spec.get("unique") else ""
+                with self._lock, self.conn:
+                    self.conn.execute(
+                        f'CREATE {unique}INDEX IF NOT EXISTS "ix_{collection_name}_{name}" ON {self._table(collection_name)} ({columns})'
+                    )
+                ensured.append(name)
+            except Exception as e:
+                logger.error(f"建立索引錯誤 (集合: {collection_name}, 索引: {name}): {str(e)}")
+        return ensured
+
+    def explain_find(self, collection_name: str, query: dict):
+        """返回 find(query) 的執行計劃摘要（EXPLAIN QUERY PLAN），格式與 MongoHandler.explain_find 相同"""
+        if not self._ready(collection_name):
+            return None
+        try:
+            where, params = self._where(query)
+            sql = f"SELECT id, doc FROM {self._table(collection_name)}{where}"
+            start = time.perf_counter()
+            with self._lock:
+                plan = [row[-1] for row in self.conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+                rows = self.conn.execute(sql, params).fetchall()
+            returned = sum(1 for _, text in rows if query_engine.matches(self._decode(text), query))
+            elapsed_ms = round((time.perf_counter() - start) * 1000)
+        except Exception as e:
+            logger.error(f"Explain 錯誤 (集合: {collection_name}): {str(e)}")
+            return None
+        return {
+            "plan": " <- ".join(plan),
+            "indexes": [match for detail in plan for match in re.findall(r"INDEX (\S+)", detail)],
+            "n_returned": returned,
+            "keys_examined": None,
+            "docs_examined": len(rows),
+            "execution_ms": elapsed_ms,
+        }
+
+    def upsert_top_list(self, collection_name: str, new_symbols: list):
+        if not self._ready(collection_name):
+            return None
+        try:
+            today_str = self.today_str
+            query = {"today_date": today_str}
+            with self._lock, self.conn:
+                found = self._select(collection_name, query)
+                existing_doc = found[0][2] if found else None
+                if existing_doc and "top_list" in existing_doc:
+                    combined_list = list(set(existing_doc["top_list"] + new_symbols))
+                else:
+                    combined_list = new_symbols
+                matched, modified, upserted_id = self._update_one(collection_name, query, {"$set": {
+                    "today_date": today_str,
+                    "top_list": combined_list,
+                    "updated_at": datetime.now(self.NY_TZ)
+                }}, upsert=True)
+            return {
+                "matched_count": matched,
+                "modified_count": modified,
+                "upserted_id": str(upserted_id) if upserted_id else None
+            }
+        except Exception as e:
+            print("Upsert error:", e)
+            return None
+
+    def delete_doc(self, collection_name, query):
+        if not self._ready(collection_name):
+            return None
+        try:
+            with self._lock, self.conn:
+                ids = [row_id for row_id, _, _ in self._select(collection_name, query)]
+                self.conn.executemany(f"DELETE FROM {self._table(collection_name)} WHERE id = ?", [(i,) for i in ids])
+            return len(ids)
+        except Exception as e:
+            print("Delete error:", e)
+            return None
@@ -0,0 +1,249 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from utils._database.storage import get_storage_handler
+from api_polygon.daily_bar_store import get_daily_bar_store
+from utils.logger.shared_logger import logger
+
+
+class ChartBarStore:
+    """
+    圖表K線的分桶存儲（chart_bars 集合）
+
+    每個文檔保存一個 symbol / 週期 / 分桶的K線（1m、5m 按交易日分桶，1d 按年分桶），
+    文檔 _id 為 "symbol|週期|分桶"。每次運行只追加新K線（$push），並原地更新仍在形成中的最後一根，
+    fundamentals_of_top_list_symbols 文檔只保存 chart_bars 摘要，不再每分鐘重寫整個圖表數組。
+    1d 分桶記錄寫入時 DailyBarStore 的 revision；revision 變化（拆股/復權後重新下載歷史）時
+    整個 symbol 的 1d 分桶以新數據重寫，不再追加。
+    """
+    COLLECTION = "chart_bars"
+    NY_TZ = ZoneInfo("America/New_York")
+    # fundamentals 中的圖表字段 -> 週期
+    CHART_FIELDS = {"1m_chart_data": "1m", "5m_chart_data": "5m", "1d_chart_data": "1d"}
+
+    def __init__(self, storage=None, daily_store=None):
+        self.storage = storage or get_storage_handler()
+        self.daily_store = daily_store or get_daily_bar_store()
+        if self.storage.is_connected() and not self.storage.has_collection(self.COLLECTION):
+            self.storage.create_collection(self.COLLECTION)
+        self._lock = threading.Lock()
+        # (symbol, 週期) -> (已存最後一根K線的時間戳（毫秒）, 1d 寫入時的日K revision)；
+        # 進程內共用（get_chart_bar_store），跨運行保留
+        self._positions = {}
+
+    @staticmethod
+    def _to_ms(value):
+        if value is None or isinstance(value, int):
+            return value
+        return int(value.timestamp() * 1000)
+
+    def _bucket(self, timeframe, ts):
+        dt = datetime.fromtimestamp(ts / 1000, self.NY_TZ)
+        return dt.strftime('%Y') if timeframe == "1d" else dt.strftime('%Y-%m-%d')
+
+    def _bucket_id(self, symbol, timeframe, ts):
+        return f"{symbol}|{timeframe}|{self._bucket(timeframe, ts)}"
+
+    def _get_position(self, symbol, timeframe):
+        """返回 (last_ts, revision)；未緩存時從最新的分桶讀取"""
+        with self._lock:
+            if (symbol, timeframe) in self._positions:
+                return self._positions[(symbol, timeframe)]
+        doc = self.storage.find_one_doc(
+            self.COLLECTION,
+            {"symbol": symbol, "timeframe": timeframe},
+            {"last_ts": 1, "revision": 1},
+            sort=[("last_ts", -1)]
+        )
+        position = (doc.get("last_ts"), doc.get("revision")) if doc else (None, None)
+        with self._lock:
+            self._positions[(symbol, timeframe)] = position
+        return position
+
+    def _build_requests(self, symbol, timeframe, records):
+        """返回 (寫操作列表, 新K線數量, 最後時間戳, revision, 是否重寫)"""
+        bars = [
+            {
+                "t": self._to_ms(record["datetime"]),
+                "o": record["open"],
+                "h": record["high"],
+                "l": record["low"],
+                "c": record["close"],
+                "v": record["volume"],
+            }
+            for record in records
+        ]
+        last_ts, stored_revision = self._get_position(symbol, timeframe)
+        revision = self.daily_store.get_revision(symbol) if timeframe == "1d" else None
+        newest = max(bar["t"] for bar in bars) if bars else last_ts
+        appended = sum(1 for bar in bars if last_ts is None or bar["t"] > last_ts)
+
+        if bars and last_ts is not None and revision != stored_revision:
+            return self._build_rewrite_requests(symbol, timeframe, bars, revision), appended, newest, revision, True
+
+        requests = []
+        if last_ts is not None:
+            # 最後一根已存K線可能仍在形成中，原地替換
+            for bar in bars:
+                if bar["t"] == last_ts:
+                    requests.append((
+                        {"_id": self._bucket_id(symbol, timeframe, last_ts), "bars.t": last_ts},
+                        {"$set": {"bars.$": bar}},
+                        False
+                    ))
+                    break
+
+        new_bars = [bar for bar in bars if last_ts is None or bar["t"] > last_ts]
+        buckets = {}
+        for bar in new_bars:
+            buckets.setdefault(self._bucket(timeframe, bar["t"]), []).append(bar)
+        for bucket, bucket_bars in buckets.items():
+            first = bucket_bars[0]["t"]
+            update = {
+                "$push": {"bars": {"$each": bucket_bars}},
+                "$max": {"last_ts": bucket_bars[-1]["t"]},
+                "$min": {"first_ts": first},
+                "$inc": {"count": len(bucket_bars)},
+                "$setOnInsert": {"symbol": symbol, "timeframe": timeframe, "bucket": bucket},
+            }
+            if revision is not None:
+                update["$set"] = {"revision": revision}
+            # last_ts 條件防止其他進程已追加同一批K線時重複寫入（不符合時 upsert 會因 _id 重複而失敗）
+            requests.append((
+                {
+                    "_id": f"{symbol}|{timeframe}|{bucket}",
+                    "$or": [{"last_ts": {"$lt": first}}, {"last_ts": {"$exists": False}}],
+                },
+                update,
+                True
+            ))
+        return requests, appended, newest, revision, False
+
+    def _build_rewrite_requests(self, symbol, timeframe, bars, revision):
+        """日K歷史已調整：以完整的新K線覆蓋每個分桶（$set 整個 bars 數組）"""
+        buckets = {}
+        for bar in bars:
+            buckets.setdefault(self._bucket(timeframe, bar["t"]), []).append(bar)
+        return [
+            (
+                {"_id": f"{symbol}|{timeframe}|{bucket}"},
+                {
+                    "$set": {
+                        "symbol": symbol,
+                        "timeframe": timeframe,
+                        "bucket": bucket,
+                        "bars": bucket_bars,
+                        "first_ts": bucket_bars[0]["t"],
+                        "last_ts": bucket_bars[-1]["t"],
+                        "count": len(bucket_bars),
+                        "revision": revision,
+                    }
+                },
+                True
+            )
+            for bucket, bucket_bars in buckets.items()
+        ]
+
+    def append_many(self, items):
+        """
+        items: [(symbol, 週期, records), ...]，records 為 BarSeries.to_records() 格式（已排序）
+
+        所有 symbol 的寫操作以一次 bulk_write 發送；返回 {(symbol, 週期): 追加的K線數量}，
+        寫入失敗的項目不在結果中。
+        """
+        requests = []
+        owners = []
+        pending = {}
+        rewritten = {}
+        for symbol, timeframe, records in items:
+            key_requests, appended, newest, revision, rewrite = self._build_requests(symbol, timeframe, records)
+            requests.extend(key_requests)
+            owners.extend([(symbol, timeframe)] * len(key_requests))
+            pending[(symbol, timeframe)] = (appended, newest, revision)
+            if rewrite:
+                rewritten[(symbol, timeframe)] = [request[0]["_id"] for request in key_requests]
+
+        result = self.storage.bulk_update_docs(self.COLLECTION, requests)
+        if result is None:
+            with self._lock:
+                for key in pending:
+                    self._positions.pop(key, None)
+            return {}
+
+        failed = {owners[err["index"]] for err in result.get("writeErrors", [])}
+        for key in failed:
+            logger.warning(f"圖表K線寫入失敗 {key[0]} ({key[1]})，下次運行將從數據庫重新讀取位置")
+        for (symbol, timeframe), bucket_ids in rewritten.items():
+            if (symbol, timeframe) in failed:
+                continue
+            # 新歷史沒有覆蓋的舊分桶仍是調整前的價格，一併刪除
+            self.storage.delete_doc(self.COLLECTION, {"symbol": symbol, "timeframe": timeframe, "_id": {"$nin": bucket_ids}})
+            logger.info(f"{symbol} 日K歷史已調整，重寫 {len(bucket_ids)} 個 {timeframe} 分桶")
+        with self._lock:
+            for key, (_, newest, revision) in pending.items():
+                if key in failed:
+                    self._positions.pop(key, None)
+                else:
+                    self._positions[key] = (newest, revision)
+        return {key: appended for key, (appended, _, _) in pending.items() if key not in failed}
+
+    def append(self, symbol, timeframe, records):
+        return self.append_many([(symbol, timeframe, records)]).get((symbol, timeframe))
+
+    def get_bars(self, symbol, timeframe, start=None, end=None):
+        """
+        讀取 [start, end] 範圍內的K線（datetime 或毫秒時間戳，None 表示不限）
+
+        返回與 BarSeries.to_records() 相同的 list-of-dicts 格式。
+        """
+        start_ms = self._to_ms(start)
+        end_ms = self._to_ms(end)
+        query = {"symbol": symbol, "timeframe": timeframe}
+        if start_ms is not None:
+            query["last_ts"] = {"$gte": start_ms}
+        if end_ms is not None:
+            query["first_ts"] = {"$lte": end_ms}
+
+        docs = self.storage.find_doc(self.COLLECTION, query, {"bars": 1, "first_ts": 1})
+        records = []
+        for doc in sorted(docs, key=lambda d: d.get("first_ts", 0)):
+            for bar in doc.get("bars", []):
+                if (start_ms is not None and bar["t"] < start_ms) or (end_ms is not None and bar["t"] > end_ms):
+                    continue
+                records.append({
+                    "datetime": datetime.fromtimestamp(bar["t"] / 1000, self.NY_TZ),
+                    "open": bar["o"],
+                    "high": bar["h"],
+                    "low": bar["l"],
+                    "close": bar["c"],
+                    "volume": bar["v"],
+                })
+        return records
+
+    @classmethod
+    def summarize(cls, records):
+        """fundamentals 文檔中保存的圖表摘要"""
+        if not records:
+            return {"count": 0, "first_ts": None, "last_ts": None}
+        return {
+            "count": len(records),
+            "first_ts": cls._to_ms(records[0]["datetime"]),
+            "last_ts": cls._to_ms(records[-1]["datetime"]),
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_chart_bar_store():
+    """進程內共用的 ChartBarStore（首次使用時連線存儲後端）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ChartBarStore()
+        return _store
@@ -1,22 +1,87 @@
-from utils._database._mongodb.mongo_handler import MongoHandler
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils._database.storage import get_storage_handler
+from utils._database.chart_bar_store import ChartBarStore
 
 from utils.logger.shared_logger import logger
-from datetime import datetime
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
 
 class DatabaseController:
+    # 各集合需要的索引；initialize_database_collections 會確保它們存在
+    INDEXES = {
+        "fundamentals_of_top_list_symbols": [
+            # DataHandler 的所有讀取和 upsert 都按 symbol + today_date 過濾
+            {"keys": [("symbol", 1), ("today_date", 1)], "name": "symbol_today_date_unique", "unique": True},
+            # check_merge_errors 查找缺少 close_change_percentage 的文檔；
+            # partialFilterExpression 不支持 $exists: false，缺失字段在普通索引中以 null 收錄，可直接走索引
+            {"keys": [("close_change_percentage", 1)], "name": "close_change_percentage"},
+        ],
+        "today_top_list": [
+            {"keys": [("today_date", 1)], "name": "today_date"},
+        ],
+        # ChartBarStore 按 symbol + 週期查找最後一個分桶和讀取時間範圍
+        ChartBarStore.COLLECTION: [
+            {"keys": [("symbol", 1), ("timeframe", 1), ("last_ts", 1)], "name": "symbol_timeframe_last_ts"},
+        ],
+    }
+
     def __init__(self):
-        self.mongo_handler = MongoHandler()
+        self.storage = get_storage_handler()
 
     def initialize_database_collections(self, today_top_list_doc_name = "today_top_list", fundamentals_of_top_list_symbols_doc_name = "fundamentals_of_top_list_symbols"):
         logger.info(f"{datetime.now(ZoneInfo('America/New_York'))}: Setting up Collections for {today_top_list_doc_name} and {fundamentals_of_top_list_symbols_doc_name}")
-        self.mongo_handler.create_collection(today_top_list_doc_name)
-        self.mongo_handler.create_collection(fundamentals_of_top_list_symbols_doc_name)
-
-
+        self.storage.create_collection(today_top_list_doc_name)
+        self.storage.create_collection(fundamentals_of_top_list_symbols_doc_name)
+        self.storage.create_collection(ChartBarStore.COLLECTION)
+        self.ensure_indexes({
+            today_top_list_doc_name: self.INDEXES["today_top_list"],
+            fundamentals_of_top_list_symbols_doc_name: self.INDEXES["fundamentals_of_top_list_symbols"],
+            ChartBarStore.COLLECTION: self.INDEXES[ChartBarStore.COLLECTION],
+        })
 
+    def ensure_indexes(self, indexes=None):
+        for collection_name, specs in (indexes or self.INDEXES).items():
+            ensured = self.storage.ensure_indexes(collection_name, specs)
+            logger.info(f"集合 '{collection_name}' 索引: {ensured}")
 
+    def get_hot_queries(self, symbols=None):
+        """返回 DataHandler 的熱點查詢 [(名稱, 集合, 查詢)]，用於檢查執行計劃"""
+        ny_time = datetime.now(ZoneInfo("America/New_York"))
+        ny_today = ny_time.strftime('%Y-%m-%d')
+        date_list = [(ny_time - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(7)]
+        symbols = symbols or ["AAPL", "TSLA"]
+        return [
+            ("_get_db_documents", "fundamentals_of_top_list_symbols", {"symbol": {"$in": symbols}, "today_date": ny_today}),
+            ("store_fundamentals_in_db (7 天)", "fundamentals_of_top_list_symbols", {"symbol": {"$in": symbols}, "today_date": {"$in": date_list}}),
+            ("upsert", "fundamentals_of_top_list_symbols", {"symbol": symbols[0], "today_date": ny_today}),
+            ("check_merge_errors", "fundamentals_of_top_list_symbols", {"close_change_percentage": {"$exists": False}}),
+            ("upsert_top_list", "today_top_list", {"today_date": ny_today}),
+            ("ChartBarStore.get_bars", ChartBarStore.COLLECTION, {"symbol": symbols[0], "timeframe": "1m", "last_ts": {"$gte": int(ny_time.timestamp() * 1000) - 86_400_000}}),
+        ]
 
+    def explain_hot_queries(self, symbols=None):
+        """打印每個熱點查詢的執行計劃摘要"""
+        summaries = []
+        for name, collection_name, query in self.get_hot_queries(symbols):
+            summary = self.storage.explain_find(collection_name, query)
+            summaries.append((name, summary))
+            if summary is None:
+                print(f"{name}: 無法取得執行計劃")
+                continue
+            print(
+                f"{name}: {summary['plan']} | 索引: {summary['indexes'] or '無'} | "
+                f"返回 {summary['n_returned']}, 掃描鍵 {summary['keys_examined']}, "
+                f"掃描文檔 {summary['docs_examined']}, {summary['execution_ms']} ms"
+            )
+        return summaries
 
 
+if __name__ == "__main__":
+    # python utils/_database/database_controller.py [explain] [SYMBOL ...]
+    dbc = DatabaseController()
+    dbc.initialize_database_collections()
+    if len(sys.argv) > 1 and sys.argv[1] == "explain":
+        dbc.explain_hot_queries(sys.argv[2:] or None)
@@ -0,0 +1,158 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from abc import ABC, abstractmethod
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+
+class StorageHandler(ABC):
+    """
+    文檔存儲接口（MongoHandler / SqliteHandler 的共同基類）
+
+    查詢、投影和更新都使用 MongoDB 語法；各方法的錯誤處理約定與 MongoHandler 相同：
+    未連線或集合不存在時返回 None（查詢類返回 []），不拋出異常。
+    子類必須實現所有 abstractmethod，缺少任何一個時在實例化時即報錯。
+    """
+    NY_TZ = ZoneInfo("America/New_York")
+    backend = None
+
+    @property
+    def ny_time(self):
+        """Always return current NY time (not stale init-time value)"""
+        return datetime.now(self.NY_TZ)
+
+    @property
+    def today_str(self):
+        """Always return current NY date string"""
+        return self.ny_time.strftime('%Y-%m-%d')
+
+    @abstractmethod
+    def is_connected(self, force=False):
+        raise NotImplementedError
+
+    @abstractmethod
+    def has_collection(self, name):
+        raise NotImplementedError
+
+    def find_collection(self, name):
+        if not self.is_connected():
+            return False
+        return True if self.has_collection(name) else []
+
+    @abstractmethod
+    def create_collection(self, name):
+        raise NotImplementedError
+
+    @abstractmethod
+    def drop_collection(self, name):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_doc(self, collection_name, doc):
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_doc(self, collection_name, query, projection=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_one_doc(self, collection_name, query, projection=None, sort=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def aggregate_docs(self, collection_name, pipeline):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_doc(self, collection_name, query, update):
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert_doc(self, collection_name, query_keys: dict, new_data: dict):
+        raise NotImplementedError
+
+    @abstractmethod
+    def bulk_update_docs(self, collection_name: str, operations: list, ordered: bool = False):
+        """
+        operations: [(filter, update, upsert), ...]，update 為 MongoDB 更新操作符文檔
+
+        返回 {"writeErrors": [{"index", "errmsg"}], "nMatched", "nModified", "nUpserted", "upserted"}，
+        出錯時返回 None。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def bulk_upsert_docs(self, collection_name: str, operations: list, ordered: bool = False, unset_fields=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def ensure_indexes(self, collection_name: str, indexes: list):
+        raise NotImplementedError
+
+    @abstractmethod
+    def explain_find(self, collection_name: str, query: dict):
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert_top_list(self, collection_name: str, new_symbols: list):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_doc(self, collection_name, query):
+        raise NotImplementedError
+
+    def _bulk_upsert_requests(self, operations, unset_fields=None):
+        """bulk_upsert_docs 的共用部分：把 (query_keys, new_data) 轉換為帶時間戳的 $set/$unset 更新"""
+        now = datetime.now(self.NY_TZ)
+        today_str = self.today_str
+        requests = []
+        for query_keys, new_data in operations:
+            new_data = {k: v for k, v in new_data.items() if k != '_id'}
+            new_data["today_date"] = today_str
+            new_data["updated_at"] = now
+            update = {"$set": new_data}
+            unset = {field: "" for field in (unset_fields or ()) if field not in new_data}
+            if unset:
+                update["$unset"] = unset
+            requests.append((query_keys, update, True))
+        return requests
+
+    @staticmethod
+    def _bulk_upsert_result(collection_name, operations, details, logger):
+        write_errors = [
+            {"index": err.get("index"), "query": operations[err.get("index")][0], "errmsg": err.get("errmsg")}
+            for err in details.get("writeErrors", [])
+        ]
+        upserted_indexes = [item.get("index") for item in details.get("upserted", [])]
+        operation_result = {
+            "matched_count": details.get("nMatched", 0),
+            "modified_count": details.get("nModified", 0),
+            "upserted_count": details.get("nUpserted", len(upserted_indexes)),
+            "upserted_indexes": upserted_indexes,
+            "write_errors": write_errors,
+        }
+        logger.info(
+            f"集合 '{collection_name}' bulk upsert: 匹配 {operation_result['matched_count']}, "
+            f"修改 {operation_result['modified_count']}, 新增 {operation_result['upserted_count']}, "
+            f"錯誤 {len(write_errors)}"
+        )
+        return operation_result
+
+
+def get_storage_handler(backend=None):
+    """
+    按 STORAGE_BACKEND 環境變數（mongodb / sqlite，默認 mongodb）返回存儲實現
+
+    sqlite 後端使用 STORAGE_SQLITE_PATH（默認 cache/storage.sqlite），無需 MongoDB 服務。
+    """
+    backend = (backend or os.getenv("STORAGE_BACKEND", "mongodb")).lower()
+    if backend == "sqlite":
+        from utils._database._sqlite.sqlite_handler import SqliteHandler
+        return SqliteHandler()
+    if backend in ("mongodb", "mongo"):
+        from utils._database._mongodb.mongo_handler import MongoHandler
+        return MongoHandler()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
@@ -3,11 +3,15 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from bson import json_util
+import json
 import requests
 import datetime
 from datetime import timedelta
 from bs4 import BeautifulSoup
 from openai import OpenAI
+from utils._news.upstream_limits import upstream_limit
+from utils._news.summary_cache import get_summary_cache
+from utils._news.article_fetcher import get_article_fetcher
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
@@ -16,15 +20,23 @@ load_dotenv(override=True)
 
 # region Summarizer====
 class Summarizer:
+    MODEL = "gpt-4.1"
+    # 修改摘要提示詞時需更新版本號，舊的緩存摘要即失效
+    SUMMARY_PROMPT_VERSION = "v1"
+
     def __init__(self):
         self.key= os.getenv("OPENAI_API_KEY")
         self.client = OpenAI(api_key=self.key)
 
     #region GPT Summarizer
     def summarize(self, text: str) -> str:
+        return self.summarize_with_usage(text)[0]
+
+    def summarize_with_usage(self, text: str):
+        """返回 (摘要, 消耗的 tokens)"""
         prompt = f"請根據以下新聞內容生成繁體中文簡短摘要：\n\n{str(text)}"
         completion = self.client.chat.completions.create(
-        model="gpt-4.1",
+        model=self.MODEL,
         messages=[
             {"role": "developer", "content": "You are a helpful assistant. You take news content as input and generate a detailed summary. Do not include the original news content in the summary."},
             {"role": "user", "content": prompt}
@@ -32,14 +44,47 @@ class Summarizer:
         )
         summary = completion.choices[0].message.content.strip()
         #print(f"\n📰 Summary: {summary}\n")
-        return summary
+        tokens = completion.usage.total_tokens if completion.usage else 0
+        return summary, tokens
+
+    #region GPT Batch Summarizer
+    def summarize_batch(self, articles: list):
+        """
+        一次請求為多則新聞生成摘要；articles: [{"id", "title", "time", "link", "html"}, ...]
+
+        返回 ({id: 摘要}, 消耗的 tokens)；模型遺漏的 id 不在結果中。
+        """
+        payload = json.dumps(
+            [{key: article[key] for key in ("id", "title", "time", "link", "html")} for article in articles],
+            ensure_ascii=False
+        )
+        prompt = f"請根據以下每一則新聞內容分別生成繁體中文簡短摘要：\n\n{payload}"
+        completion = self.client.chat.completions.create(
+        model=self.MODEL,
+        response_format={"type": "json_object"},
+        messages=[
+            {"role": "developer", "content": "You are a helpful assistant. You take a JSON array of news articles as input and generate a detailed summary for each article separately. Do not include the original news content in the summaries. Reply with a JSON object of the form {\"summaries\": [{\"id\": <article id>, \"summary\": <summary>}]} with one item per input article."},
+            {"role": "user", "content": prompt}
+        ]
+        )
+        tokens = completion.usage.total_tokens if completion.usage else 0
+        try:
+            items = json.loads(completion.choices[0].message.content).get("summaries", [])
+        except (ValueError, AttributeError) as e:
+            print(f"⚠️ Invalid batch summary response: {e}")
+            return {}, tokens
+        summaries = {}
+        for item in items:
+            if isinstance(item, dict) and item.get("summary"):
+                summaries[str(item.get("id"))] = str(item["summary"]).strip()
+        return summaries, tokens
     
 
     #region GPT suggestion
     def suggestion(self, text: str) -> str:
         prompt = f"請根據以下新聞內容生成簡短建議：\n\n{str(text)}"
         completion = self.client.chat.completions.create(
-        model="gpt-4.1",
+        model=self.MODEL,
         messages=[
             {"role": "developer", "content": "用戶是一個日內交易者, 他主要的是做空股票的交易者, 用戶會提供最新的新聞的一些總結, 如果新聞中有非常強的正面情緒, 請向用戶列出風險, 解釋為何不建議做空, 但如果沒有當天的新聞, 或新聞中的正面情緒不高, 請向用戶列出建議。"},
             {"role": "user", "content": prompt}
@@ -53,10 +98,16 @@ class Summarizer:
 
 #region RVLNewsAnalyzer====
 class RVLNewsAnalyzer:
-    def __init__(self):
+    # 批量摘要：多則新聞打包為一次請求，每批的估算 tokens 不超過 NEWS_SUMMARY_BATCH_TOKENS
+    BATCH_ENABLED = os.getenv("NEWS_SUMMARY_BATCH", "1") == "1"
+    BATCH_TOKEN_BUDGET = int(os.getenv("NEWS_SUMMARY_BATCH_TOKENS", "6000"))
+
+    def __init__(self, summary_cache=None, article_fetcher=None):
         self.now = datetime.datetime.now(datetime.timezone.utc)
         self.yesterday = self.now - timedelta(days=2)
         self.summerizer = Summarizer()
+        self.summary_cache = summary_cache or get_summary_cache()
+        self.article_fetcher = article_fetcher or get_article_fetcher()
 
 
     #region Is Recent News
@@ -72,53 +123,144 @@ class RVLNewsAnalyzer:
     #region Clean HTML
     def clean_html(self, text):
         if text.startswith("http"):  # 假設傳進來的是 URL
-            try:
-                response = requests.get(text)
-                response.raise_for_status()
-                html_content = response.text
-                return BeautifulSoup(html_content, "html.parser").get_text()
-            except requests.exceptions.RequestException as e:
-                print(f"❌ Failed to fetch URL: {e}")
-                return ""
+            return self.article_fetcher.fetch(text)
         else:
             return BeautifulSoup(text or "", "html.parser").get_text()
 
     #region News Analyzer 
-    def analyze(self, news_data: list):
-        recent_news = []
-        for news in news_data:
-            
-            if not self.is_recent(news.get("utcTime")):
-                #print(f"⚠️ Skipping non-recent news: 不是最近的新聞: {datetime.datetime.fromtimestamp(news['utcTime'], tz=datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')} - {news['title']}")
+    @staticmethod
+    def estimate_tokens(text):
+        # 粗略估算：中文約每字 1 token（UTF-8 3 bytes），英文約每 4 字元 1 token，按 bytes / 3 偏保守
+        return len(str(text).encode("utf-8")) // 3 + 1
+
+    def prepare_news(self, news, pages=None):
+        """返回待摘要的條目（含緩存鍵）；pages 為已並發抓取的 {url: 正文}"""
+        news_time = datetime.datetime.fromtimestamp(news["utcTime"])
+        link = news.get("link", "")
+        if news.get("html_content"):
+            html = news["html_content"]  # Use html_content as is if available, otherwise clean the link
+        elif pages is not None and link in pages:
+            html = pages[link]
+        else:
+            html = self.clean_html(link)
+        entry = {
+            "title": self.clean_html(news.get("title", "")),
+            "time": news_time.strftime('%Y-%m-%d %H:%M:%S UTC'),
+            "link": link,
+            "html": html
+        }
+        # 同一篇新聞（URL + 內容 + 提示詞版本相同）只調用一次 OpenAI
+        entry["cache_key"] = self.summary_cache.make_key(
+            entry["link"], f"{entry['title']}\n{entry['html']}",
+            self.summerizer.MODEL, self.summerizer.SUMMARY_PROMPT_VERSION
+        )
+        return entry
+
+    def pack_batches(self, entries):
+        """按 token 預算把條目打包為多批（單則超出預算時單獨一批）"""
+        batches = []
+        current = []
+        used = 0
+        for entry in entries:
+            cost = self.estimate_tokens(entry["title"]) + self.estimate_tokens(entry["html"])
+            if current and used + cost > self.BATCH_TOKEN_BUDGET:
+                batches.append(current)
+                current = []
+                used = 0
+            current.append(entry)
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def _summarize_single(self, entry):
+        article = {key: entry[key] for key in ("title", "time", "link", "html")}
+        with upstream_limit("openai"):
+            summary, tokens = self.summerizer.summarize_with_usage(article)
+        self._cache_summary(entry, summary, tokens)
+        return {entry["cache_key"]: summary}
+
+    def _summarize_batch(self, batch):
+        if len(batch) == 1:
+            return self._summarize_single(batch[0])
+        articles = [dict(entry, id=str(index)) for index, entry in enumerate(batch)]
+        with upstream_limit("openai"):
+            summaries, tokens = self.summerizer.summarize_batch(articles)
+        # 批量請求的 tokens 按各則估算大小分攤，用於緩存命中時統計節省量
+        weights = [self.estimate_tokens(entry["title"]) + self.estimate_tokens(entry["html"]) for entry in batch]
+        result = {}
+        for index, entry in enumerate(batch):
+            summary = summaries.get(str(index))
+            if summary is None:
+                # 模型遺漏的新聞單獨補做
+                result.update(self._summarize_single(entry))
                 continue
+            self._cache_summary(entry, summary, tokens * weights[index] // sum(weights))
+            result[entry["cache_key"]] = summary
+        return result
+
+    def _cache_summary(self, entry, summary, tokens):
+        self.summary_cache.put(
+            entry["cache_key"], summary, tokens, url=entry["link"],
+            model=self.summerizer.MODEL, prompt_version=self.summerizer.SUMMARY_PROMPT_VERSION
+        )
 
-            news_time = datetime.datetime.fromtimestamp(news["utcTime"])
-            readable_time = news_time.strftime('%Y-%m-%d %H:%M:%S UTC')
-
-            
-            
-            entry = {
-                "title": self.clean_html(news.get("title", "")),
-                "time": readable_time,
-                "link": news.get("link", ""),
-                "html": news.get("html_content") if news.get("html_content") else self.clean_html(news.get("link", ""))  # Use html_content as is if available, otherwise clean the link
-            }
-
-            summary = self.summerizer.summarize(entry)
+    def summarize_entries(self, entries, executor=None):
+        """
+        返回 {cache_key: 摘要}；entries 可以來自多個 symbol
 
-            entry = {
-                "title": self.clean_html(news.get("title", "")),
-                "time": readable_time,
-                "link": news.get("link", ""),
-                "summary": summary
+        先查緩存，未命中的按內容去重後以批量模式（或逐則）生成；executor 不為 None 時各批並發請求。
+        """
+        summaries = {}
+        missing = {}
+        for entry in entries:
+            if entry["cache_key"] in summaries or entry["cache_key"] in missing:
+                continue
+            summary = self.summary_cache.get(entry["cache_key"])
+            if summary is None:
+                missing[entry["cache_key"]] = entry
+            else:
+                summaries[entry["cache_key"]] = summary
+
+        if self.BATCH_ENABLED:
+            jobs, worker = self.pack_batches(list(missing.values())), self._summarize_batch
+        else:
+            jobs, worker = list(missing.values()), self._summarize_single
+        results = map(worker, jobs) if executor is None else executor.map(worker, jobs)
+        for result in results:
+            summaries.update(result)
+        return summaries
+
+    def analyze(self, news_data: list, executor=None):
+        """
+        executor 不為 None 時，各則新聞的頁面抓取和摘要請求並發執行（受 upstream_limit 限制）
+        """
+        recent = [news for news in news_data if self.is_recent(news.get("utcTime"))]
+        #print(f"⚠️ Skipping {len(news_data) - len(recent)} non-recent news: 不是最近的新聞")
+
+        # 依時間排序，取最新的 5 則（排序只依賴發佈時間，先篩選再抓取和摘要）
+        recent = sorted(
+            recent,
+            key=lambda news: datetime.datetime.fromtimestamp(news["utcTime"]).strftime('%Y-%m-%d %H:%M:%S UTC'),
+            reverse=True
+        )[:5]
+        # 沒有 html_content 的新聞頁面一次並發抓取（共用連線池和磁碟緩存）
+        pages = self.article_fetcher.fetch_many(
+            [news.get("link", "") for news in recent if not news.get("html_content") and news.get("link", "").startswith("http")],
+            executor
+        )
+        entries = [self.prepare_news(news, pages) for news in recent]
+        summaries = self.summarize_entries(entries, executor)
+
+        recent_news = [
+            {
+                "title": entry["title"],
+                "time": entry["time"],
+                "link": entry["link"],
+                "summary": summaries[entry["cache_key"]]
             }
-
-            recent_news.append(entry)
-
-
-
-        # 依時間排序，取最新的 5 則
-        recent_news = sorted(recent_news, key=lambda x: x["time"], reverse=True)[:5]
+            for entry in entries
+        ]
 
         #print(json.dumps(recent_news, indent=2, ensure_ascii=False))
         return recent_news
@@ -0,0 +1,214 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import time
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+
+from utils.logger.shared_logger import logger
+from utils._news.upstream_limits import upstream_limit
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+
+#region Article Fetcher
+class ArticleFetcher:
+    """
+    新聞頁面抓取（共用連線池 + 磁碟緩存）
+
+    - 所有請求共用一個 requests.Session（每個 host 的 keep-alive 連線池）
+    - 每次抓取有總時限（ARTICLE_FETCH_TIMEOUT_SECONDS）和大小上限（ARTICLE_MAX_BYTES），
+      超時或超出上限時只使用已讀取的部分，慢速網站不會拖住建議流程
+    - 提取後的正文保存在 SQLite（ARTICLE_CACHE_PATH）；ARTICLE_CACHE_TTL_SECONDS 內直接使用，
+      過期後以 ETag / Last-Modified 條件請求驗證，304 時沿用緩存；失敗結果緩存 ARTICLE_ERROR_TTL_SECONDS
+    """
+    USER_AGENT = "Mozilla/5.0 (compatible; news-fetcher/1.0)"
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.getenv("ARTICLE_CACHE_PATH", os.path.join("cache", "article_cache.sqlite"))
+        self.timeout = float(os.getenv("ARTICLE_FETCH_TIMEOUT_SECONDS", "10"))
+        self.connect_timeout = min(self.timeout, float(os.getenv("ARTICLE_CONNECT_TIMEOUT_SECONDS", "3")))
+        self.max_bytes = int(os.getenv("ARTICLE_MAX_BYTES", str(2 * 1024 * 1024)))
+        self.ttl = float(os.getenv("ARTICLE_CACHE_TTL_SECONDS", str(6 * 3600)))
+        self.error_ttl = float(os.getenv("ARTICLE_ERROR_TTL_SECONDS", "600"))
+        self.max_workers = max(1, int(os.getenv("ARTICLE_FETCH_MAX_WORKERS", "8")))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = self.USER_AGENT
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS articles (
+                url_hash TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                text TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                ok INTEGER NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+        self._stats = {"hits": 0, "revalidated": 0, "fetched": 0, "errors": 0, "truncated": 0, "bytes": 0}
+
+    @staticmethod
+    def _url_hash(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._stats[name] += value
+
+    def _load(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, etag, last_modified, ok, fetched_at FROM articles WHERE url_hash = ?",
+                (self._url_hash(url),),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"text": row[0], "etag": row[1], "last_modified": row[2], "ok": bool(row[3]), "fetched_at": row[4]}
+
+    def _save(self, url, text, etag=None, last_modified=None, ok=True):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO articles (url_hash, url, text, etag, last_modified, ok, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self._url_hash(url), url, text, etag, last_modified, int(ok), time.time()),
+            )
+
+    def _touch(self, url):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE articles SET fetched_at = ? WHERE url_hash = ?", (time.time(), self._url_hash(url)))
+
+    @staticmethod
+    def extract_text(html):
+        """html 可以是 str 或 bytes（bytes 時自動識別編碼）"""
+        soup = BeautifulSoup(html or "", "html.parser")
+        for tag in soup(["script", "style", "noscript", "template"]):
+            tag.decompose()
+        return soup.get_text()
+
+    def _read_body(self, response):
+        """在總時限和大小上限內讀取正文；返回 (bytes, 是否被截斷)"""
+        content_length = response.headers.get("Content-Length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            logger.warning(f"新聞頁面超過大小上限 ({content_length} bytes)，只讀取前 {self.max_bytes} bytes: {response.url}")
+        deadline = time.monotonic() + self.timeout
+        chunks = []
+        size = 0
+        raw = response.raw
+        if hasattr(raw, "read1"):
+            # urllib3 2.x：read1 有多少返回多少，慢速網站也能按時檢查總時限
+            stream = iter(lambda: raw.read1(self.CHUNK_SIZE, decode_content=True), b"")
+        else:
+            stream = response.iter_content(8 * 1024)
+        try:
+            for chunk in stream:
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= self.max_bytes or time.monotonic() > deadline:
+                    return b"".join(chunks)[:self.max_bytes], True
+        except (urllib3.exceptions.HTTPError, requests.exceptions.RequestException) as e:
+            # read1 不經 requests 包裝，讀取超時/連線中斷拋出 urllib3 異常；已讀到部分正文時使用該部分
+            if not chunks:
+                raise
+            logger.warning(f"讀取新聞頁面中斷，使用已讀取的 {size} bytes: {response.url} ({e})")
+            return b"".join(chunks)[:self.max_bytes], True
+        return b"".join(chunks), False
+
+    def fetch(self, url):
+        """返回頁面正文文本；失敗時返回 ""（與 RVLNewsAnalyzer.clean_html 原行為一致）"""
+        cached = self._load(url)
+        if cached is not None:
+            age = time.time() - cached["fetched_at"]
+            if age < (self.ttl if cached["ok"] else self.error_ttl):
+                self._count("hits")
+                return cached["text"]
+
+        headers = {}
+        if cached is not None and cached["ok"]:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        try:
+            with upstream_limit("article"):
+                with self.session.get(url, headers=headers, timeout=(self.connect_timeout, self.timeout), stream=True) as response:
+                    if response.status_code == 304 and headers:
+                        self._touch(url)
+                        self._count("revalidated")
+                        return cached["text"]
+                    response.raise_for_status()
+                    body, truncated = self._read_body(response)
+                    # 響應頭沒有 charset 時交給 BeautifulSoup 按 <meta charset> 等自動識別
+                    encoding = response.encoding if "charset" in response.headers.get("Content-Type", "").lower() else None
+                    etag = response.headers.get("ETag")
+                    last_modified = response.headers.get("Last-Modified")
+        except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) as e:
+            print(f"❌ Failed to fetch URL: {e}")
+            self._count("errors")
+            if cached is not None and cached["ok"]:
+                # 驗證失敗時沿用過期緩存
+                return cached["text"]
+            self._save(url, "", ok=False)
+            return ""
+
+        text = self.extract_text(body.decode(encoding, errors="replace") if encoding else body)
+        self._count("fetched")
+        self._count("bytes", len(body))
+        if truncated:
+            self._count("truncated")
+        self._save(url, text, etag, last_modified)
+        return text
+
+    def fetch_many(self, urls, executor=None):
+        """並發抓取多個頁面，返回 {url: 正文}；executor 為 None 時使用臨時線程池"""
+        urls = list(dict.fromkeys(url for url in urls if url))
+        if not urls:
+            return {}
+        if executor is not None:
+            return dict(zip(urls, executor.map(self.fetch, urls)))
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls)), thread_name_prefix="article-fetch") as pool:
+            return dict(zip(urls, pool.map(self.fetch, urls)))
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def log_stats(self):
+        stats = self.get_stats()
+        logger.info(
+            f"新聞頁面: 緩存命中 {stats['hits']}, 304 驗證 {stats['revalidated']}, 下載 {stats['fetched']} "
+            f"({stats['bytes'] / 1024:.0f} KB, 截斷 {stats['truncated']}), 失敗 {stats['errors']}"
+        )
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_article_fetcher():
+    """進程內共用的 ArticleFetcher"""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = ArticleFetcher()
+        return _fetcher
+#endregion
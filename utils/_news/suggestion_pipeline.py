@@ -0,0 +1,151 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import json
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.logger.shared_logger import logger
+from utils.newsfilter_api import get_newsfilter_client
+from utils._news.api_news_fetcher import RVLNewsAnalyzer
+from utils._news.upstream_limits import upstream_limit, get_upstream_limiter
+
+
+#region Suggestion Pipeline
+class SuggestionPipeline:
+    """
+    多個 symbol 的新聞 -> 摘要 -> 建議流程並發執行
+
+    symbol 之間並發（NEWS_PIPELINE_MAX_SYMBOLS，默認 4）；Newsfilter 請求在開始時為所有 symbol
+    一次並發發出（NewsfilterClient），每個 symbol 內 Polygon 新聞與之同時抓取，各則新聞的頁面抓取和
+    摘要也並發執行。Polygon / 新聞頁面 / OpenAI 的並發上限由 upstream_limit 控制。
+    每個 symbol 完成後立即以 on_ready(result) 回調（在調用 run 的線程中），調用方可即時保存。
+    """
+
+    def __init__(self, polygon_client, summarizer, on_ready=None, max_symbols=None):
+        self.polygon_client = polygon_client
+        self.summarizer = summarizer
+        self.on_ready = on_ready
+        self.max_symbols = max_symbols or max(1, int(os.getenv("NEWS_PIPELINE_MAX_SYMBOLS", "4")))
+        self.news_analyzer = RVLNewsAnalyzer()
+        self.newsfilter_client = get_newsfilter_client()
+        # 子任務（新聞源抓取、單則新聞摘要）的線程數：各上游上限之和，實際並發由 upstream_limit 控制
+        limiter = get_upstream_limiter()
+        self.task_workers = sum(limiter.get_limit(name) for name in limiter.DEFAULT_LIMITS)
+
+    def fetch_polygon_news(self, symbol):
+        with upstream_limit("polygon_news"):
+            news_generator = self.polygon_client.list_ticker_news(
+                ticker=symbol,
+                limit=5,
+                order='desc',
+                sort='published_utc'
+            )
+            # 將生成器轉換為列表
+            news_list = list(news_generator) if news_generator else []
+
+        news_data = []
+        for item in news_list:
+            try:
+                # 轉換時間戳為UTC時間
+                published_time = datetime.fromisoformat(item.published_utc.replace('Z', '+00:00'))
+                # 確保時間是UTC時區
+                if published_time.tzinfo is None:
+                    published_time = published_time.replace(tzinfo=ZoneInfo("UTC"))
+                news_data.append({
+                    "title": item.title,
+                    "link": item.article_url,
+                    "publisher": item.publisher.name if hasattr(item.publisher, 'name') else item.publisher,
+                    "symbols": [symbol.upper()],  # 保持與原格式一致
+                    "utcTime": int(published_time.timestamp()),
+                    "keywords": item.tickers if hasattr(item, 'tickers') else []
+                })
+            except Exception as e:
+                logger.error(f"處理新聞項目時出錯: {e}")
+        return news_data
+
+    def parse_newsfilter_news(self, symbol, result):
+        news_data = []
+        # API returns a list directly, not {"articles": [...]}
+        if isinstance(result, list):
+            for article in result:
+                try:
+                    news_data.append({
+                        "title": article.get('title', ''),
+                        "link": article.get('link', ''),
+                        "publisher": article.get('source', 'Unknown'),  # source is a string
+                        "symbols": article.get('tickers', [symbol.upper()]),
+                        "utcTime": article.get('timestamp', 0),  # unix epoch
+                        "keywords": article.get('keywords', []),
+                        "html_content": article.get('summary', '')  # use summary as content
+                    })
+                except Exception as e:
+                    logger.error(f"處理 Newsfilter 新聞項目時出錯: {e}")
+        return news_data
+
+    def process_symbol(self, symbol, task_executor):
+        """
+        返回 {"symbol", "suggestion", "status"}；status 為 ok / no_news / error，
+        只有 ok 的建議需要保存
+        """
+        start = time.perf_counter()
+        try:
+            # 兩個新聞源同時抓取；Polygon 失敗時整個 symbol 記為錯誤（與逐個處理時相同），Newsfilter 錯誤只返回 {"error": ...}
+            polygon_future = task_executor.submit(self.fetch_polygon_news, symbol)
+            newsfilter_future = self.newsfilter_client.submit(symbol)
+            news_data = polygon_future.result() + self.parse_newsfilter_news(symbol, newsfilter_future.result())
+
+            if not news_data:
+                logger.warning(f"沒有找到 {symbol} 的新聞")
+                return {"symbol": symbol, "suggestion": "No recent news available", "status": "no_news"}
+
+            summaries = self.news_analyzer.analyze(news_data, executor=task_executor)
+            print(f"\n\n 📰 Summaries for {symbol.upper()}: {json.dumps(summaries, indent=2, ensure_ascii=False)}")
+
+            if summaries != []:
+                with upstream_limit("openai"):
+                    suggestion = self.summarizer.suggestion(summaries)
+                print(f"\n\n 📰 Suggestion for {symbol.upper()}: {suggestion}")
+            else:
+                suggestion = "No recent news available"
+            logger.info(f"{symbol} 建議完成: {len(news_data)} 則新聞, {len(summaries)} 則摘要, 用時 {time.perf_counter() - start:.1f}s")
+            return {"symbol": symbol, "suggestion": suggestion, "status": "ok"}
+
+        except Exception as e:
+            logger.error(f"❌ Failed to fetch news for {symbol.upper()}: {e}")
+            if hasattr(e, "response") and e.response:
+                logger.error(f"Status Code: {e.response.status_code}")
+                logger.error(f"Response: {e.response.text}")
+            return {"symbol": symbol, "suggestion": f"Error fetching news: {str(e)}", "status": "error"}
+
+    def run(self, symbols):
+        """返回與 symbols 順序一致的結果列表；每個 symbol 完成時即調用 on_ready"""
+        if not symbols:
+            return []
+        start = time.perf_counter()
+        results = {}
+        summary_cache = self.news_analyzer.summary_cache
+        summary_cache.reset_stats()
+        # 所有 symbol 的 Newsfilter 請求立即並發發出，排隊中的 symbol 開始處理時直接取用結果
+        self.newsfilter_client.submit_many(symbols)
+        # symbol 任務和子任務使用不同的線程池，避免 symbol 任務佔滿線程後等待自身子任務而死鎖
+        with ThreadPoolExecutor(max_workers=self.task_workers, thread_name_prefix="news-task") as task_executor, \
+                ThreadPoolExecutor(max_workers=min(self.max_symbols, len(symbols)), thread_name_prefix="news-symbol") as symbol_executor:
+            futures = {symbol_executor.submit(self.process_symbol, symbol, task_executor): symbol for symbol in symbols}
+            for future in as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                if self.on_ready is not None:
+                    try:
+                        self.on_ready(result)
+                    except Exception as e:
+                        logger.error(f"保存建議 {result['symbol']} 時出錯: {e}")
+
+        logger.info(f"建議流程完成: {len(symbols)} 個符號, 用時 {time.perf_counter() - start:.1f}s")
+        summary_cache.log_stats()
+        self.news_analyzer.article_fetcher.log_stats()
+        self.newsfilter_client.log_stats()
+        return [results[symbol] for symbol in symbols]
+#endregion
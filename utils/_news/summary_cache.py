@@ -0,0 +1,107 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import hashlib
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from utils.logger.shared_logger import logger
+from utils._database.storage import get_storage_handler
+
+
+#region Summary Cache
+class SummaryCache:
+    """
+    新聞摘要的持久化緩存（按內容尋址）
+
+    鍵為 規範化 URL + 內容哈希 + 模型 + 提示詞版本 的 sha256；同一篇新聞被多個 symbol 引用，
+    或隔天再次出現時直接返回已有摘要，不再調用 OpenAI。存儲在當前存儲後端
+    （STORAGE_BACKEND：MongoDB 集合或 SQLite 表）的 news_summary_cache 集合中。
+    """
+    COLLECTION = "news_summary_cache"
+    # 規範化 URL 時去掉的追蹤參數
+    TRACKING_PARAMS = {"fbclid", "gclid", "ref", "cmpid", "mod"}
+
+    def __init__(self, storage=None):
+        self.storage = storage or get_storage_handler()
+        if self.storage.is_connected() and not self.storage.has_collection(self.COLLECTION):
+            self.storage.create_collection(self.COLLECTION)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @classmethod
+    def normalize_url(cls, url):
+        """小寫 scheme/host，去掉 fragment、追蹤參數和結尾斜線，查詢參數排序"""
+        if not url:
+            return ""
+        parts = urlsplit(url.strip())
+        query = sorted(
+            (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not key.lower().startswith("utm_") and key.lower() not in cls.TRACKING_PARAMS
+        )
+        return urlunsplit((
+            parts.scheme.lower(),
+            parts.netloc.lower(),
+            parts.path.rstrip("/") or "/",
+            urlencode(query),
+            ""
+        ))
+
+    @classmethod
+    def make_key(cls, url, content, model, prompt_version):
+        content_hash = hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+        raw = "|".join((cls.normalize_url(url), content_hash, model, prompt_version))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """返回已緩存的摘要，不存在時返回 None"""
+        doc = self.storage.find_one_doc(self.COLLECTION, {"_id": key}, {"summary": 1, "tokens": 1})
+        with self._lock:
+            if doc is None or not doc.get("summary"):
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["tokens_saved"] += doc.get("tokens") or 0
+        return doc["summary"]
+
+    def put(self, key, summary, tokens, url=None, model=None, prompt_version=None):
+        with self._lock:
+            self._stats["tokens_spent"] += tokens or 0
+        return self.storage.upsert_doc(self.COLLECTION, {"_id": key}, {
+            "summary": summary,
+            "tokens": tokens,
+            "url": self.normalize_url(url),
+            "model": model,
+            "prompt_version": prompt_version,
+        })
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {"hits": 0, "misses": 0, "tokens_saved": 0, "tokens_spent": 0}
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def log_stats(self):
+        stats = self.get_stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = stats["hits"] / lookups * 100 if lookups else 0
+        logger.info(
+            f"摘要緩存: 命中 {stats['hits']}, 未命中 {stats['misses']} ({hit_rate:.0f}%), "
+            f"節省 {stats['tokens_saved']} tokens, 消耗 {stats['tokens_spent']} tokens"
+        )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_summary_cache():
+    """進程內共用的 SummaryCache（首次使用時連線存儲後端）"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SummaryCache()
+        return _cache
+#endregion
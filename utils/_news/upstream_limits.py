@@ -0,0 +1,87 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import time
+import threading
+from contextlib import contextmanager
+from utils.logger.shared_logger import logger
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+
+#region Upstream Limiter
+class UpstreamLimiter:
+    """
+    進程內共用的上游並發限制（每個上游一個 BoundedSemaphore）
+
+    新聞/建議流程中的各個上游（Polygon 新聞、新聞頁面、OpenAI）各自有並發上限，
+    上限以 NEWS_LIMIT_<上游> 環境變數設定；未列出的上游默認 4。
+    Newsfilter 為非同步客戶端，由 NewsfilterClient 自行以 NEWS_LIMIT_NEWSFILTER 限制。
+    """
+    DEFAULT_LIMITS = {"polygon_news": 4, "article": 8, "openai": 4}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._stats = {}
+
+    def get_limit(self, name):
+        default = self.DEFAULT_LIMITS.get(name, 4)
+        return max(1, int(os.getenv(f"NEWS_LIMIT_{name.upper()}", str(default))))
+
+    def _semaphore(self, name):
+        with self._lock:
+            semaphore = self._semaphores.get(name)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.get_limit(name))
+                self._semaphores[name] = semaphore
+                self._stats[name] = {"calls": 0, "wait_seconds": 0.0, "busy_seconds": 0.0}
+            return semaphore
+
+    @contextmanager
+    def limit(self, name):
+        """在 name 上游的並發上限內執行 with 區塊"""
+        semaphore = self._semaphore(name)
+        requested = time.perf_counter()
+        with semaphore:
+            acquired = time.perf_counter()
+            try:
+                yield
+            finally:
+                released = time.perf_counter()
+                with self._lock:
+                    entry = self._stats[name]
+                    entry["calls"] += 1
+                    entry["wait_seconds"] += acquired - requested
+                    entry["busy_seconds"] += released - acquired
+
+    def get_stats(self):
+        with self._lock:
+            return {name: dict(entry, limit=self.get_limit(name)) for name, entry in self._stats.items()}
+
+    def log_stats(self):
+        for name, entry in self.get_stats().items():
+            logger.info(
+                f"上游 {name} (上限 {entry['limit']}): 調用 {entry['calls']}, "
+                f"等待 {entry['wait_seconds']:.1f}s, 執行 {entry['busy_seconds']:.1f}s"
+            )
+
+
+_limiter = UpstreamLimiter()
+
+
+def get_upstream_limiter():
+    return _limiter
+
+
+def upstream_limit(name):
+    return _limiter.limit(name)
+
+
+def get_upstream_stats():
+    return _limiter.get_stats()
+
+
+def log_upstream_stats():
+    _limiter.log_stats()
+#endregion
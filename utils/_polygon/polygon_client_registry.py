@@ -0,0 +1,81 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import threading
+from polygon import RESTClient
+from utils.logger.shared_logger import logger
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+
+#region Polygon Client Registry
+class PolygonClientRegistry:
+    """
+    進程內共用的 Polygon RESTClient 註冊表。
+
+    每個 API key 只建立一個 RESTClient，所有模組（ChartAnalyzer、PolygonController、
+    PolygonAPI）共用同一個 urllib3 連線池，排程循環的每次執行都能重用已建立的
+    keep-alive 連線，不必重新做 TLS 握手。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        # 每個 host 的連線池大小，應不小於 DATA_HANDLER_MAX_WORKERS
+        self.pool_maxsize = int(os.getenv("POLYGON_POOL_MAXSIZE", "10"))
+        self.num_pools = int(os.getenv("POLYGON_NUM_POOLS", "10"))
+
+    def get_client(self, api_key=None):
+        """返回該 API key 對應的共用 RESTClient（不存在時建立）"""
+        api_key = api_key or os.getenv("POLYGON_KEY")
+        with self._lock:
+            client = self._clients.get(api_key)
+            if client is None:
+                client = RESTClient(api_key, num_pools=self.num_pools)
+                # RESTClient 只暴露 num_pools；每個 host 的連線數透過 PoolManager 設定，
+                # 必須在第一個請求建立連線池之前設定
+                client.client.connection_pool_kw["maxsize"] = self.pool_maxsize
+                self._clients[api_key] = client
+                logger.info(f"Created shared Polygon RESTClient (pool maxsize={self.pool_maxsize}, num_pools={self.num_pools})")
+            return client
+
+    def get_stats(self):
+        """返回每個 host 的連線重用統計"""
+        stats = {}
+        with self._lock:
+            clients = list(self._clients.values())
+        for client in clients:
+            pool_manager = client.client
+            for key in pool_manager.pools.keys():
+                pool = pool_manager.pools.get(key)
+                if pool is None:
+                    continue
+                host = f"{pool.host}:{pool.port}"
+                entry = stats.setdefault(host, {"requests": 0, "new_connections": 0, "reused_connections": 0})
+                entry["requests"] += pool.num_requests
+                entry["new_connections"] += pool.num_connections
+                entry["reused_connections"] += max(0, pool.num_requests - pool.num_connections)
+        return stats
+
+    def log_stats(self):
+        for host, entry in self.get_stats().items():
+            logger.info(
+                f"Polygon 連線統計 {host}: 請求 {entry['requests']}, 新連線 {entry['new_connections']}, "
+                f"重用 {entry['reused_connections']}"
+            )
+
+
+_registry = PolygonClientRegistry()
+
+
+def get_polygon_client(api_key=None):
+    return _registry.get_client(api_key)
+
+
+def get_polygon_client_stats():
+    return _registry.get_stats()
+
+
+def log_polygon_client_stats():
+    _registry.log_stats()
+#endregion
@@ -2,10 +2,12 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 import pytz
+import time
+import threading
 import pandas as pd
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from polygon import RESTClient
+from utils._polygon.polygon_client_registry import get_polygon_client
 from polygon.rest.models import TickerSnapshot
 from utils.logger.logger import logger
 import re
@@ -17,6 +19,11 @@ load_dotenv(override=True)
 
 #region Polygon Controller
 class PolygonController:
+    # 進程內共用的快照緩存：同一分鐘內的多次調用共用一次 get_snapshot_direction 請求
+    _snapshot_cache = {}
+    _snapshot_lock = threading.Lock()
+    SNAPSHOT_TTL_SECONDS = int(os.getenv("POLYGON_SNAPSHOT_TTL_SECONDS", "30"))
+
     def __init__(self):
         logger.info(f"{datetime.now(pytz.timezone('US/Eastern'))}: Initializing MainController")
         
@@ -24,18 +31,33 @@ class PolygonController:
         self.ny_time = datetime.now(ZoneInfo("America/New_York"))
         self.today_str = self.ny_time.strftime('%Y-%m-%d')
         self.polygon_api_key = os.getenv("POLYGON_KEY")
-        self.polygon_client = RESTClient(self.polygon_api_key)
+        self.polygon_client = get_polygon_client(self.polygon_api_key)
         self.top_gainers = []
     
 
         
     #region Get Top Gainers
-    def get_top_gainers(self): # get top gainers raw data
-        logger.info(f"{datetime.now(pytz.timezone('US/Eastern'))}: Starting to get top gainers raw data")
-        self.top_gainers = self.polygon_client.get_snapshot_direction(
-        "stocks",
-        direction="gainers",
-        )
+    def get_top_gainers(self, force_refresh=False): # get top gainers raw data
+        minute_key = datetime.now(ZoneInfo("America/New_York")).strftime('%Y-%m-%d %H:%M')
+        with PolygonController._snapshot_lock:
+            cached = PolygonController._snapshot_cache.get("gainers")
+            if (not force_refresh and cached
+                    and cached["minute_key"] == minute_key
+                    and time.monotonic() - cached["fetched_at"] < self.SNAPSHOT_TTL_SECONDS):
+                logger.info(f"{datetime.now(pytz.timezone('US/Eastern'))}: Using cached top gainers snapshot ({minute_key})")
+                self.top_gainers = cached["raw"]
+                return self.top_gainers
+
+            logger.info(f"{datetime.now(pytz.timezone('US/Eastern'))}: Starting to get top gainers raw data")
+            self.top_gainers = self.polygon_client.get_snapshot_direction(
+            "stocks",
+            direction="gainers",
+            )
+            PolygonController._snapshot_cache["gainers"] = {
+                "minute_key": minute_key,
+                "fetched_at": time.monotonic(),
+                "raw": self.top_gainers,
+            }
         return self.top_gainers
     
     def print_list_of_items(self, list_of_items):
@@ -86,7 +108,7 @@ class PolygonController:
         #print(df.to_string(index=False))
 
 
-        if debug:
+        if debug and self.top_gainers_data:
             logger.info(f"{datetime.now(pytz.timezone('US/Eastern'))}: 1st Top Gainers Price Data: {str(self.top_gainers_data[0])}\n")
         print()   
 
@@ -99,7 +121,9 @@ class PolygonController:
         return list_of_top_gainer
     
     def get_filtered_top_gainers_list(self):
-        top_gainers_data = self.get_top_gainers_data()
+        return self.filter_top_gainers(self.get_top_gainers_data())
+
+    def filter_top_gainers(self, top_gainers_data):
         filtered_top_gainers_list = [item['Ticker'] for item in top_gainers_data 
                                    if item['Min_Close'] is not None 
                                    and item['Min_Close'] > 1 
@@ -108,6 +132,22 @@ class PolygonController:
                                    and len(item['Ticker']) <= 4]
         logger.info(f"{datetime.now(pytz.timezone('US/Eastern'))}: Filtered top gainers list: {filtered_top_gainers_list}")
         return filtered_top_gainers_list
+
+    def get_top_gainers_snapshot(self, debug=False, force_refresh=False):
+        """
+        一次網絡請求同時返回解析後的數據、原始 ticker 列表及過濾清洗後的列表
+        """
+        self.get_top_gainers(force_refresh=force_refresh)
+        top_gainers_data = self.get_top_gainers_data(debug=debug)
+        list_of_top_gainer = [item.ticker for item in self.top_gainers]
+        logger.info(f"{datetime.now(pytz.timezone('US/Eastern'))}: Top gainers list: {list_of_top_gainer}")
+        filtered_top_gainers_list = self.filter_top_gainers(top_gainers_data)
+        return {
+            "data": top_gainers_data,
+            "tickers": list_of_top_gainer,
+            "filtered": filtered_top_gainers_list,
+            "clean_filtered": self.clean_symbols(filtered_top_gainers_list),
+        }
     
     def clean_symbols(self, symbols):
         clean_symbols = [re.sub(r'[^A-Z]', '', symbol) for symbol in symbols]
@@ -1,20 +1,155 @@
-import requests
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import time
+import asyncio
+import threading
+import httpx
+from utils.logger.shared_logger import logger
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+
+#region Newsfilter Client
+class NewsfilterClient:
+    """
+    非同步 Newsfilter 客戶端（共用 httpx.AsyncClient 連線池 + 每個 symbol 的 TTL 緩存）
+
+    請求在一個常駐的背景事件循環中執行，連線池跨排程循環重用；同一 symbol 正在請求時
+    再次請求會共用同一個任務。總時限為 NEWSFILTER_TIMEOUT_SECONDS（默認 10 秒），超時只影響
+    Newsfilter 這一個新聞源。並發上限為 NEWS_LIMIT_NEWSFILTER（默認 8）。
+    返回格式與原 NewsfilterAPI.get_news_from_newsfilter 相同：新聞列表或 {"error": ...}。
+    """
+    # 可以緩存的 HTTP 狀態（404 表示沒有新聞）；其他錯誤和超時不緩存
+    CACHEABLE_STATUS = {200, 404}
+
+    def __init__(self):
+        self.base_url = os.getenv("NEWSFILTER_BASE_URL", "https://news.enomars.org/news/symbol").rstrip("/")
+        self.timeout = float(os.getenv("NEWSFILTER_TIMEOUT_SECONDS", "10"))
+        self.cache_ttl = float(os.getenv("NEWSFILTER_CACHE_TTL_SECONDS", "120"))
+        self.max_connections = max(1, int(os.getenv("NEWS_LIMIT_NEWSFILTER", "8")))
+        self._lock = threading.Lock()
+        self._loop = None
+        self._client = None
+        self._semaphore = None
+        # 以下狀態只在事件循環線程中訪問
+        self._cache = {}
+        self._inflight = {}
+        self._stats = {"hits": 0, "requests": 0, "errors": 0, "timeouts": 0}
+
+    #region event loop
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="newsfilter-loop", daemon=True).start()
+            return self._loop
+
+    def _get_client(self):
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(self.timeout), limits=limits)
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+        return self._client
+    #endregion
+
+    async def _request(self, symbol):
+        client = self._get_client()
+        async with self._semaphore:
+            self._stats["requests"] += 1
+            try:
+                response = await asyncio.wait_for(client.get(f"{self.base_url}/{symbol}"), self.timeout)
+            except asyncio.TimeoutError:
+                self._stats["timeouts"] += 1
+                print(f"Request failed: Newsfilter timeout after {self.timeout}s ({symbol})")
+                return {"error": f"timeout after {self.timeout}s"}, False
+            except httpx.HTTPError as e:
+                self._stats["errors"] += 1
+                print(f"Request failed: {e}")
+                return {"error": str(e)}, False
+
+        if response.status_code == 200:
+            try:
+                return response.json(), True
+            except ValueError as e:
+                self._stats["errors"] += 1
+                return {"error": f"invalid JSON: {e}"}, False
+        return {"error": "no news found"}, response.status_code in self.CACHEABLE_STATUS
+
+    async def get_news(self, symbol: str):
+        """返回 symbol 的新聞（TTL 內直接返回緩存）"""
+        key = symbol.lower()
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.cache_ttl:
+            self._stats["hits"] += 1
+            return cached[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._request(symbol))
+            self._inflight[key] = task
+            try:
+                result, cacheable = await task
+            finally:
+                self._inflight.pop(key, None)
+            if cacheable:
+                self._cache[key] = (time.monotonic(), result)
+            return result
+
+        self._stats["hits"] += 1
+        result, _ = await task
+        return result
+
+    async def get_news_many(self, symbols: list):
+        """並發抓取多個 symbol，返回 {symbol: 新聞}"""
+        results = await asyncio.gather(*(self.get_news(symbol) for symbol in symbols))
+        return dict(zip(symbols, results))
+
+    #region sync bridge
+    def submit(self, symbol: str):
+        """在背景事件循環中開始請求，返回 concurrent.futures.Future（供線程池代碼使用）"""
+        return asyncio.run_coroutine_threadsafe(self.get_news(symbol), self._ensure_loop())
+
+    def submit_many(self, symbols: list):
+        return {symbol: self.submit(symbol) for symbol in symbols}
+
+    def get_news_sync(self, symbol: str):
+        return self.submit(symbol).result()
+
+    def get_news_many_sync(self, symbols: list):
+        return asyncio.run_coroutine_threadsafe(self.get_news_many(symbols), self._ensure_loop()).result()
+    #endregion
+
+    def get_stats(self):
+        return dict(self._stats)
+
+    def log_stats(self):
+        stats = self.get_stats()
+        logger.info(
+            f"Newsfilter: 緩存命中 {stats['hits']}, 請求 {stats['requests']}, "
+            f"超時 {stats['timeouts']}, 失敗 {stats['errors']}"
+        )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_newsfilter_client():
+    """進程內共用的 NewsfilterClient"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = NewsfilterClient()
+        return _client
+#endregion
+
 
 class NewsfilterAPI:
     @staticmethod
     def get_news_from_newsfilter(symbols: str):
-        url = f"https://news.enomars.org/news/symbol/{symbols}"
-
-        try:
-            response = requests.get(url, timeout=180)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"error": "no news found"}
-                
-        except requests.exceptions.RequestException as e:
-            print(f"Request failed: {e}")
-            return {"error": str(e)}
+        # 經由共用的 NewsfilterClient（短超時、連線池、TTL 緩存）
+        return get_newsfilter_client().get_news_sync(symbols)
 
 if __name__ == "__main__":
     news = NewsfilterAPI.get_news_from_newsfilter("aapl")
@@ -28,4 +163,4 @@ if __name__ == "__main__":
     elif isinstance(news, dict) and 'error' in news:
         print("Error occurred:", news['error'])
     else:
-        print("No news found or unexpected response format")
\ No newline at end of file
+        print("No news found or unexpected response format")